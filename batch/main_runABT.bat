@@ -1,10 +1,10 @@
 
-cd "C:/codebase/create_abt/batch/batch_files"
+cd "C:/codebase/create_abt/batch"
 
-start batch_runFinStatementABT_qtr_stock.bat
-start batch_runKeyMetricABT_qtr_stock.bat
-start batch_runPiotroskiABT_qtr_stock.bat
-start batch_runPriceABT_month_all.bat
-start batch_runPriceABT_month_etfInfo.bat
+"C:/Users/sharo/Anaconda3/python.exe" "C:/codebase/create_abt/run/create_abt.py" jobs^
+ C:/codebase/create_abt/batch/abt_jobs.json^
+ --workers 4^
+ --incremental^
+ --cache-fp C:/codebase/create_abt/batch/abt_build_cache.json
 
 exit
\ No newline at end of file
@@ -0,0 +1,9 @@
+
+cd "C:/codebase/create_abt/batch"
+
+start "create_abt worker" /min "C:/Users/sharo/Anaconda3/python.exe" "C:/codebase/create_abt/run/create_abt.py" worker start^
+ --preload C:/Users/sharo/OneDrive" - "aiinvestor360.com/DATA/COMPANY/companyOverviews_fmp_stock.parquet^
+ C:/Users/sharo/OneDrive" - "aiinvestor360.com/DATA/COMPANY/companyOverviews_fmp_etf.parquet^
+ C:/Users/sharo/OneDrive" - "aiinvestor360.com/DATA/ETF_INFO/etfInfo_fmp.parquet
+
+exit
\ No newline at end of file
@@ -0,0 +1,63 @@
+###################################################################################################
+###################################################################################################
+# Command Line:
+#
+# python create_abt.py <command> [options]
+#
+# <command> = price, keymetric, finstatement, piotroski, statevector, jobs, synthetic, benchmark, parity,
+#             worker, or preflight
+#
+# Run 'python create_abt.py <command> --help' for the options of each command. The src folder is
+# found relative to this script, so the codebase folder does not need to be passed.
+###################################################################################################
+###################################################################################################
+
+###############################################################################
+# BATCH MODE: Import the required packages and functions.
+###############################################################################
+
+# Import the required packages.
+import sys
+from pathlib import Path
+
+# Import the required functions.
+src_path = str(Path(__file__).resolve().parents[1] / 'src')
+sys.path.append(src_path)
+from def_abtCli_v1 import runABTCli
+
+# Run the selected ABT builder or the ABT job DAG.
+if __name__=='__main__':
+    sys.exit(runABTCli())
+
+###############################################################################
+# MANUAL MODE: Run the create_abt command line from Python.
+###############################################################################
+
+# Create the quarterly key metric ABT for AAPL and MSFT and save it as parquet only.
+# runABTCli([
+#     'keymetric',
+#     '--in-fp',      'C:/Users/sharo/OneDrive - aiinvestor360.com/DATA/FINANCIAL/QUARTERLY/keyMetrics_qtr_fmp_stock.parquet',
+#     '--company-fp', 'C:/Users/sharo/OneDrive - aiinvestor360.com/DATA/COMPANY/companyOverviews_fmp_stock.parquet',
+#     '--symbols',    'AAPL,MSFT',
+#     '--min-date',   '2020-01-01',
+#     '--outpath',    'C:/Users/sharo/OneDrive - aiinvestor360.com/DATA/ABT/FIN_ABT',
+#     '--name',       'keyMetricABT_qtr_stock',
+#     '--format',     'parquet'
+# ])
+
+# Run only the ABT jobs whose inputs changed since their last run, with 4 workers.
+# runABTCli(['jobs', 'C:/codebase/create_abt/batch/abt_jobs.json', '--workers', '4', '--incremental'])
+
+# Create synthetic input files for 1000 stocks over 20 years and run the ABT jobs on them offline.
+# runABTCli(['synthetic', '--outpath', 'C:/TEMP/SYNTH', '--n-symbols', '1000', '--n-years', '20'])
+# runABTCli(['jobs', 'C:/codebase/create_abt/batch/abt_jobs.json', '--var', 'DATA=C:/TEMP/SYNTH'])
+
+# Benchmark the builders on 10, 100 and 1000 stocks and compare the results with a baseline commit.
+# runABTCli(['benchmark', '--outpath', 'C:/TEMP/BENCH', '--sizes', '10', '100', '1000', '--baseline', 'C:/TEMP/BENCH/benchmark_0be0ec6.json'])
+
+# Start the resident ABT worker (it serves requests until it is stopped), then send it the ABT jobs.
+# runABTCli(['worker', 'start', '--preload', 'C:/Users/sharo/OneDrive - aiinvestor360.com/DATA/COMPANY/companyOverviews_fmp_stock.parquet'])
+# runABTCli(['jobs', 'C:/codebase/create_abt/batch/abt_jobs.json', '--incremental', '--worker'])
+
+# Check the input schemas of the ABT jobs from the parquet footers, without running the jobs.
+# runABTCli(['preflight', 'C:/codebase/create_abt/batch/abt_jobs.json'])
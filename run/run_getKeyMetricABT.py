@@ -2,13 +2,18 @@
 ###################################################################################################
 # Batch Parameters:
 #
-# sys.arv[1] = The path to the top-level codebase project folder
+# sys.arv[1] = The path to the top-level codebase project folder (not used, since the src folder is
+#              found relative to this script, but kept for the existing batch files)
 # sys.arv[2] = The complete filepath to the quarterly key metrics data
 # sys.arv[3] = The complete filepath to the company overview data 
 # sys.arv[4] = The minimum date filter that is applied to the output data
 # sys.arv[5] = The complete folderpath where the output parquet and csv files will be saved
 # sys.arv[6] = The name of the output parquet file containing the key metric ABT
 # sys.arv[7] = The name of the output csv file containing the key metric ABT
+# sys.arv[8:] = Any other options of the create_abt.py keymetric command, e.g. --incremental or
+#               --profile all (optional)
+#
+# This is the legacy batch entry point, which forwards to 'create_abt.py keymetric'.
 ###################################################################################################
 ###################################################################################################
 
@@ -21,22 +26,17 @@ import sys
 from pathlib import Path
 
 # Import the required functions.
-src_path = f'{sys.argv[1]}\create_abt\src'
+src_path = str(Path(__file__).resolve().parents[1] / 'src')
 sys.path.append(src_path)
-from def_getKeyMetricABT_v1 import getKeyMetricABT_qtr
+from def_abtCli_v1 import runABTCli, getLegacyOutputArgs
 
-# Run the function that creates the quarterly key metric stats for stocks. 
-keyMetricABT = getKeyMetricABT_qtr(
-    symbol_filters  = [],
-    in_df           = '',
-    in_fp           = sys.argv[2],      
-    in_company_fp   = sys.argv[3],
-    min_date        = sys.argv[4],
-    max_date        = '',
-    outpath         = sys.argv[5],
-    outdsn_parquet  = sys.argv[6],
-    outdsn_csv      = sys.argv[7]   
-)
+# Run the key metric command of create_abt.py, which creates the quarterly key
+# metric stats for stocks.
+if __name__=='__main__':
+    sys.exit(runABTCli(
+        ['keymetric', '--in-fp', sys.argv[2], '--company-fp', sys.argv[3], '--min-date', sys.argv[4]]
+        + getLegacyOutputArgs(sys.argv[5], sys.argv[6], sys.argv[7]) + sys.argv[8:]
+    ))
 
 ###############################################################################
 # MANUAL MODE: Run the function that creates the quarterly key metric stats for
@@ -84,3 +84,17 @@ keyMetricABT = getKeyMetricABT_qtr(
 
 
 
+# Profile the quarterly Key Metrics ABT (cProfile and tracemalloc), which saves
+# the profile files next to the output files.
+# keyMetricABT = getKeyMetricABT_qtr(
+#     symbol_filters  = [],
+#     in_df           = '',
+#     in_fp           = r'C:/Users/sharo/OneDrive - aiinvestor360.com/DATA/FINANCIAL/QUARTERLY/keyMetrics_qtr_fmp_stock.parquet',      
+#     in_company_fp   = r'C:/Users/sharo/OneDrive - aiinvestor360.com/DATA/COMPANY/companyOverviews_fmp_stock.parquet',
+#     min_date        = '2020-01-01',
+#     max_date        = '',
+#     outpath         = r'C:/Users/sharo/OneDrive - aiinvestor360.com/DATA/ABT/FIN_ABT',
+#     outdsn_parquet  = 'keyMetricABT_qtr_stock.parquet',
+#     outdsn_csv      = '',
+#     profile         = 'all'
+# )
@@ -2,7 +2,8 @@
 ###################################################################################################
 # Batch Parameters:
 #
-# sys.arv[1] = The path to the top-level codebase project folder
+# sys.arv[1] = The path to the top-level codebase project folder (not used, since the src folder is
+#              found relative to this script, but kept for the existing batch files)
 # sys.arv[2] = The complete filepath to the quarterly income statement data
 # sys.arv[3] = The complete filepath to the quarterly balance sheet data
 # sys.arv[4] = The complete filepath to the quarterly cashflow statement data
@@ -11,6 +12,9 @@
 # sys.arv[7] = The complete folderpath where the output parquet and csv files will be saved
 # sys.arv[8] = The name of the output parquet file containing the Piotroski score ABT
 # sys.arv[9] = The name of the output csv file containing the Piotroski score ABT
+# sys.arv[10:] = Any other options of the create_abt.py piotroski command, e.g. --profile all (optional)
+#
+# This is the legacy batch entry point, which forwards to 'create_abt.py piotroski'.
 ###################################################################################################
 ###################################################################################################
 
@@ -23,30 +27,18 @@ import sys
 from pathlib import Path
 
 # Import the required functions.
-src_path = f'{sys.argv[1]}/create_abt/src'
+src_path = str(Path(__file__).resolve().parents[1] / 'src')
 sys.path.append(src_path)
-from def_getPiotroskiABT_v1 import *
+from def_abtCli_v1 import runABTCli, getLegacyOutputArgs
 
-# Run the function to create quarterly annualized Piotroski scores.
-print(f"\nRunning the code that computes the Piotroski Scores.")
-print(f"is_fp = {sys.argv[2]}")
-print(f"bs_fp = {sys.argv[3]}")
-print(f"cf_fp = {sys.argv[4]}")
-print(f"in_company_fp = {sys.argv[5]}")
-print(f"out_path = {sys.argv[7]}")
-print(f"outdsn_parquet = {sys.argv[8]}")
-print(f"outdsn_csv     = {sys.argv[9]}\n")
-scores_df = getPiotroskiABT(
-    is_fp          = sys.argv[2],
-    bs_fp          = sys.argv[3],
-    cf_fp          = sys.argv[4],
-    in_company_fp  = sys.argv[5],    
-    min_date       = sys.argv[6],
-    max_date       = '',       
-    outpath        = sys.argv[7],
-    outdsn_parquet = sys.argv[8],
-    outdsn_csv     = sys.argv[9]     
-)
+# Run the piotroski command of create_abt.py, which creates the quarterly
+# Piotroski score ABT for stocks.
+if __name__=='__main__':
+    sys.exit(runABTCli(
+        ['piotroski', '--is-fp', sys.argv[2], '--bs-fp', sys.argv[3], '--cf-fp', sys.argv[4],
+         '--company-fp', sys.argv[5], '--min-date', sys.argv[6]]
+        + getLegacyOutputArgs(sys.argv[7], sys.argv[8], sys.argv[9]) + sys.argv[10:]
+    ))
 
 ###############################################################################
 # MANUAL MODE: Run the function that calculates the Piotroski scores. 
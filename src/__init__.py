@@ -0,0 +1,62 @@
+############################################################################################################
+############################################################################################################
+# MODULE: src
+#
+# DESCRIPTION: The create_abt package. Importing the package or any of its modules does no I/O or
+# computation: the modules only define constants and functions, and the heavy packages (pandas, numpy,
+# pyarrow) are imported inside the function bodies on first use. The modules import each other by their
+# flat module names (e.g. from def_asofJoin_v1 import asofJoin), so the package folder is added to
+# sys.path. The builder functions of ABT_BUILDERS (see def_abtDag_v1.py) are available as lazy package
+# attributes, whose module is only imported when the attribute is first accessed.
+#
+# EXAMPLES
+#   import src
+#   out_df = src.getPiotroskiABT(is_fp='is.parquet', bs_fp='bs.parquet', cf_fp='cf.parquet')
+#   from src import getPriceABT
+############################################################################################################
+############################################################################################################
+
+# Import the required packages.
+import os
+import sys
+
+# Add the package folder to the module search path for the flat module imports.
+src_path = os.path.dirname(os.path.abspath(__file__))
+if src_path not in sys.path:
+    sys.path.append(src_path)
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: __getattr__()
+#
+# DESCRIPTION: This function returns a builder function of ABT_BUILDERS by its
+# function name, and imports the builder module on first access.
+###############################################################################
+###############################################################################
+def __getattr__(name):
+
+    # Import packages.
+    from def_abtDag_v1 import ABT_BUILDERS, getBuilder
+
+    # Look up the builder by its function name.
+    for builder, (module_name, func_name) in ABT_BUILDERS.items():
+        if func_name==name:
+            return getBuilder(builder)
+    raise AttributeError(f"module 'src' has no attribute '{name}'")
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: __dir__()
+#
+# DESCRIPTION: This function lists the package attributes, including the lazy
+# builder functions.
+###############################################################################
+###############################################################################
+def __dir__():
+
+    # Import packages.
+    from def_abtDag_v1 import ABT_BUILDERS
+
+    return sorted(set(globals()) | set(func_name for module_name, func_name in ABT_BUILDERS.values()))
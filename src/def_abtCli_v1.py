@@ -0,0 +1,501 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_abtCli_v1
+#
+# DESCRIPTION: The command line interface of create_abt (see run/create_abt.py), which replaces the
+# positional sys.argv parameters of the run_get*ABT.py scripts with one subcommand per ABT and named
+# options. Every subcommand accepts the common options (stock filter, date filters, output folder, name
+# and formats, profiling), and the 'jobs' subcommand runs a DAG of ABT jobs from a JSON config file with
+# the worker count and incremental (build cache) mode of def_abtDag_v1. The 'synthetic' subcommand creates
+# the synthetic input files of def_syntheticData_v1, so the ABTs can be built offline, the 'benchmark'
+# subcommand runs the builder benchmark of def_benchmark_v1 on them, and the 'parity' subcommand compares
+# the output of a candidate engine with the output of a builder (see def_parity_v1). The 'worker'
+# subcommand starts or stops the resident ABT worker of def_abtWorker_v1, and the --worker option sends
+# a builder or jobs run to it instead of running it in the current process. The 'preflight' subcommand
+# checks the input schemas of the ABT jobs from their parquet footers (see def_preflight_v1), and the
+# --preflight option runs that check before a builder or jobs run. The legacy run_get*ABT.py scripts keep
+# their original batch parameters and forward to runABTCli(), and any other options follow them as named
+# options (see getLegacyOutputArgs()).
+#
+# EXAMPLES
+#   python run/create_abt.py keymetric --in-fp km.parquet --company-fp co.parquet --min-date 2020-01-01
+#       --outpath C:/DATA/ABT/FIN_ABT --name keyMetricABT_qtr_stock --format parquet csv --incremental
+#   python run/create_abt.py piotroski --is-fp is.parquet --bs-fp bs.parquet --cf-fp cf.parquet
+#       --symbols AAPL,MSFT --outpath C:/DATA/ABT/FIN_ABT --name piotroskiABT_qtr_stock --format parquet
+#   python run/create_abt.py price --in-fp prices.parquet --outpath C:/DATA/ABT/PRICE_ABT
+#       --name priceABT_month_stock --format parquet csv.zst --csv-cols symbol,date,close,r_1y
+#   python run/create_abt.py keymetric --in-fp km.parquet --company-fp co.parquet --outpath C:/DATA/ABT/FIN_ABT
+#       --name keyMetricABT_qtr_stock --format parquet arrow
+#   python run/create_abt.py jobs batch/abt_jobs.json --workers 4 --incremental
+#   python run/create_abt.py preflight batch/abt_jobs.json --var DATA=C:/TEMP/SYNTH
+#   python run/create_abt.py worker start --preload C:/DATA/COMPANY/companyOverviews_fmp_stock.parquet
+#   python run/create_abt.py jobs batch/abt_jobs.json --workers 4 --incremental --worker
+#   python run/create_abt.py synthetic --outpath C:/TEMP/SYNTH --n-symbols 1000 --n-years 20 --seed 0
+#   python run/create_abt.py benchmark --outpath C:/TEMP/BENCH --sizes 10 100 1000 --baseline C:/TEMP/BENCH/benchmark_0be0ec6.json
+#   python run/create_abt.py parity --builder piotroski --candidate def_getPiotroskiFast_v1:getPiotroskiABT --data C:/TEMP/SYNTH
+############################################################################################################
+############################################################################################################
+
+# The output formats of the --format option, as (builder argument, file extension).
+OUTPUT_FORMATS = {
+    'parquet': ('outdsn_parquet', '.parquet'),
+    'csv':     ('outdsn_csv',     '.csv'),
+    'csv.gz':  ('outdsn_csv',     '.csv.gz'),
+    'csv.zst': ('outdsn_csv',     '.csv.zst'),
+    'arrow':   ('outdsn_arrow',   '.arrow'),
+}
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getABTArgParser()
+#
+# DESCRIPTION: This function returns the argument parser of the create_abt command line, with one
+# subcommand per ABT builder (price, keymetric, finstatement, piotroski, statevector), the 'jobs'
+# subcommand for the ABT job DAG, the 'synthetic' subcommand for the synthetic input files, the
+# 'benchmark' subcommand for the builder benchmark, the 'parity' subcommand for the parity harness, the
+# 'worker' subcommand for the resident ABT worker, and the 'preflight' subcommand for the input schema check.
+#
+# OUTPUT
+#   - the argparse.ArgumentParser
+############################################################################################################
+############################################################################################################
+def getABTArgParser():
+
+    # Import packages.
+    import argparse
+
+    # Define the options that every builder subcommand accepts.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--symbols', default='', help='comma separated list of stocks to filter the input data (e.g. AAPL,MSFT)')
+    common.add_argument('--min-date', default=None, help='the minimum date filter of the output data (e.g. 2018-01-01)')
+    common.add_argument('--max-date', default='', help='the maximum date filter of the output data')
+    common.add_argument('--outpath', default='', help='the folder where the output files are saved')
+    common.add_argument('--name', default='', help='the name of the output files without the file extension')
+    common.add_argument('--format', nargs='+', default=['parquet','csv'], choices=list(OUTPUT_FORMATS.keys()),
+                        help='the output file formats, where csv.gz and csv.zst are compressed csv files and arrow is a memory-mappable Arrow IPC file (default: parquet csv)')
+    common.add_argument('--csv-cols', default='', help='comma separated list of the columns written to the csv file (default: all columns)')
+    common.add_argument('--profile', nargs='?', const='cpu', default='', choices=['cpu','memory','all'],
+                        help='profile the run with cProfile (cpu, the default), tracemalloc (memory), or both (all) and save the profile in the output folder')
+    common.add_argument('--worker', nargs='?', const='', default=None,
+                        help='run on the resident ABT worker at this address (default: localhost:6360), see the worker command')
+    common.add_argument('--preflight', action='store_true', help='check the input schemas from the parquet footers before the run')
+
+    # Define the options of the statement based builders.
+    company = argparse.ArgumentParser(add_help=False)
+    company.add_argument('--company-fp', default='', help='the company overview parquet file (optional)')
+    statements = argparse.ArgumentParser(add_help=False)
+    statements.add_argument('--is-fp', required=True, help='the income statement parquet file')
+    statements.add_argument('--bs-fp', required=True, help='the balance sheet parquet file')
+    statements.add_argument('--cf-fp', required=True, help='the cashflow statement parquet file')
+    frequency = argparse.ArgumentParser(add_help=False)
+    frequency.add_argument('--frequency', default='quarterly', choices=['quarterly','annual'], help='the frequency of the input data')
+    frequency.add_argument('--as-of', nargs='+', default='', help='return the point-in-time snapshots on these as-of dates')
+
+    # Define the subcommands.
+    parser = argparse.ArgumentParser(prog='create_abt', description='Create the analytical base tables (ABTs).')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    price = subparsers.add_parser('price', parents=[common, company], help='the monthly price ABT')
+    price.add_argument('--in-fp', required=True, help='the monthly price parquet file')
+    price.add_argument('--etfinfo-fp', default='', help='the ETF info parquet file (optional, ETFs only)')
+
+    keymetric = subparsers.add_parser('keymetric', parents=[common, company, frequency], help='the key metric ABT')
+    keymetric.add_argument('--in-fp', required=True, help='the key metric parquet file')
+    keymetric.add_argument('--incremental', action='store_true', help='only recompute the stocks that changed since the previous ABT')
+    keymetric.add_argument('--prev-abt-fp', default='', help='the previous ABT parquet file (incremental only, defaults to the output file)')
+    keymetric.add_argument('--change-method', default='runDate', choices=['runDate','hash'], help='how changed stocks are detected (incremental only)')
+    keymetric.add_argument('--dq-rules', default='', help='the data quality rule JSON file (optional)')
+
+    finstatement = subparsers.add_parser('finstatement', parents=[common, company, statements, frequency], help='the financial statement ABT')
+    finstatement.add_argument('--fx-fp', default='', help='the FX rate parquet file used to convert to USD (optional)')
+
+    subparsers.add_parser('piotroski', parents=[common, company, statements, frequency], help='the Piotroski score ABT')
+
+    statevector = subparsers.add_parser('statevector', parents=[common], help='the monthly statevector ABT')
+    statevector.add_argument('--priceabt-fp', required=True, help='the monthly price ABT parquet file')
+    statevector.add_argument('--keymetric-fp', default='', help='the key metric ABT parquet file (optional)')
+    statevector.add_argument('--finstatement-fp', default='', help='the financial statement ABT parquet file (optional)')
+    statevector.add_argument('--piotroski-fp', default='', help='the Piotroski score ABT parquet file (optional)')
+    statevector.add_argument('--lag-days', type=int, default=None, help='the reporting lag of ABTs without availability dates')
+    statevector.add_argument('--tolerance-days', type=int, default=None, help='the maximum age of the joined ABT rows')
+
+    jobs = subparsers.add_parser('jobs', help='run the ABT jobs of a JSON config file as a DAG')
+    jobs.add_argument('config', help='the ABT job config JSON file (e.g. batch/abt_jobs.json)')
+    jobs.add_argument('--workers', type=int, default=4, help='the maximum number of jobs that run at the same time')
+    jobs.add_argument('--jobs', default='', help='comma separated list of the jobs to run (default: all jobs)')
+    jobs.add_argument('--var', nargs='+', default=[], help='config vars as NAME=VALUE that override the config file vars')
+    jobs.add_argument('--incremental', action='store_true', help='skip the jobs whose inputs did not change since their last run')
+    jobs.add_argument('--cache-fp', default='', help='the build cache JSON file (default: abt_build_cache.json next to the config)')
+    jobs.add_argument('--force', action='store_true', help='rebuild all the jobs and refresh the build cache (incremental only)')
+    jobs.add_argument('--profile', nargs='?', const='cpu', default='', choices=['cpu','memory','all'],
+                      help='profile every job with cProfile (cpu, the default), tracemalloc (memory), or both (all); memory and all run the jobs one at a time (--workers 1)')
+    jobs.add_argument('--worker', nargs='?', const='', default=None,
+                      help='run the jobs on the resident ABT worker at this address (default: localhost:6360), see the worker command')
+    jobs.add_argument('--preflight', action='store_true', help='check the input schemas of all the jobs from the parquet footers before any job runs')
+
+    preflight = subparsers.add_parser('preflight', help='check the input schemas of the ABT jobs of a JSON config file from the parquet footers')
+    preflight.add_argument('config', help='the ABT job config JSON file (e.g. batch/abt_jobs.json)')
+    preflight.add_argument('--jobs', default='', help='comma separated list of the jobs to check (default: all jobs)')
+    preflight.add_argument('--var', nargs='+', default=[], help='config vars as NAME=VALUE that override the config file vars')
+    preflight.add_argument('--out-fp', default='', help='the CSV file of the preflight report (optional)')
+
+    synthetic = subparsers.add_parser('synthetic', help='create synthetic ABT input files with the folder layout of the DATA folder')
+    synthetic.add_argument('--outpath', required=True, help='the folder where the synthetic DATA folder is created')
+    synthetic.add_argument('--n-symbols', type=int, default=10, help='the number of stocks (default: 10)')
+    synthetic.add_argument('--n-etfs', type=int, default=None, help='the number of ETFs (default: 10%% of the stocks)')
+    synthetic.add_argument('--n-years', type=int, default=20, help='the length of the history in years (default: 20)')
+    synthetic.add_argument('--end-date', default='2024-06-14', help='the last date of the data (default: 2024-06-14)')
+    synthetic.add_argument('--seed', type=int, default=0, help='the random seed (default: 0)')
+
+    benchmark = subparsers.add_parser('benchmark', help='benchmark the ABT builders on synthetic data of increasing sizes')
+    benchmark.add_argument('--outpath', required=True, help='the folder of the synthetic data, the builder outputs and the results file')
+    benchmark.add_argument('--builders', default='', help='comma separated list of the builders to run (default: price,keymetric,finstatement,piotroski)')
+    benchmark.add_argument('--sizes', nargs='+', type=int, default=None, help='the universe sizes as numbers of stocks (default: 10 100 1000 10000)')
+    benchmark.add_argument('--years', nargs='+', type=int, default=None, help='the history lengths in years (default: 10 20)')
+    benchmark.add_argument('--seed', type=int, default=0, help='the random seed of the synthetic data (default: 0)')
+    benchmark.add_argument('--repeat', type=int, default=1, help='the number of runs of which the fastest is kept (default: 1)')
+    benchmark.add_argument('--out-fp', default='', help='the results JSON file (default: benchmark_<commit>.json in the outpath)')
+    benchmark.add_argument('--baseline', default='', help='the results JSON file of the baseline commit to compare with')
+    benchmark.add_argument('--threshold', type=float, default=None, help='the regression threshold as a fraction (default: 0.25)')
+
+    parity = subparsers.add_parser('parity', help='compare the output ABT of a candidate engine with the output of a builder')
+    parity.add_argument('--builder', default='', help='the reference builder (price, keymetric, finstatement or piotroski), run on the --data inputs')
+    parity.add_argument('--reference', default='', help='the reference engine as module:function (default: the --builder function)')
+    parity.add_argument('--candidate', default='', help='the candidate engine as module:function or a builder name')
+    parity.add_argument('--data', default='', help='the DATA folder of the inputs, e.g. a synthetic data folder')
+    parity.add_argument('--symbols', default='', help='comma separated list of stocks to run the engines on')
+    parity.add_argument('--sample', type=int, default=0, help='run the engines on a random sample of this many stocks')
+    parity.add_argument('--min-date', default=None, help='the minimum date filter of both engines')
+    parity.add_argument('--ref-fp', default='', help='compare this reference ABT parquet file instead of running the engines')
+    parity.add_argument('--cand-fp', default='', help='compare this candidate ABT parquet file instead of running the engines')
+    parity.add_argument('--keys', nargs='+', default=None, help='the key columns that align the rows (default: symbol date)')
+    parity.add_argument('--rtol', type=float, default=None, help='the relative tolerance of the float columns (default: 1e-9)')
+    parity.add_argument('--atol', type=float, default=None, help='the absolute tolerance of the float columns (default: 1e-12)')
+    parity.add_argument('--no-check-dtype', action='store_true', help='do not fail on columns with the same values but different dtypes')
+    parity.add_argument('--out-fp', default='', help='the CSV file of the column comparison (optional)')
+
+    worker = subparsers.add_parser('worker', help='start, stop or ping the resident ABT worker')
+    worker.add_argument('action', choices=['start','stop','ping'], help='start the worker in this process, or stop or ping a running worker')
+    worker.add_argument('--address', default='', help='the worker address as host:port, port, or \\\\.\\pipe\\name on Windows (default: localhost:6360)')
+    worker.add_argument('--preload', nargs='+', default=[], help='the dimension table parquet files to load at startup (start only)')
+    worker.add_argument('--workers', type=int, default=4, help='the default maximum number of jobs that run at the same time (start only)')
+    return parser
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getBuilderArgs()
+#
+# DESCRIPTION: This function converts the parsed command line options of a builder subcommand into the
+# builder name (see ABT_BUILDERS in def_abtDag_v1.py) and its keyword arguments. Options that were not
+# specified are left out, so the builder defaults apply.
+#
+# FUNCTION INPUT ARGS
+#   - args = the parsed argparse.Namespace
+#
+# OUTPUT
+#   - builder = the builder name
+#   - kwargs  = the keyword arguments of the builder
+############################################################################################################
+############################################################################################################
+def getBuilderArgs(
+    args
+):
+
+    # Map the common options.
+    kwargs = {
+        'symbol_filters': [symbol for symbol in args.symbols.split(',') if len(symbol)>0],
+        'max_date':       args.max_date,
+        'outpath':        args.outpath,
+        'outdsn_parquet': '',
+        'outdsn_csv':     '',
+        'outdsn_arrow':   ''
+    }
+    if args.min_date is not None:
+        kwargs['min_date'] = args.min_date
+    if len(args.csv_cols)>0:
+        kwargs['csv_cols'] = [col for col in args.csv_cols.split(',') if len(col)>0]
+    if len(args.name)>0:
+        for out_format in args.format:
+            out_arg, extension = OUTPUT_FORMATS[out_format]
+            kwargs[out_arg] = args.name + extension
+
+    # Map the options of each subcommand.
+    if args.command=='price':
+        builder = 'price'
+        kwargs.update(in_fp=args.in_fp, in_company_fp=args.company_fp, in_etfinfo_fp=args.etfinfo_fp)
+    elif args.command=='keymetric':
+        builder = 'keymetric_incremental' if args.incremental else 'keymetric'
+        kwargs.update(in_fp=args.in_fp, in_company_fp=args.company_fp, frequency=args.frequency, dq_rules=args.dq_rules)
+        if args.incremental:
+            kwargs.update(prev_abt_fp=args.prev_abt_fp, change_method=args.change_method)
+        else:
+            kwargs.update(as_of=args.as_of)
+    elif args.command in ['finstatement','piotroski']:
+        builder = args.command
+        kwargs.update(is_fp=args.is_fp, bs_fp=args.bs_fp, cf_fp=args.cf_fp, in_company_fp=args.company_fp,
+                      frequency=args.frequency, as_of=args.as_of)
+        if args.command=='finstatement':
+            kwargs.update(fx_fp=args.fx_fp)
+    elif args.command=='statevector':
+        builder = 'statevector_month'
+        kwargs.update(in_priceabt_fp=args.priceabt_fp, in_keymetric_fp=args.keymetric_fp,
+                      in_finstatement_fp=args.finstatement_fp, in_piotroski_fp=args.piotroski_fp,
+                      tolerance_days=args.tolerance_days)
+        if args.lag_days is not None:
+            kwargs['lag_days'] = args.lag_days
+    else:
+        raise ValueError(f"Unknown create_abt command: {args.command}")
+    return builder, kwargs
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getLegacyOutputArgs()
+#
+# DESCRIPTION: This function converts the output folder and the output parquet
+# and csv file names of the legacy run_get*ABT.py batch parameters into the
+# --outpath, --name and --format options of the builder subcommands.
+###############################################################################
+###############################################################################
+def getLegacyOutputArgs(
+    outpath,
+    outdsn_parquet = '',
+    outdsn_csv     = ''
+):
+
+    # Import packages.
+    from def_csvExport_v1 import getCSVExtension
+
+    # Get the output name and formats from the file names, which must have
+    # the same name without the file extension.
+    names, formats = [], []
+    if outdsn_parquet.endswith('.parquet') and len(outdsn_parquet)>8:
+        names.append(outdsn_parquet[0:len(outdsn_parquet)-8])
+        formats.append('parquet')
+    extension = getCSVExtension(outdsn_csv)
+    if len(extension)>0:
+        names.append(outdsn_csv[0:len(outdsn_csv)-len(extension)])
+        formats.append(extension[1:])
+    if len(set(names))>1:
+        raise ValueError(f"The output parquet and csv files must have the same name: {outdsn_parquet}, {outdsn_csv}")
+    if len(names)==0:
+        return []
+    return ['--outpath', outpath, '--name', names[0], '--format'] + formats
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: runABTCli()
+#
+# DESCRIPTION: This function parses the create_abt command line and runs the selected builder or the ABT
+# job DAG. The --profile mode is passed to the profile option of the builders, which save the profile
+# files next to their output files (see def_runReport_v1.py). Builders without a profile option are
+# profiled with cProfile around the call instead.
+#
+# FUNCTION INPUT ARGS
+#   - argv = the list of command line arguments (optional, defaults to sys.argv[1:])
+#
+# OUTPUT
+#   - the exit code, which is 0 if the builder or all the jobs finished and 1 otherwise
+############################################################################################################
+############################################################################################################
+def runABTCli(
+    argv = None
+):
+
+    # Import packages.
+    import os
+    import inspect
+    import cProfile
+    from def_abtDag_v1 import getBuilder, runABTJobs
+
+    # Parse the command line.
+    parser = getABTArgParser()
+    args = parser.parse_args(argv)
+
+    # Create the synthetic input files.
+    if args.command=='synthetic':
+        from def_syntheticData_v1 import createSyntheticData
+        createSyntheticData(
+            outpath   = args.outpath,
+            n_symbols = args.n_symbols,
+            n_etfs    = args.n_etfs,
+            n_years   = args.n_years,
+            end_date  = args.end_date,
+            seed      = args.seed
+        )
+        return 0
+
+    # Run the builder benchmark, which fails if it finds regressions.
+    if args.command=='benchmark':
+        from def_benchmark_v1 import BENCHMARK_SIZES, BENCHMARK_YEARS, BENCHMARK_THRESHOLD, runBenchmark
+        result_df, compare_df = runBenchmark(
+            outpath     = args.outpath,
+            builders    = [builder for builder in args.builders.split(',') if len(builder)>0],
+            sizes       = args.sizes if args.sizes is not None else BENCHMARK_SIZES,
+            years       = args.years if args.years is not None else BENCHMARK_YEARS,
+            seed        = args.seed,
+            repeat      = args.repeat,
+            out_fp      = args.out_fp,
+            baseline_fp = args.baseline,
+            threshold   = args.threshold if args.threshold is not None else BENCHMARK_THRESHOLD
+        )
+        return 1 if len(compare_df)>0 and compare_df['regression'].any() else 0
+
+    # Run the parity harness, which fails if the ABTs do not match.
+    if args.command=='parity':
+        import pandas as pd
+        from def_parity_v1 import PARITY_KEYS, PARITY_RTOL, PARITY_ATOL, compareABTs, runParity, sampleSymbols
+        from def_benchmark_v1 import BENCHMARK_BUILDERS
+        from def_syntheticData_v1 import SYNTHETIC_FILES
+        compare_args = {
+            'keys':        args.keys if args.keys is not None else PARITY_KEYS,
+            'rtol':        args.rtol if args.rtol is not None else PARITY_RTOL,
+            'atol':        args.atol if args.atol is not None else PARITY_ATOL,
+            'check_dtype': not args.no_check_dtype
+        }
+        if len(args.ref_fp)>0 and len(args.cand_fp)>0:
+            parity_df, row_df, passed = compareABTs(pd.read_parquet(args.ref_fp), pd.read_parquet(args.cand_fp), **compare_args)
+            if len(args.out_fp)>0:
+                parity_df.to_csv(args.out_fp, index=False)
+            return 0 if passed else 1
+        if args.builder not in BENCHMARK_BUILDERS or len(args.candidate)==0 or len(args.data)==0:
+            parser.error(f"parity needs --ref-fp and --cand-fp, or --builder ({', '.join(BENCHMARK_BUILDERS.keys())}), --candidate and --data")
+        builder_args = {arg: os.path.join(args.data, SYNTHETIC_FILES[key]) for arg, key in BENCHMARK_BUILDERS[args.builder].items()}
+        builder_args['symbol_filters'] = [symbol for symbol in args.symbols.split(',') if len(symbol)>0]
+        if args.sample>0:
+            builder_args['symbol_filters'] = sampleSymbols(builder_args.get('in_fp', builder_args.get('is_fp')), args.sample)
+        if args.min_date is not None:
+            builder_args['min_date'] = args.min_date
+        parity_df, row_df, passed = runParity(
+            reference    = args.reference if len(args.reference)>0 else args.builder,
+            candidate    = args.candidate,
+            builder_args = builder_args,
+            out_fp       = args.out_fp,
+            **compare_args
+        )
+        return 0 if passed else 1
+
+    # Start the resident worker, or stop or ping a running worker.
+    if args.command=='worker':
+        from multiprocessing import AuthenticationError
+        from def_abtWorker_v1 import runABTWorker, sendWorkerRequest
+        if args.action=='start':
+            runABTWorker(address=args.address, preload=args.preload, workers=args.workers)
+            return 0
+        try:
+            response = sendWorkerRequest({'command':args.action}, address=args.address)
+        except (OSError, ValueError, AuthenticationError) as e:
+            print(f"Could not connect to an ABT worker on {args.address if len(args.address)>0 else 'the default address'}: {e}")
+            return 1
+        for key, value in response.items():
+            print(f"{key} = {value}")
+        return 0
+
+    # Parse the config vars of the 'jobs' and 'preflight' subcommands.
+    var_dict = {}
+    for var in getattr(args, 'var', []):
+        if '=' not in var:
+            parser.error(f"--var {var} must have the form NAME=VALUE")
+        name, value = var.split('=', 1)
+        var_dict[name] = value
+
+    # Check the input schemas of the ABT jobs, without running them. The
+    # outputs of all the jobs are pending, since they are rebuilt first.
+    if args.command=='preflight':
+        from def_abtDag_v1 import loadJobConfig, getJobOutput
+        from def_preflight_v1 import runPreflight
+        all_jobs = loadJobConfig(args.config, var_dict=var_dict)
+        names = [job for job in args.jobs.split(',') if len(job)>0]
+        report_df, passed = runPreflight(
+            jobs       = [job for job in all_jobs if len(names)==0 or job['name'] in names],
+            output_fps = [getJobOutput(job) for job in all_jobs]
+        )
+        if len(args.out_fp)>0:
+            report_df.to_csv(args.out_fp, index=False)
+        return 0 if passed else 1
+
+    # Define the run of the 'jobs' subcommand.
+    if args.command=='jobs':
+        cache_fp = ''
+        if args.incremental:
+            cache_fp = args.cache_fp if len(args.cache_fp)>0 else os.path.join(os.path.dirname(os.path.abspath(args.config)), 'abt_build_cache.json')
+        print(f"\nRunning the ABT jobs of the config file {args.config}.")
+        print(f"workers  = {args.workers}")
+        print(f"jobs     = {args.jobs}")
+        print(f"cache_fp = {cache_fp}\n")
+        request = {
+            'command':  'jobs',
+            'config':   os.path.abspath(args.config),
+            'workers':  args.workers,
+            'jobs':     [job for job in args.jobs.split(',') if len(job)>0],
+            'var_dict': var_dict,
+            'cache_fp': os.path.abspath(cache_fp) if len(cache_fp)>0 else '',
+            'force':    args.force,
+            'profile':  args.profile,
+            'preflight':args.preflight
+        }
+        run = lambda: runABTJobs(**{key: value for key, value in request.items() if key!='command'})
+        prof_fp = ''
+
+    # Define the run of a builder subcommand.
+    else:
+        if len(args.name)>0 and len(args.outpath)==0:
+            parser.error('--name requires --outpath')
+        builder, kwargs = getBuilderArgs(args)
+        prof_fp = ''
+        if len(args.profile)>0 and 'profile' in inspect.signature(getBuilder(builder)).parameters:
+            kwargs['profile'] = args.profile
+        elif len(args.profile)>0:
+            prof_fp = os.path.join(args.outpath if len(args.outpath)>0 else '.', (args.name if len(args.name)>0 else builder) + '_profile.prof')
+        print(f"\nRunning the {builder} ABT builder.")
+        for key, value in kwargs.items():
+            print(f"{key} = {value}")
+        print('')
+        run = lambda: getBuilder(builder)(**kwargs)
+
+        # The worker runs the builder as a job, with absolute filepaths since
+        # it may run in another folder.
+        worker_args = {key: os.path.abspath(value) if (key.endswith('_fp') or key=='outpath') and len(value)>0 else value
+                       for key, value in kwargs.items() if key!='profile'}
+        request = {'command':'jobs', 'config':[{'name':args.name if len(args.name)>0 else builder, 'builder':builder, 'args':worker_args}],
+                   'workers':1, 'profile':args.profile, 'preflight':args.preflight}
+
+        # Check the input schemas before the run, if requested.
+        if args.preflight and args.worker is None:
+            from def_preflight_v1 import runPreflight
+            report_df, passed = runPreflight([{'name':builder, 'builder':builder, 'args':kwargs}], output_fps=[])
+            if not passed:
+                return 1
+
+    # Send the run to the resident worker, if requested, and print its log.
+    if args.worker is not None:
+        from multiprocessing import AuthenticationError
+        from def_abtWorker_v1 import sendWorkerRequest
+        try:
+            response = sendWorkerRequest(request, address=args.worker)
+        except (OSError, ValueError, AuthenticationError) as e:
+            print(f"Could not connect to an ABT worker on {args.worker if len(args.worker)>0 else 'the default address'}: {e}")
+            return 1
+        print(response.get('log', ''))
+        if response['status']!='ok':
+            print(f"The ABT worker run failed: {response['error']}")
+            return 1
+        print(f"Done on the ABT worker in {response['wall_sec']:.1f} seconds.\n")
+        return 0 if all(job['status'] in ['done','cached'] for job in response['report']) else 1
+
+    # Run it, with the profiler around the call if the builder has no
+    # profile option.
+    if len(prof_fp)>0:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(run)
+        profiler.dump_stats(prof_fp)
+        print(f"Saved the profile to {prof_fp}.")
+    else:
+        result = run()
+    print("Done.\n")
+    if args.command=='jobs' and (~result['status'].isin(['done','cached'])).any():
+        return 1
+    return 0
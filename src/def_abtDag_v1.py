@@ -0,0 +1,519 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_abtDag_v1
+#
+# DESCRIPTION: A small DAG orchestrator that runs all the ABT builders in one Python process. The ABT jobs
+# are declared as data (a list of dictionaries or a JSON file) with the builder to run and its keyword
+# arguments. A job depends on the jobs listed in its depends_on key and on any job whose output parquet
+# file is one of its input files. Jobs whose dependencies are done run concurrently in a thread pool, and
+# the input parquet files that more than one job uses are loaded once and shared in memory between the
+# jobs (e.g. the company overviews and the statement files). The wall time of every job is reported. With
+# a build cache file, the jobs whose builder, arguments and input files did not change since their last
+# run are skipped, see def_buildCache_v1.py.
+#
+# JOB KEYS
+#   - name       = the unique name of the job
+#   - builder    = the name of the builder to run, see ABT_BUILDERS
+#   - args       = the keyword arguments of the builder, where '{VAR}' placeholders in string values are
+#                  replaced by the config vars
+#   - depends_on = the list of job names that must finish before the job starts (optional)
+#
+# CONFIG FILE: a JSON file with a 'vars' dictionary (optional) and a 'jobs' list, see batch/abt_jobs.json.
+############################################################################################################
+############################################################################################################
+
+# The builders that can be run by a job, as (module name, function name).
+ABT_BUILDERS = {
+    'price':                 ('def_getPriceABT_v1',        'getPriceABT'),
+    'keymetric':             ('def_getKeyMetricABT_v1',    'getKeyMetricABT_qtr'),
+    'keymetric_incremental': ('def_getKeyMetricABT_v1',    'updateKeyMetricABT_qtr'),
+    'finstatement':          ('def_getFinStatementABT_v1', 'getFinStatementABT'),
+    'piotroski':             ('def_getPiotroskiABT_v1',    'getPiotroskiABT'),
+    'statevector_month':     ('def_getFin360ABT_v1',       'getStatevectorABT_month'),
+    'combine':               ('def_abtDag_v1',             'combineABT'),
+}
+
+# The builder filepath arguments whose input can be passed as a shared, already loaded dataframe through
+# the matching dataframe argument.
+SHARED_INPUT_ARGS = {
+    'in_fp':'in_df',
+    'is_fp':'is_df',
+    'bs_fp':'bs_df',
+    'cf_fp':'cf_df',
+    'in_company_fp':'in_company_df',
+    'in_etfinfo_fp':'in_etfinfo_df',
+}
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: loadJobConfig()
+#
+# DESCRIPTION: This function returns the validated list of ABT jobs, with the config vars substituted into
+# the job arguments and the dependencies of each job resolved.
+#
+# FUNCTION INPUT ARGS
+#   - config   = the list of job dictionaries, a config dictionary, or the complete filepath to a JSON file
+#   - var_dict = additional config vars that override the vars of the config (optional)
+#
+# OUTPUT
+#   - the list of job dictionaries, each with a complete 'depends_on' list
+############################################################################################################
+############################################################################################################
+def loadJobConfig(
+    config,
+    var_dict = {}
+):
+
+    # Import packages.
+    import json
+    import copy
+
+    # Load the config from a JSON file, if a filepath was specified.
+    if isinstance(config, str):
+        with open(config, 'r') as f:
+            config = json.load(f)
+    if isinstance(config, list):
+        config = {'jobs':config}
+    config_vars = dict(config.get('vars', {}))
+    config_vars.update(var_dict)
+    jobs = copy.deepcopy(config['jobs'])
+
+    # Validate the jobs and substitute the config vars.
+    valid_keys = {'name','builder','args','depends_on'}
+    names = set()
+    for job in jobs:
+        bad_keys = set(job.keys()) - valid_keys
+        if len(bad_keys)>0:
+            raise ValueError(f"ABT job {job.get('name')} has unknown keys: {sorted(bad_keys)}")
+        if 'name' not in job or job.get('builder') not in ABT_BUILDERS:
+            raise ValueError(f"ABT job {job} must specify a name and one of the builders {list(ABT_BUILDERS.keys())}")
+        if job['name'] in names:
+            raise ValueError(f"ABT job name {job['name']} is not unique")
+        names.add(job['name'])
+        job['args'] = {key:substituteVars(value, config_vars) for key, value in job.get('args', {}).items()}
+        job['depends_on'] = list(job.get('depends_on', []))
+
+    # Add the dependencies on the jobs whose output files are input files.
+    output_jobs = {getJobOutput(job):job['name'] for job in jobs if len(getJobOutput(job))>0}
+    for job in jobs:
+        for in_fp in getJobInputs(job):
+            if in_fp in output_jobs and output_jobs[in_fp]!=job['name']:
+                job['depends_on'].append(output_jobs[in_fp])
+        job['depends_on'] = list(dict.fromkeys(job['depends_on']))
+        unknown = [name for name in job['depends_on'] if name not in names]
+        if len(unknown)>0:
+            raise ValueError(f"ABT job {job['name']} depends on unknown jobs: {unknown}")
+
+    # Make sure the dependencies do not have a cycle.
+    getJobOrder(jobs)
+    return jobs
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getJobOrder()
+#
+# DESCRIPTION: This function sorts the ABT jobs into dependency levels, where every job only depends on the
+# jobs of the earlier levels, and raises an error if the dependencies have a cycle.
+#
+# FUNCTION INPUT ARGS
+#   - jobs = the list of job dictionaries with resolved 'depends_on' lists
+#
+# OUTPUT
+#   - the list of levels, where each level is a list of job names
+############################################################################################################
+############################################################################################################
+def getJobOrder(
+    jobs
+):
+
+    # Peel off the jobs whose dependencies are all in the earlier levels.
+    remaining = {job['name']:set(job.get('depends_on', [])) for job in jobs}
+    levels = []
+    done = set()
+    while len(remaining)>0:
+        level = [name for name, deps in remaining.items() if deps <= done]
+        if len(level)==0:
+            raise ValueError(f"The ABT job dependencies have a cycle between the jobs: {sorted(remaining.keys())}")
+        levels.append(level)
+        done |= set(level)
+        for name in level:
+            del remaining[name]
+    return levels
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: runABTJobs()
+#
+# DESCRIPTION: This function runs a DAG of ABT jobs. Every job starts as soon as all the jobs it depends on
+# are done, and up to 'workers' jobs run at the same time in a thread pool. The input parquet files that
+# are used by more than one job are loaded once, shared between the jobs (each job gets a shallow copy, so
+# the builders cannot change each other's inputs), and released when the last job using them is done. If a
+# job fails, the jobs that depend on it are skipped and the other jobs still run. If a build cache file is
+# specified, a job whose fingerprint and output file did not change since its last run is not rebuilt and
+# gets the status 'cached', which counts as done for the jobs that depend on it. If a warm table cache is
+# given (by the resident worker of def_abtWorker_v1), the dimension tables of WARM_INPUT_ARGS are taken
+# from it instead, so they are loaded once for all the runs of the worker. With the preflight option, the
+# parquet footers of all the job inputs are checked first (see def_preflight_v1.py), and no job runs if an
+# input is missing a required column.
+#
+# FUNCTION INPUT ARGS
+#   - config      = the list of job dictionaries, a config dictionary, or the complete filepath to a JSON
+#                   file
+#   - workers     = the maximum number of jobs that run at the same time
+#   - jobs        = the list of job names to run (optional, defaults to all jobs). The jobs they depend on
+#                   are always included.
+#   - var_dict    = additional config vars that override the vars of the config (optional)
+#   - cache_fp    = the complete filepath to the build cache JSON file (optional, no caching if not
+#                   specified)
+#   - force       = True to rebuild all the jobs and refresh their build cache entries (optional)
+#   - profile     = the profile mode passed to every builder that has a profile option, which is '' (no
+#                   profiling), 'cpu', 'memory', or 'all' (optional, see def_runReport_v1.py). The jobs run
+#                   one at a time when profiling memory, since tracemalloc traces the whole process.
+#   - table_cache = the warm table cache dictionary that is kept across runs (optional, see
+#                   def_abtWorker_v1.py)
+#   - preflight   = True to check the schemas of the job inputs before any job runs (optional)
+#
+# OUTPUT DATAFRAMES
+#   - report_df = one row per job (job, builder, status, start_time, wall_sec, rows, error)
+############################################################################################################
+############################################################################################################
+def runABTJobs(
+    config,
+    workers     = 4,
+    jobs        = [],
+    var_dict    = {},
+    cache_fp    = '',
+    force       = False,
+    profile     = '',
+    table_cache = None,
+    preflight   = False
+):
+
+    ###################################################################
+    # Import packages.
+    ###################################################################
+    import time
+    import inspect
+    import threading
+    import pandas as pd
+    from datetime import datetime
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    from def_buildCache_v1 import getFileFingerprint, getJobFingerprint, loadBuildCache, saveBuildCache, isJobCached
+    from def_abtWorker_v1 import WARM_INPUT_ARGS, loadWarmTable
+    from def_preflight_v1 import runPreflight
+
+    ###################################################################
+    # Load the jobs and keep only the requested jobs and the jobs that
+    # they depend on.
+    ###################################################################
+    all_jobs = loadJobConfig(config, var_dict=var_dict)
+    job_dict = {job['name']:job for job in all_jobs}
+    if len(jobs)>0:
+        unknown = [name for name in jobs if name not in job_dict]
+        if len(unknown)>0:
+            raise ValueError(f"Unknown ABT jobs: {unknown}")
+        keep = set()
+        stack = list(jobs)
+        while len(stack)>0:
+            name = stack.pop()
+            if name not in keep:
+                keep.add(name)
+                stack += job_dict[name]['depends_on']
+        job_dict = {name:job for name, job in job_dict.items() if name in keep}
+
+    ###################################################################
+    # Check the schemas of the job inputs from their parquet footers,
+    # and fail before any data is loaded if an input is not valid.
+    ###################################################################
+    if preflight:
+        preflight_df, passed = runPreflight(list(job_dict.values()))
+        if not passed:
+            failed = preflight_df.loc[preflight_df['status']=='failed', 'job'].unique().tolist()
+            raise ValueError(f"The preflight check of the ABT job inputs failed for the jobs: {failed}")
+
+    ###################################################################
+    # Count the jobs that use each shareable input file. Only the files
+    # used by more than one job are shared, and the outputs of other
+    # jobs are never shared, since they do not exist yet.
+    ###################################################################
+    output_fps = set([getJobOutput(job) for job in job_dict.values()])
+    use_count = {}
+    for job in job_dict.values():
+        for arg, in_fp in getSharedInputs(job).items():
+            if in_fp not in output_fps:
+                use_count[in_fp] = use_count.get(in_fp, 0) + 1
+    shared_fps = {in_fp for in_fp, n in use_count.items() if n>1}
+    shared_cache = {}
+    cache_lock = threading.Lock()
+    path_locks = {in_fp:threading.Lock() for in_fp in shared_fps}
+    build_cache = loadBuildCache(cache_fp) if len(cache_fp)>0 else {}
+
+    ###################################################################
+    # Define the function that runs one job in a worker thread.
+    ###################################################################
+    def runJob(job):
+        start = time.perf_counter()
+        start_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        try:
+
+            # Skip the job if its fingerprint and output file did not change.
+            if len(cache_fp)>0:
+                job_fingerprint = getJobFingerprint(job)
+                if not force and isJobCached(job, build_cache, job_fingerprint):
+                    print(f"Skipping ABT job {job['name']}, since its inputs did not change.")
+                    releaseInputs(job)
+                    return [job['name'], job['builder'], 'cached', start_time, time.perf_counter()-start, None, '']
+
+            # Replace the shared input filepaths with the shared dataframes,
+            # loading each shared file only once.
+            builder = getBuilder(job['builder'])
+            args = dict(job['args'])
+            if len(profile)>0 and 'profile' in inspect.signature(builder).parameters:
+                args['profile'] = profile
+            for arg, in_fp in getSharedInputs(job).items():
+                if table_cache is not None and arg in WARM_INPUT_ARGS:
+                    with cache_lock:
+                        args[SHARED_INPUT_ARGS[arg]] = loadWarmTable(table_cache, in_fp).copy(deep=False)
+                elif in_fp in shared_fps:
+                    with path_locks[in_fp]:
+                        if in_fp not in shared_cache:
+                            shared_cache[in_fp] = pd.read_parquet(in_fp, engine='pyarrow')
+                    args[SHARED_INPUT_ARGS[arg]] = shared_cache[in_fp].copy(deep=False)
+
+            # Run the builder and count the output rows.
+            print(f"Starting ABT job {job['name']} ({job['builder']}).")
+            result = builder(**args)
+            out_df = result[-1] if isinstance(result, tuple) else result
+            rows = len(out_df) if hasattr(out_df, '__len__') else None
+            status, error = 'done', ''
+
+            # Record the job and output fingerprints in the build cache.
+            if len(cache_fp)>0 and len(getJobOutput(job))>0:
+                with cache_lock:
+                    build_cache[job['name']] = {
+                        'job_fingerprint':job_fingerprint,
+                        'output':getJobOutput(job),
+                        'output_fingerprint':getFileFingerprint(getJobOutput(job)),
+                        'built_at':start_time
+                    }
+                    saveBuildCache(build_cache, cache_fp)
+        except Exception as e:
+            rows, status, error = None, 'failed', f'{type(e).__name__}: {e}'
+        wall_sec = time.perf_counter() - start
+        print(f"Finished ABT job {job['name']} with status {status} in {wall_sec:.1f} seconds.")
+        releaseInputs(job)
+        return [job['name'], job['builder'], status, start_time, wall_sec, rows, error]
+
+    ###################################################################
+    # Define the function that releases the shared inputs of a job that
+    # no remaining job needs.
+    ###################################################################
+    def releaseInputs(job):
+        with cache_lock:
+            for arg, in_fp in getSharedInputs(job).items():
+                if in_fp in shared_fps:
+                    use_count[in_fp] -= 1
+                    if use_count[in_fp]==0:
+                        shared_cache.pop(in_fp, None)
+
+    ###################################################################
+    # Run the jobs as soon as their dependencies are done. The memory
+    # profile of a job is only its own with one job at a time.
+    ###################################################################
+    if profile in ['memory','all'] and int(workers)>1:
+        print(f"Profiling memory, so the ABT jobs run one at a time instead of {workers} at a time.")
+        workers = 1
+    report = []
+    status_dict = {}
+    pending = dict(job_dict)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(int(workers),1)) as executor:
+        while len(pending)>0 or len(running)>0:
+
+            # Skip the jobs that depend on a job that did not finish.
+            for name, job in list(pending.items()):
+                bad_deps = [dep for dep in job['depends_on'] if status_dict.get(dep) in ['failed','skipped']]
+                if len(bad_deps)>0:
+                    status_dict[name] = 'skipped'
+                    report.append([name, job['builder'], 'skipped', '', 0.0, None, f'dependency {bad_deps[0]} did not finish'])
+                    releaseInputs(job)
+                    del pending[name]
+
+            # Submit the jobs whose dependencies are all done.
+            for name, job in list(pending.items()):
+                if all(status_dict.get(dep) in ['done','cached'] for dep in job['depends_on']):
+                    running[executor.submit(runJob, job)] = name
+                    del pending[name]
+
+            # Wait for a running job to finish.
+            if len(running)==0:
+                break
+            finished, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for future in finished:
+                row = future.result()
+                status_dict[running.pop(future)] = row[2]
+                report.append(row)
+
+    ###################################################################
+    # Create and print the per-job report.
+    ###################################################################
+    report_df = pd.DataFrame(report, columns=['job','builder','status','start_time','wall_sec','rows','error'])
+    print(f"ABT job report:\n{report_df[['job','builder','status','wall_sec','rows']].to_string(index=False)}")
+    failed_df = report_df.loc[report_df['status']=='failed']
+    for i in range(len(failed_df)):
+        print(f"ABT job {failed_df['job'].iloc[i]} failed with {failed_df['error'].iloc[i]}")
+    return report_df
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: combineABT()
+#
+# DESCRIPTION: This function stacks several ABT parquet files with the same columns (e.g. the stock and
+# ETF price ABTs) into one ABT and sorts it.
+#
+# FUNCTION INPUT ARGS
+#   - in_fps         = the list of complete filepaths to the ABT parquet files
+#   - sort_cols      = the list of columns to sort the combined ABT by (columns that do not exist are skipped)
+#   - outpath        = the folder path where all output data will be saved
+#   - outdsn_parquet = the name of output parquet file
+#   - outdsn_csv     = the name of the output csv file (.csv, .csv.gz or .csv.zst, see def_csvExport_v1.py)
+#   - csv_cols       = the list of columns written to the csv file (optional, defaults to all columns)
+#   - outdsn_arrow   = the name of the output Arrow IPC file (optional, .arrow or .feather, see def_arrowExport_v1.py)
+#
+# OUTPUT DATAFRAMES
+#   - out_df
+############################################################################################################
+############################################################################################################
+def combineABT(
+    in_fps         = [],
+    sort_cols      = [],
+    outpath        = '',
+    outdsn_parquet = '',
+    outdsn_csv     = '',
+    csv_cols       = [],
+    outdsn_arrow   = ''
+):
+
+    # Import packages.
+    import pandas as pd
+    from def_csvExport_v1 import isCSVName, startCSVWrite
+    from def_arrowExport_v1 import isArrowName, writeArrow
+
+    # Stack the ABTs and sort them.
+    out_df = pd.concat([pd.read_parquet(in_fp, engine='pyarrow') for in_fp in in_fps], ignore_index=True)
+    sort_cols = [col for col in sort_cols if col in out_df.columns]
+    if len(sort_cols)>0:
+        out_df = out_df.sort_values(by=sort_cols, kind='stable').reset_index(drop=True)
+
+    # Save as a PARQUET and an ARROW IPC file, if they were given, while the
+    # CSV file is written in a background thread.
+    if isCSVName(outdsn_csv):
+        csv_write = startCSVWrite(out_df, f'{outpath}/{outdsn_csv}', cols=csv_cols)
+    curr_len = len(outdsn_parquet)
+    if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
+        out_df.to_parquet(f'{outpath}/{outdsn_parquet}',index=False)
+    if isArrowName(outdsn_arrow):
+        writeArrow(out_df, f'{outpath}/{outdsn_arrow}')
+    if isCSVName(outdsn_csv):
+        csv_write.result()
+    return out_df
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getBuilder()
+#
+# DESCRIPTION: This function imports and returns the builder function of a job.
+###############################################################################
+###############################################################################
+def getBuilder(builder):
+
+    # Import packages.
+    import importlib
+
+    # Import the builder function.
+    module_name, func_name = ABT_BUILDERS[builder]
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getJobInputs()
+#
+# DESCRIPTION: This function returns the list of input parquet filepaths of a
+# job, which are its '_fp' and '_fps' arguments that end with '.parquet'.
+###############################################################################
+###############################################################################
+def getJobInputs(job):
+
+    # Collect the parquet filepath arguments.
+    in_fps = []
+    for arg, value in job['args'].items():
+        values = value if isinstance(value, list) else [value]
+        if arg.endswith('_fp') or arg.endswith('_fps'):
+            in_fps += [v for v in values if isinstance(v, str) and v.endswith('.parquet')]
+    return in_fps
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getSharedInputs()
+#
+# DESCRIPTION: This function returns the input filepath arguments of a job
+# that can be replaced by a shared dataframe, as a {arg: filepath} dictionary.
+###############################################################################
+###############################################################################
+def getSharedInputs(job):
+
+    # Import packages.
+    import inspect
+
+    # Keep the filepath arguments whose dataframe argument the builder has.
+    params = inspect.signature(getBuilder(job['builder'])).parameters
+    shared = {}
+    for arg, df_arg in SHARED_INPUT_ARGS.items():
+        in_fp = job['args'].get(arg, '')
+        if df_arg in params and isinstance(in_fp, str) and in_fp.endswith('.parquet'):
+            shared[arg] = in_fp
+    return shared
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getJobOutput()
+#
+# DESCRIPTION: This function returns the output parquet filepath of a job, or
+# '' if the job does not save a parquet file.
+###############################################################################
+###############################################################################
+def getJobOutput(job):
+
+    # Combine the output folder and the output parquet file name.
+    outdsn_parquet = job['args'].get('outdsn_parquet', '')
+    if not outdsn_parquet.endswith('.parquet'):
+        return ''
+    return f"{job['args'].get('outpath', '')}/{outdsn_parquet}"
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: substituteVars()
+#
+# DESCRIPTION: This function replaces the '{VAR}' placeholders of the string
+# values (and the strings in list values) of a job argument.
+###############################################################################
+###############################################################################
+def substituteVars(value, config_vars):
+
+    # Substitute the vars in strings and lists of strings.
+    if isinstance(value, str):
+        for var, var_value in config_vars.items():
+            value = value.replace('{'+var+'}', str(var_value))
+        return value
+    if isinstance(value, list):
+        return [substituteVars(v, config_vars) for v in value]
+    return value
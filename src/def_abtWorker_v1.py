@@ -0,0 +1,303 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_abtWorker_v1
+#
+# DESCRIPTION: A resident ABT worker process, which removes the interpreter startup, the imports of pandas,
+# numpy and pyarrow, and the reloads of the dimension tables from every batch step. The worker imports the
+# packages and builder modules once, keeps the dimension tables (company overviews and ETF info, see
+# WARM_INPUT_ARGS) loaded in a warm table cache, and runs the ABT job requests it receives on a local
+# socket (or a named pipe on Windows) with runABTJobs() of def_abtDag_v1. A warm table is reloaded only
+# when its file fingerprint (see def_buildCache_v1.py) changes, so a refreshed company overview file is
+# picked up by the next request.
+#
+# The requests are served one at a time (the jobs of a request still run in parallel) and each response
+# holds the job report and the printed log of the run. The requests are pickled, so a client that can
+# connect can run any code in the worker: the connection is authenticated with a secret authkey, which is
+# the CREATE_ABT_AUTHKEY environment variable or else a random key that the worker start saves to a file
+# that only the user can read (WORKER_AUTHKEY_FP), and the worker only listens on the local machine.
+#
+# The worker checks the source fingerprint of the def_* modules (see def_buildCache_v1.py) before every
+# jobs request and reloads the modules if their source changed, so the jobs always run with the code that
+# their build cache entries are fingerprinted with.
+#
+# EXAMPLES
+#   python run/create_abt.py worker start --preload C:/DATA/COMPANY/companyOverviews_fmp_stock.parquet
+#   python run/create_abt.py jobs batch/abt_jobs.json --incremental --worker
+#   python run/create_abt.py piotroski --is-fp is.parquet --bs-fp bs.parquet --cf-fp cf.parquet --worker
+#   python run/create_abt.py worker stop
+############################################################################################################
+############################################################################################################
+
+# The default worker address, as a (host, port) socket address on the local machine. A named pipe address
+# such as \\.\pipe\create_abt can be used instead on Windows.
+WORKER_ADDRESS = ('localhost', 6360)
+
+# The authkey file of the worker connection, if the CREATE_ABT_AUTHKEY environment variable is not set.
+# The worker start creates it with a random key, readable only by the user, and the clients read it.
+WORKER_AUTHKEY_FP = '~/.create_abt_worker_authkey'
+
+# The builder filepath arguments of the dimension tables that the worker keeps warm.
+WARM_INPUT_ARGS = ['in_company_fp', 'in_etfinfo_fp']
+
+# The packages that the worker imports at startup, in addition to the builder modules.
+WARM_PACKAGES = ['numpy', 'pandas', 'pyarrow', 'pyarrow.parquet']
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getWorkerAddress()
+#
+# DESCRIPTION: This function converts a worker address string to the address
+# of multiprocessing.connection, where '' is the default address, 'host:port'
+# or 'port' is a socket address, and '\\.\pipe\name' is a Windows named pipe.
+###############################################################################
+###############################################################################
+def getWorkerAddress(
+    address = ''
+):
+
+    # Parse the address.
+    if not isinstance(address, str):
+        return address
+    if len(address)==0:
+        return WORKER_ADDRESS
+    if address.startswith('\\\\.\\pipe\\'):
+        return address
+    host, port = address.rsplit(':', 1) if ':' in address else ('localhost', address)
+    return (host, int(port))
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getWorkerAuthkey()
+#
+# DESCRIPTION: This function returns the authkey of the worker connection as bytes, from the argument, the
+# CREATE_ABT_AUTHKEY environment variable, or the authkey file WORKER_AUTHKEY_FP, in that order. There is
+# no default key. When the worker starts (create=True) without a key, the authkey file is created with a
+# random key if it does not exist, and its permissions are set so only the user can read it. A client
+# without a key raises a ValueError.
+#
+# FUNCTION INPUT ARGS
+#   - authkey = the authkey (optional)
+#   - create  = True to create the authkey file if there is no key (worker start only)
+#
+# OUTPUT
+#   - the authkey as bytes
+############################################################################################################
+############################################################################################################
+def getWorkerAuthkey(
+    authkey = '',
+    create  = False
+):
+
+    # Import packages.
+    import os
+    import secrets
+
+    # Use the argument or the environment variable.
+    if len(authkey)==0:
+        authkey = os.environ.get('CREATE_ABT_AUTHKEY', '')
+    if len(authkey)>0:
+        return authkey.encode()
+
+    # Create the authkey file with a random key, if requested. The file is
+    # created with user-only permissions (on Windows, the user profile folder
+    # is already private).
+    key_fp = os.path.expanduser(WORKER_AUTHKEY_FP)
+    if create and not os.path.isfile(key_fp):
+        fd = os.open(key_fp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+    if create:
+        os.chmod(key_fp, 0o600)
+
+    # Read the authkey file.
+    if not os.path.isfile(key_fp):
+        raise ValueError(f"No ABT worker authkey: set CREATE_ABT_AUTHKEY or start the worker, which creates {key_fp}")
+    with open(key_fp, 'r') as f:
+        authkey = f.read().strip()
+    if len(authkey)==0:
+        raise ValueError(f"The ABT worker authkey file {key_fp} is empty")
+    return authkey.encode()
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: reloadModules()
+#
+# DESCRIPTION: This function reloads the def_* modules that are imported. The
+# modules import each other inside their function bodies, so the next call of
+# a reloaded function uses the new code of every module.
+###############################################################################
+###############################################################################
+def reloadModules():
+
+    # Import packages.
+    import sys
+    import importlib
+
+    # Reload the imported def_* modules.
+    module_names = sorted(name for name in sys.modules if name.startswith('def_'))
+    for module_name in module_names:
+        importlib.reload(sys.modules[module_name])
+    return module_names
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: loadWarmTable()
+#
+# DESCRIPTION: This function returns a dimension table from the warm table
+# cache, and loads it into the cache if it is not there yet or if its file
+# fingerprint changed since it was loaded.
+###############################################################################
+###############################################################################
+def loadWarmTable(
+    table_cache,
+    in_fp
+):
+
+    # Import packages.
+    import pandas as pd
+    from def_buildCache_v1 import getFileFingerprint
+
+    # Reload the table if its file changed.
+    fingerprint = getFileFingerprint(in_fp)
+    if in_fp not in table_cache or table_cache[in_fp][0]!=fingerprint:
+        table_cache[in_fp] = (fingerprint, pd.read_parquet(in_fp, engine='pyarrow'))
+        print(f"Loaded the warm table {in_fp} ({len(table_cache[in_fp][1])} rows).")
+    return table_cache[in_fp][1]
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: runABTWorker()
+#
+# DESCRIPTION: This function starts the resident ABT worker and serves requests until it receives a 'stop'
+# request. A request is a dictionary with a 'command':
+#   - 'jobs' runs the ABT jobs of runABTJobs(), with the keys config, workers, jobs, var_dict, cache_fp,
+#     force, profile and preflight as its arguments, and responds with the job report and the printed log
+#   - 'ping' responds with the worker process id, start time, number of requests and warm tables
+#   - 'stop' stops the worker
+#
+# FUNCTION INPUT ARGS
+#   - address = the worker address, see getWorkerAddress() (optional)
+#   - authkey = the authkey of the connection, see getWorkerAuthkey() (optional, defaults to the
+#               CREATE_ABT_AUTHKEY environment variable or a random key in the authkey file)
+#   - preload = the list of dimension table filepaths to load at startup (optional)
+#   - workers = the default maximum number of jobs of a request that run at the same time (optional)
+############################################################################################################
+############################################################################################################
+def runABTWorker(
+    address = '',
+    authkey = '',
+    preload = [],
+    workers = 4
+):
+
+    # Import packages.
+    import io
+    import os
+    import time
+    import importlib
+    from datetime import datetime
+    from contextlib import redirect_stdout
+    from multiprocessing.connection import Listener
+    from def_abtDag_v1 import ABT_BUILDERS
+    from def_buildCache_v1 import getSourceFingerprint
+
+    # Import the packages and builder modules and load the dimension tables.
+    start = time.perf_counter()
+    for module_name in WARM_PACKAGES + sorted(set(module for module, func in ABT_BUILDERS.values())):
+        importlib.import_module(module_name)
+    table_cache = {}
+    for in_fp in preload:
+        loadWarmTable(table_cache, in_fp)
+    source_fingerprint = getSourceFingerprint()
+    start_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    n_requests = 0
+    print(f"The ABT worker (pid {os.getpid()}) warmed up in {time.perf_counter()-start:.1f} seconds.")
+
+    # Serve the requests one at a time until a stop request.
+    address = getWorkerAddress(address)
+    with Listener(address, authkey=getWorkerAuthkey(authkey, create=True)) as listener:
+        print(f"The ABT worker is listening on {address}.")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"Rejected a connection: {type(e).__name__}: {e}")
+                continue
+            with conn:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    continue
+                command = request.get('command', '') if isinstance(request, dict) else ''
+                n_requests += 1
+
+                # Stop the worker.
+                if command=='stop':
+                    conn.send({'status':'ok'})
+                    print('The ABT worker was stopped.')
+                    break
+
+                # Report the state of the worker.
+                elif command=='ping':
+                    conn.send({'status':'ok', 'pid':os.getpid(), 'start_time':start_time, 'requests':n_requests,
+                               'tables':sorted(table_cache.keys())})
+
+                # Run the ABT jobs with the warm tables and return the report
+                # and the printed log, after reloading the modules if their
+                # source changed since they were imported.
+                elif command=='jobs':
+                    start = time.perf_counter()
+                    log = io.StringIO()
+                    try:
+                        with redirect_stdout(log):
+                            if getSourceFingerprint()!=source_fingerprint:
+                                print(f"The def_* module source changed, so the modules were reloaded: {reloadModules()}")
+                                source_fingerprint = getSourceFingerprint()
+                            runABTJobs = importlib.import_module('def_abtDag_v1').runABTJobs
+                            report_df = runABTJobs(
+                                config      = request['config'],
+                                workers     = request.get('workers', workers),
+                                jobs        = request.get('jobs', []),
+                                var_dict    = request.get('var_dict', {}),
+                                cache_fp    = request.get('cache_fp', ''),
+                                force       = request.get('force', False),
+                                profile     = request.get('profile', ''),
+                                table_cache = table_cache,
+                                preflight   = request.get('preflight', False)
+                            )
+                        response = {'status':'ok', 'report':report_df.to_dict('records')}
+                    except Exception as e:
+                        response = {'status':'failed', 'error':f'{type(e).__name__}: {e}'}
+                    response.update(log=log.getvalue(), wall_sec=time.perf_counter()-start)
+                    conn.send(response)
+                    print(f"Request {n_requests} ({command}) finished with status {response['status']} in {response['wall_sec']:.1f} seconds.")
+                else:
+                    conn.send({'status':'failed', 'error':f"Unknown worker command: {command}"})
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: sendWorkerRequest()
+#
+# DESCRIPTION: This function sends a request to the resident ABT worker and
+# returns its response, see runABTWorker().
+###############################################################################
+###############################################################################
+def sendWorkerRequest(
+    request,
+    address = '',
+    authkey = ''
+):
+
+    # Import packages.
+    from multiprocessing.connection import Client
+
+    # Send the request and wait for the response.
+    with Client(getWorkerAddress(address), authkey=getWorkerAuthkey(authkey)) as conn:
+        conn.send(request)
+        return conn.recv()
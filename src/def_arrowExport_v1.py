@@ -0,0 +1,202 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_arrowExport_v1
+#
+# DESCRIPTION: The Arrow IPC (Feather version 2) output of the ABT builders, for the downstream processes
+# that reload the same ABTs many times a day. The file is written uncompressed, so a reader can memory-map
+# it and get the columns zero-copy, without the decode cost of a parquet file: readArrow() maps the file
+# and only materializes the selected columns (and rows) as a dataframe. The .arrow and .feather files are
+# the same format and can also be read by pyarrow.feather.read_table() or pandas.read_feather().
+#
+# REBUILDS WHILE MAPPED: On Linux and macOS, a rebuild replaces the file while a reader keeps its mapping of
+# the old file. On Windows, a file that is memory-mapped by a reader (e.g. a dashboard) can not be replaced
+# or deleted, so writeArrow() then saves the rebuilt ABT as a versioned file next to it (e.g.
+# priceABT_month_stock.20261019073400123456.arrow) instead of failing the build, and readArrow() always
+# reads the newest of the file and its versions. The versions are deleted by the next rebuild that can
+# replace the file, once no reader has them mapped.
+#
+# EXAMPLES
+#   writeArrow(out_df, 'C:/DATA/ABT/PRICE_ABT/priceABT_month_stock.arrow')
+#   price_df = readArrow('C:/DATA/ABT/PRICE_ABT/priceABT_month_stock.arrow', cols=['symbol','date','r_1y'])
+#   price_tbl = readArrow('C:/DATA/ABT/PRICE_ABT/priceABT_month_stock.arrow', as_table=True)
+############################################################################################################
+############################################################################################################
+
+# The Arrow IPC file extensions.
+ARROW_EXTENSIONS = ['.arrow', '.feather']
+
+# The number of rows per record batch of the Arrow IPC file.
+ARROW_CHUNK_ROWS = 100000
+
+# The timestamp format of the versioned files, see writeArrow().
+ARROW_VERSION_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: isArrowName()
+#
+# DESCRIPTION: This function returns True if the file name ends with one of
+# the ARROW_EXTENSIONS.
+###############################################################################
+###############################################################################
+def isArrowName(
+    outdsn_arrow
+):
+
+    return any(outdsn_arrow.endswith(ext) and len(outdsn_arrow)>len(ext) for ext in ARROW_EXTENSIONS)
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: writeArrow()
+#
+# DESCRIPTION: This function writes a dataframe to an uncompressed Arrow IPC file, converting and writing
+# ARROW_CHUNK_ROWS rows at a time as record batches. The file is first written to a temporary file next to
+# it and then renamed, so a reader never sees a partial file. If the file can not be replaced because a
+# reader has it memory-mapped (on Windows), the temporary file is renamed to a versioned file instead, which
+# readArrow() picks up (see REBUILDS WHILE MAPPED above). After the file was replaced, the older versioned
+# files that are no longer mapped are deleted.
+#
+# FUNCTION INPUT ARGS
+#   - out_df     = the dataframe to write
+#   - out_arrow  = the complete filepath to the Arrow IPC file
+#   - chunk_rows = the number of rows per record batch (optional)
+#
+# OUTPUT
+#   - the number of rows written
+############################################################################################################
+############################################################################################################
+def writeArrow(
+    out_df,
+    out_arrow,
+    chunk_rows = ARROW_CHUNK_ROWS
+):
+
+    # Import packages.
+    import os
+    from datetime import datetime
+    import pyarrow as pa
+
+    # Write the record batches to a temporary file.
+    schema = pa.Schema.from_pandas(out_df, preserve_index=False)
+    tmp_arrow = f'{out_arrow}.tmp'
+    with pa.OSFile(tmp_arrow, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for start in range(0, len(out_df), chunk_rows):
+            chunk = pa.Table.from_pandas(out_df.iloc[start:start+chunk_rows], schema=schema, preserve_index=False)
+            writer.write_table(chunk, max_chunksize=chunk_rows)
+
+    # Replace the file, or save a versioned file if the file is mapped by a
+    # reader and can not be replaced.
+    try:
+        os.replace(tmp_arrow, out_arrow)
+    except PermissionError:
+        stem, ext = os.path.splitext(out_arrow)
+        version_arrow = f"{stem}.{datetime.now().strftime(ARROW_VERSION_FORMAT)}{ext}"
+        os.replace(tmp_arrow, version_arrow)
+        print(f'The Arrow file {out_arrow} is in use, so the rebuilt ABT was saved as {version_arrow}.')
+        return len(out_df)
+
+    # Delete the older versioned files that are no longer mapped.
+    for version_arrow in getArrowVersions(out_arrow):
+        try:
+            os.remove(version_arrow)
+        except OSError:
+            pass
+    return len(out_df)
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: readArrow()
+#
+# DESCRIPTION: This function memory-maps an Arrow IPC file and returns the selected columns. The mapped
+# table references the file pages without copying them, so only the selected columns (of the selected
+# stocks) are read from disk and converted to a dataframe. If writeArrow() saved a newer versioned file
+# because the file was in use, the newest versioned file is read instead.
+#
+# FUNCTION INPUT ARGS
+#   - in_fp          = the complete filepath to the Arrow IPC file
+#   - cols           = the list of columns to return (optional, defaults to all columns)
+#   - symbol_filters = input list of stocks that are used to filter the rows (optional)
+#   - as_table       = True to return the zero-copy pyarrow table instead of a dataframe (optional)
+#
+# OUTPUT
+#   - the dataframe, or the pyarrow table if as_table is True
+############################################################################################################
+############################################################################################################
+def readArrow(
+    in_fp,
+    cols           = [],
+    symbol_filters = [],
+    as_table       = False
+):
+
+    # Import packages.
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    # Map the newest version of the file and select the columns.
+    in_fp = getLatestArrowPath(in_fp)
+    table = pa.ipc.open_file(pa.memory_map(in_fp, 'r')).read_all()
+    if len(cols)>0:
+        missing_cols = [col for col in cols if col not in table.column_names]
+        if len(missing_cols)>0:
+            raise ValueError(f"The columns are not in the Arrow file {in_fp}: {missing_cols}")
+        table = table.select(list(cols))
+
+    # If a stock filter list was specified, filter the rows.
+    if len(symbol_filters)>0:
+        symbol_filters = list(map(lambda x: x.upper(),symbol_filters))
+        table = table.filter(pc.is_in(table['symbol'], value_set=pa.array(symbol_filters)))
+
+    # Return the table or the dataframe.
+    if as_table:
+        return table
+    return table.to_pandas()
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getArrowVersions()
+#
+# DESCRIPTION: This function returns the versioned files of an Arrow IPC file
+# that writeArrow() saved while the file was in use, oldest first.
+###############################################################################
+###############################################################################
+def getArrowVersions(
+    arrow_fp
+):
+
+    # Import packages.
+    import os
+    import re
+    import glob
+
+    # Match the <stem>.<timestamp><ext> files of the file.
+    stem, ext = os.path.splitext(arrow_fp)
+    pattern = re.compile(re.escape(os.path.basename(stem)) + r'\.\d{20}' + re.escape(ext) + '$')
+    version_fps = [fp for fp in glob.glob(f'{glob.escape(stem)}.*{ext}') if pattern.match(os.path.basename(fp))]
+    return sorted(version_fps)
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getLatestArrowPath()
+#
+# DESCRIPTION: This function returns the newest of an Arrow IPC file and its
+# versioned files (see getArrowVersions()), by modification time.
+###############################################################################
+###############################################################################
+def getLatestArrowPath(
+    arrow_fp
+):
+
+    # Import packages.
+    import os
+
+    # Compare the modification times of the existing files.
+    fps = [fp for fp in [arrow_fp] + getArrowVersions(arrow_fp) if os.path.isfile(fp)]
+    if len(fps)==0:
+        return arrow_fp
+    return max(fps, key=lambda fp: os.stat(fp).st_mtime_ns)
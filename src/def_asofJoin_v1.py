@@ -0,0 +1,146 @@
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: asofJoin()
+#
+# DESCRIPTION: This function performs a point-in-time (as-of) join. For each row of the left dataframe, it
+# attaches the columns of the latest right dataframe row of the same symbol whose availability date is on
+# or before the left row's date (direction='backward'), or the earliest right row whose availability date
+# is on or after it (direction='forward'). The availability date of a right row is its date column plus an
+# optional delay in days (e.g. a filing delay for financial statements). Rows without a match get missing
+# values, and the left rows are always kept in their original order.
+#
+# The symbols of both dataframes are encoded to shared integer codes and combined with the dates, in days,
+# into one int64 key per row. Since the right keys are sorted by (symbol, date), all left rows are matched
+# with a single searchsorted pass over the symbol-partitioned arrays instead of a per-symbol loop.
+#
+# FUNCTION INPUT ARGS
+#   - left_df        = the left dataframe (e.g. the monthly price grid)
+#   - right_df       = the right dataframe (e.g. the quarterly fundamentals)
+#   - left_on        = the name of the date column of left_df
+#   - right_on       = the name of the date column of right_df (e.g. 'date' or a filing date column)
+#   - by             = the name of the symbol column of both dataframes
+#   - cols           = the list of right_df columns to attach (optional, defaults to all other columns)
+#   - lag_days       = the delay, in days, added to the right dates before matching (optional)
+#   - tolerance_days = the maximum number of days between the matched dates (optional, None for no limit)
+#   - direction      = 'backward' (latest available row) or 'forward' (earliest upcoming row)
+#   - match_col      = the name of a column that receives the matched right date (optional)
+#   - suffix         = the suffix added to attached columns whose name already exists in left_df
+#
+# OUTPUT DATAFRAMES
+#   - out_df = left_df with the matched right_df columns attached
+############################################################################################################
+############################################################################################################
+def asofJoin(
+    left_df,
+    right_df,
+    left_on        = 'date',
+    right_on       = 'date',
+    by             = 'symbol',
+    cols           = [],
+    lag_days       = 0,
+    tolerance_days = None,
+    direction      = 'backward',
+    match_col      = '',
+    suffix         = '_r'
+):
+
+    ###################################################################
+    # Import packages.
+    ###################################################################
+    import pandas as pd
+    import numpy as np
+
+    ###################################################################
+    # Specify the right columns to attach.
+    ###################################################################
+    if len(cols)==0:
+        cols = [col for col in right_df.columns if col not in [by, right_on]]
+
+    ###################################################################
+    # Encode the symbols of both dataframes to shared integer codes and
+    # the dates to days, and drop the right rows without a date.
+    ###################################################################
+    right_df = right_df.loc[right_df[right_on].notnull()]
+    codes, uniques = pd.factorize(pd.concat([left_df[by], right_df[by]], ignore_index=True), sort=True)
+    left_code = codes[:len(left_df)].astype('int64')
+    right_code = codes[len(left_df):].astype('int64')
+    left_day = getDays(left_df[left_on])
+    right_day = getDays(right_df[right_on]) + int(lag_days)
+
+    ###################################################################
+    # Build the combined (symbol, day) keys and sort the right keys. The
+    # day values are offset so they are non-negative and fit in the
+    # lower 32 bits of the key.
+    ###################################################################
+    offset = 2**31
+    left_null = (left_day==np.iinfo('int64').min)
+    left_key = (left_code << 32) | (np.where(left_null, 0, left_day) + offset)
+    right_key = (right_code << 32) | (right_day + offset)
+    right_order = np.argsort(right_key, kind='stable')
+    right_key = right_key[right_order]
+
+    ###################################################################
+    # Match all the left rows in one searchsorted pass. A match is only
+    # valid if it belongs to the same symbol and is within the tolerance.
+    ###################################################################
+    if direction=='backward':
+        pos = np.searchsorted(right_key, left_key, side='right') - 1
+    elif direction=='forward':
+        pos = np.searchsorted(right_key, left_key, side='left')
+    else:
+        raise ValueError(f"Unknown direction '{direction}', expected 'backward' or 'forward'")
+    in_range = (pos>=0) & (pos<len(right_key))
+    pos = np.clip(pos, 0, max(len(right_key)-1, 0))
+    valid = in_range & ~left_null
+    if len(right_key)>0:
+        valid &= ((right_key[pos] >> 32)==left_code)
+        if tolerance_days is not None:
+            gap_days = np.abs((right_key[pos] & (2**32-1)) - offset - left_day)
+            valid &= (gap_days<=tolerance_days)
+
+    ###################################################################
+    # Gather the matched right rows and blank out the rows without a
+    # valid match.
+    ###################################################################
+    take_idx = right_order[pos] if len(right_key)>0 else np.zeros(len(left_df), dtype='int64')
+    attach_cols = cols + ([right_on] if len(match_col)>0 else [])
+    if len(right_key)>0:
+        match_df = right_df[list(dict.fromkeys(attach_cols))].iloc[take_idx].reset_index(drop=True)
+        match_df = match_df.where(np.broadcast_to(valid[:,None], match_df.shape))
+    else:
+        match_df = pd.DataFrame(np.nan, index=range(len(left_df)), columns=list(dict.fromkeys(attach_cols)))
+
+    ###################################################################
+    # Attach the matched columns to the left dataframe.
+    ###################################################################
+    out_df = left_df.reset_index(drop=True).copy()
+    for col in cols:
+        out_col = col+suffix if col in out_df.columns else col
+        out_df[out_col] = match_df[col].to_numpy()
+    if len(match_col)>0:
+        out_df[match_col] = match_df[right_on].to_numpy()
+    out_df.index = left_df.index
+
+    ###################################################################
+    # RETURN the output dataframe.
+    ###################################################################
+    return out_df
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getDays()
+#
+# DESCRIPTION: This function converts a date column to int64 days since the
+# epoch, where missing dates are set to the minimum int64 value.
+###############################################################################
+###############################################################################
+def getDays(date_col):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+
+    # Convert the dates to whole days.
+    days = pd.to_datetime(date_col).to_numpy().astype('datetime64[D]')
+    return np.where(np.isnat(days), np.iinfo('int64').min, days.astype('int64'))
@@ -0,0 +1,289 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_benchmark_v1
+#
+# DESCRIPTION: A benchmark suite for the ABT builders. Each builder is run on the synthetic input files of
+# def_syntheticData_v1 at increasing universe sizes (number of stocks) and history lengths (years), and the
+# wall time, rows, rows per second, and peak memory of every run are collected from its run report (see
+# def_runReport_v1.py), together with the breakdown by builder stage (the feature blocks, e.g. ttm_windows,
+# ratios, rolling_windows). Every run is done in a fresh Python process, so the peak memory is the peak
+# resident memory of that run only.
+#
+# The results are saved as a JSON file with the commit, so the results of two commits can be compared with
+# compareBenchmarks(), which flags the runs that are slower (or use more memory) than the baseline by more
+# than a threshold.
+#
+# EXAMPLES
+#   python run/create_abt.py benchmark --outpath C:/TEMP/BENCH --sizes 10 100 1000 --years 10 20
+#   python run/create_abt.py benchmark --outpath C:/TEMP/BENCH --baseline C:/TEMP/BENCH/benchmark_0be0ec6.json
+############################################################################################################
+############################################################################################################
+
+# The builders of the benchmark, with the synthetic input file (see SYNTHETIC_FILES) of each filepath
+# argument.
+BENCHMARK_BUILDERS = {
+    'price':        {'in_fp':'price_stock', 'in_company_fp':'company_stock'},
+    'keymetric':    {'in_fp':'keymetric', 'in_company_fp':'company_stock'},
+    'finstatement': {'is_fp':'is', 'bs_fp':'bs', 'cf_fp':'cf', 'in_company_fp':'company_stock', 'fx_fp':'fx'},
+    'piotroski':    {'is_fp':'is', 'bs_fp':'bs', 'cf_fp':'cf', 'in_company_fp':'company_stock'},
+}
+
+# The default universe sizes (number of stocks) and history lengths (years) of the benchmark.
+BENCHMARK_SIZES = [10, 100, 1000, 10000]
+BENCHMARK_YEARS = [10, 20]
+
+# The default regression threshold (the relative increase of the wall time or peak memory over the
+# baseline), and the minimum baseline wall time in seconds of the runs that are checked, since shorter runs
+# are dominated by noise.
+BENCHMARK_THRESHOLD = 0.25
+BENCHMARK_MIN_WALL_SEC = 1.0
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getCommit()
+#
+# DESCRIPTION: This function returns the git commit hash of the codebase, or
+# '' if the codebase is not a git repository.
+###############################################################################
+###############################################################################
+def getCommit():
+
+    # Import packages.
+    import os
+    import subprocess
+
+    # Ask git for the commit of the folder of this module.
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True)
+    except OSError:
+        return ''
+    return result.stdout.strip() if result.returncode==0 else ''
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: runBenchmarkCase()
+#
+# DESCRIPTION: This function runs one builder on one set of synthetic input files in a fresh Python process
+# and returns the results of its run report. The builder output is saved as parquet in the output folder,
+# since writing the output is part of every production run.
+#
+# FUNCTION INPUT ARGS
+#   - builder  = the builder name, see BENCHMARK_BUILDERS
+#   - fp_dict  = the dictionary of the synthetic input filepaths, see createSyntheticData()
+#   - min_date = the minimum date filter of the builder
+#   - outpath  = the folder where the builder output and run report are saved
+#
+# OUTPUT
+#   - the result dictionary (status, wall_sec, rows, rows_per_sec, peak_mem_mb, stages, and error if the
+#     run failed)
+############################################################################################################
+############################################################################################################
+def runBenchmarkCase(
+    builder,
+    fp_dict,
+    min_date,
+    outpath
+):
+
+    # Import packages.
+    import os
+    import sys
+    import json
+    import subprocess
+
+    # Specify the builder arguments.
+    name = f'benchmark_{builder}'
+    kwargs = {arg: fp_dict[key] for arg, key in BENCHMARK_BUILDERS[builder].items()}
+    kwargs.update(min_date=min_date, outpath=outpath, outdsn_parquet=name+'.parquet', outdsn_csv='')
+    report_fp = os.path.join(outpath, name+'_runReport.json')
+    if os.path.isfile(report_fp):
+        os.remove(report_fp)
+
+    # Run the builder in a fresh process.
+    src_path = os.path.dirname(os.path.abspath(__file__))
+    code = 'import sys, json; sys.path.insert(0, sys.argv[1]); from def_abtDag_v1 import getBuilder; getBuilder(sys.argv[2])(**json.loads(sys.argv[3]))'
+    result = subprocess.run([sys.executable, '-W', 'ignore', '-c', code, src_path, builder, json.dumps(kwargs)],
+                            capture_output=True, text=True)
+    if result.returncode!=0 or not os.path.isfile(report_fp):
+        error = (result.stderr.strip().splitlines() or ['no run report'])[-1]
+        return {'status':'failed', 'wall_sec':None, 'rows':None, 'rows_per_sec':None, 'peak_mem_mb':None, 'stages':[], 'error':error}
+
+    # Collect the results of the run report.
+    with open(report_fp, 'r') as f:
+        report = json.load(f)
+    out = {'status':'done'}
+    out.update({key: report[key] for key in ['wall_sec','rows','rows_per_sec','peak_mem_mb','stages']})
+    return out
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: runBenchmark()
+#
+# DESCRIPTION: This function runs the benchmark of the ABT builders on every combination of universe size
+# and history length. The synthetic input files of each combination are created in the output folder once
+# and reused by later benchmarks, since they only depend on the size, history length and seed. Each run
+# is repeated and the fastest repeat is kept. The results are printed, saved as a JSON file, and compared
+# with the baseline results, if a baseline file was given.
+#
+# FUNCTION INPUT ARGS
+#   - outpath     = the folder of the synthetic data, the builder outputs and the results file
+#   - builders    = the list of builders to run, see BENCHMARK_BUILDERS (optional, defaults to all)
+#   - sizes       = the list of universe sizes, as numbers of stocks (optional)
+#   - years       = the list of history lengths in years (optional)
+#   - seed        = the random seed of the synthetic data (optional)
+#   - repeat      = the number of runs of every builder and size, of which the fastest is kept (optional)
+#   - out_fp      = the results JSON file (optional, defaults to benchmark_<commit>.json in outpath)
+#   - baseline_fp = the results JSON file of the baseline commit to compare with (optional)
+#   - threshold   = the regression threshold, see compareBenchmarks() (optional)
+#
+# OUTPUT DATAFRAMES
+#   - result_df  = one row per builder, size and history length (builder, n_symbols, n_years, status,
+#                  wall_sec, rows, rows_per_sec, peak_mem_mb)
+#   - compare_df = the comparison with the baseline, see compareBenchmarks() (empty without a baseline)
+############################################################################################################
+############################################################################################################
+def runBenchmark(
+    outpath,
+    builders    = [],
+    sizes       = BENCHMARK_SIZES,
+    years       = BENCHMARK_YEARS,
+    seed        = 0,
+    repeat      = 1,
+    out_fp      = '',
+    baseline_fp = '',
+    threshold   = BENCHMARK_THRESHOLD
+):
+
+    # Import packages.
+    import os
+    import sys
+    import json
+    import platform
+    import pandas as pd
+    from datetime import datetime
+    from def_syntheticData_v1 import SYNTHETIC_FILES, createSyntheticData
+
+    # Check the builders.
+    if len(builders)==0:
+        builders = list(BENCHMARK_BUILDERS.keys())
+    unknown = [builder for builder in builders if builder not in BENCHMARK_BUILDERS]
+    if len(unknown)>0:
+        raise ValueError(f"Unknown benchmark builders {unknown}, the builders are {list(BENCHMARK_BUILDERS.keys())}")
+    commit = getCommit()
+    end_date = '2024-06-14'
+    results = []
+
+    # Run every builder on every size and history length.
+    for n_years in years:
+        for n_symbols in sizes:
+            data_path = os.path.join(outpath, f'SYNTH_{n_symbols}_{n_years}y_seed{seed}')
+            fp_dict = {key: os.path.join(data_path, fp) for key, fp in SYNTHETIC_FILES.items()}
+            if not all(os.path.isfile(fp) for fp in fp_dict.values()):
+                fp_dict = createSyntheticData(data_path, n_symbols=n_symbols, n_etfs=0, n_years=n_years, end_date=end_date, seed=seed)
+            min_date = f'{int(end_date[0:4])-n_years}-01-01'
+            case_path = os.path.join(data_path, 'ABT')
+            for builder in builders:
+                case_list = [runBenchmarkCase(builder, fp_dict, min_date, case_path) for i in range(repeat)]
+                done_list = [case for case in case_list if case['status']=='done']
+                case = min(done_list, key=lambda c: c['wall_sec']) if len(done_list)>0 else case_list[0]
+                print(f"Benchmark {builder:<12} {n_symbols:>6} stocks {n_years:>3} years: {case['status']}, "
+                      f"{case['wall_sec']} seconds, {case['peak_mem_mb']} MB" + (f" ({case['error']})" if 'error' in case else ''))
+                results.append({'builder':builder, 'n_symbols':n_symbols, 'n_years':n_years, **case})
+
+    # Save the results with the commit and the platform.
+    if len(out_fp)==0:
+        out_fp = os.path.join(outpath, f'benchmark_{commit[0:7] if len(commit)>0 else "nocommit"}.json')
+    benchmark = {
+        'commit':     commit,
+        'start_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python':     sys.version.split()[0],
+        'platform':   platform.platform(),
+        'seed':       seed,
+        'repeat':     repeat,
+        'results':    results
+    }
+    with open(out_fp, 'w') as f:
+        json.dump(benchmark, f, indent=4)
+
+    # Print the scaling curves and the stage breakdown.
+    result_df = pd.DataFrame(results)[['builder','n_symbols','n_years','status','wall_sec','rows','rows_per_sec','peak_mem_mb']]
+    stage_df = pd.DataFrame([{'builder':r['builder'], 'n_symbols':r['n_symbols'], 'n_years':r['n_years'], **stage}
+                             for r in results for stage in r['stages']])
+    print('\nBenchmark results:')
+    print(result_df.to_string(index=False))
+    if len(stage_df)>0:
+        print('\nWall seconds by builder stage:')
+        print(stage_df.pivot_table(index=['builder','stage'], columns=['n_years','n_symbols'], values='wall_sec', aggfunc='sum').round(3).to_string())
+    print(f'\nSaved the benchmark results to {out_fp}.')
+
+    # Compare the results with the baseline, if one was given.
+    compare_df = pd.DataFrame()
+    if len(baseline_fp)>0:
+        compare_df = compareBenchmarks(out_fp, baseline_fp, threshold=threshold)
+    return result_df, compare_df
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: compareBenchmarks()
+#
+# DESCRIPTION: This function compares two benchmark results files by builder, size and history length. A
+# run is a regression if its wall time or peak memory is higher than the baseline by more than the
+# threshold (e.g. 0.25 = 25%). Runs with a baseline wall time below min_wall_sec are not checked for time
+# regressions, since their wall time is dominated by noise, and runs that failed in the current results
+# but not in the baseline are always regressions.
+#
+# FUNCTION INPUT ARGS
+#   - result_fp    = the current benchmark results JSON file
+#   - baseline_fp  = the baseline benchmark results JSON file
+#   - threshold    = the regression threshold (optional)
+#   - min_wall_sec = the minimum baseline wall time of the runs that are checked for time regressions
+#
+# OUTPUT DATAFRAMES
+#   - compare_df = one row per builder, size and history length in both files (builder, n_symbols,
+#                  n_years, wall_sec, base_wall_sec, wall_ratio, peak_mem_mb, base_peak_mem_mb,
+#                  mem_ratio, regression)
+############################################################################################################
+############################################################################################################
+def compareBenchmarks(
+    result_fp,
+    baseline_fp,
+    threshold    = BENCHMARK_THRESHOLD,
+    min_wall_sec = BENCHMARK_MIN_WALL_SEC
+):
+
+    # Import packages.
+    import json
+    import pandas as pd
+
+    # Load both results files.
+    key_cols = ['builder','n_symbols','n_years']
+    df_list = []
+    for fp in [result_fp, baseline_fp]:
+        with open(fp, 'r') as f:
+            benchmark = json.load(f)
+        df = pd.DataFrame(benchmark['results'], columns=key_cols+['status','wall_sec','peak_mem_mb'])
+        df_list.append((benchmark.get('commit',''), df))
+    (commit, result_df), (base_commit, base_df) = df_list
+
+    # Compare the wall times and peak memory of the runs in both files.
+    compare_df = pd.merge(result_df, base_df, on=key_cols, how='inner', suffixes=('','_base'))
+    compare_df = compare_df.rename(columns={'status_base':'base_status', 'wall_sec_base':'base_wall_sec', 'peak_mem_mb_base':'base_peak_mem_mb'})
+    compare_df['wall_ratio'] = (compare_df['wall_sec']/compare_df['base_wall_sec']).round(3)
+    compare_df['mem_ratio'] = (compare_df['peak_mem_mb']/compare_df['base_peak_mem_mb']).round(3)
+    slower = (compare_df['wall_ratio']>1+threshold) & (compare_df['base_wall_sec']>=min_wall_sec)
+    bigger = compare_df['mem_ratio']>1+threshold
+    failed = (compare_df['status']!='done') & (compare_df['base_status']=='done')
+    compare_df['regression'] = slower | bigger | failed
+    compare_df = compare_df[key_cols+['wall_sec','base_wall_sec','wall_ratio','peak_mem_mb','base_peak_mem_mb','mem_ratio','regression']]
+
+    # Print the comparison.
+    print(f'\nBenchmark comparison of {commit[0:7]} with the baseline {base_commit[0:7]} (threshold {threshold:.0%}):')
+    print(compare_df.to_string(index=False))
+    n_regressions = int(compare_df['regression'].sum())
+    print(f'{n_regressions} regression(s) found.' if n_regressions>0 else 'No regressions found.')
+    return compare_df
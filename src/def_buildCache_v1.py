@@ -0,0 +1,245 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_buildCache_v1
+#
+# DESCRIPTION: A content fingerprint build cache for the ABT jobs of def_abtDag_v1. The fingerprint of a
+# job combines the builder, the source code of all the def_* modules (the builder module and the shared
+# helpers it imports), the builder arguments, and the fingerprint (size, modification time, and a hash of
+# the parquet footer metadata) of every input file, including non-parquet files such as a dq_rules JSON
+# file that is passed by its filepath. After a job finishes, its fingerprint and the fingerprint of its
+# output file are recorded in a JSON cache file. On the next run, a job is skipped if its fingerprint is
+# unchanged and its output file is still the one it wrote, so e.g. the price ABT jobs are no-ops on the
+# days when only the fundamentals were refreshed. Since a rebuilt output file gets a new fingerprint, the
+# jobs that read it are rebuilt as well.
+############################################################################################################
+############################################################################################################
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getFileFingerprint()
+#
+# DESCRIPTION: This function returns the fingerprint of a file, which is built from its size, modification
+# time and, for parquet files, a hash of the footer metadata (schema, row groups and column statistics).
+# Only the footer is read, so the fingerprint is cheap even for large files. For a folder (e.g. a
+# partitioned parquet dataset), the fingerprints of all the files in the folder are combined.
+#
+# FUNCTION INPUT ARGS
+#   - fp = the complete filepath (or folder path)
+#
+# OUTPUT
+#   - the fingerprint as a hex string, or '' if the file does not exist
+############################################################################################################
+############################################################################################################
+def getFileFingerprint(
+    fp
+):
+
+    # Import packages.
+    import os
+    import json
+    import hashlib
+    import pyarrow.parquet as pq
+
+    # Combine the fingerprints of all the files of a folder.
+    if os.path.isdir(fp):
+        parts = []
+        for root, dirs, files in os.walk(fp):
+            for name in sorted(files):
+                parts.append(os.path.relpath(os.path.join(root, name), fp) + ':' + getFileFingerprint(os.path.join(root, name)))
+        return hashlib.sha256('\n'.join(sorted(parts)).encode()).hexdigest()
+    if not os.path.isfile(fp):
+        return ''
+
+    # Fingerprint the size, modification time and parquet footer metadata.
+    stat = os.stat(fp)
+    parts = [str(stat.st_size), str(stat.st_mtime_ns)]
+    if fp.endswith('.parquet'):
+        metadata = pq.read_metadata(fp)
+        parts.append(metadata.schema.to_arrow_schema().to_string())
+        parts.append(json.dumps(metadata.to_dict(), sort_keys=True, default=str))
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getJobFingerprint()
+#
+# DESCRIPTION: This function returns the fingerprint of an ABT job, which changes whenever the builder, the
+# source code of any def_* module (see getSourceFingerprint()), the builder arguments, or any of the input
+# files (see getJobFiles()) change.
+#
+# FUNCTION INPUT ARGS
+#   - job = the job dictionary, see def_abtDag_v1.py
+#
+# OUTPUT
+#   - the fingerprint as a hex string
+############################################################################################################
+############################################################################################################
+def getJobFingerprint(
+    job
+):
+
+    # Import packages.
+    import json
+    import hashlib
+
+    # Fingerprint the builder, the source code and the arguments.
+    parts = [job['builder'], getSourceFingerprint()]
+    parts.append(json.dumps(job['args'], sort_keys=True, default=str))
+
+    # Fingerprint the input files.
+    for in_fp in getJobFiles(job):
+        parts.append(in_fp + ':' + getFileFingerprint(in_fp))
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getSourceFingerprint()
+#
+# DESCRIPTION: This function returns a hash of the source code of all the
+# def_* modules in the src folder. The builders import shared helpers (e.g.
+# def_statementUtils_v1, def_dqRules_v1), so a change to any module can change
+# the output of any builder.
+###############################################################################
+###############################################################################
+def getSourceFingerprint():
+
+    # Import packages.
+    import os
+    import glob
+    import hashlib
+
+    # Hash the module names and sources in name order.
+    src_path = os.path.dirname(os.path.abspath(__file__))
+    source_hash = hashlib.sha256()
+    for module_fp in sorted(glob.glob(os.path.join(src_path, 'def_*.py'))):
+        source_hash.update(os.path.basename(module_fp).encode())
+        with open(module_fp, 'rb') as f:
+            source_hash.update(f.read())
+    return source_hash.hexdigest()
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getJobFiles()
+#
+# DESCRIPTION: This function returns the sorted list of input files of a job,
+# which are its input parquet files (see getJobInputs() in def_abtDag_v1.py)
+# and every other argument value that is an existing file or folder, except
+# the output folder, the output file names and the job's own output file.
+###############################################################################
+###############################################################################
+def getJobFiles(
+    job
+):
+
+    # Import packages.
+    import os
+    from def_abtDag_v1 import getJobInputs, getJobOutput
+
+    # Collect the parquet inputs and the existing file arguments.
+    in_fps = set(getJobInputs(job))
+    for arg, value in job['args'].items():
+        if arg=='outpath' or arg.startswith('outdsn'):
+            continue
+        values = value if isinstance(value, list) else [value]
+        in_fps |= {v for v in values if isinstance(v, str) and len(v)>0 and os.path.exists(v)}
+    return sorted(in_fps - {getJobOutput(job)})
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: loadBuildCache()
+#
+# DESCRIPTION: This function loads the build cache JSON file, which has one entry per job name with the job
+# fingerprint, the output filepath and the output fingerprint. A missing or unreadable cache file gives an
+# empty cache, which rebuilds every job.
+#
+# FUNCTION INPUT ARGS
+#   - cache_fp = the complete filepath to the build cache JSON file
+#
+# OUTPUT
+#   - the cache dictionary
+############################################################################################################
+############################################################################################################
+def loadBuildCache(
+    cache_fp
+):
+
+    # Import packages.
+    import os
+    import json
+
+    # Load the cache, if it exists.
+    if not os.path.isfile(cache_fp):
+        return {}
+    try:
+        with open(cache_fp, 'r') as f:
+            return json.load(f)
+    except ValueError:
+        print(f'The build cache {cache_fp} could not be read, so all the jobs are rebuilt.')
+        return {}
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: saveBuildCache()
+#
+# DESCRIPTION: This function saves the build cache JSON file. The file is written to a temporary file first
+# and then renamed, so an interrupted run never leaves a partial cache file.
+#
+# FUNCTION INPUT ARGS
+#   - cache    = the cache dictionary
+#   - cache_fp = the complete filepath to the build cache JSON file
+############################################################################################################
+############################################################################################################
+def saveBuildCache(
+    cache,
+    cache_fp
+):
+
+    # Import packages.
+    import os
+    import json
+
+    # Write the cache to a temporary file and rename it.
+    tmp_fp = cache_fp + '.tmp'
+    with open(tmp_fp, 'w') as f:
+        json.dump(cache, f, indent=4, sort_keys=True)
+    os.replace(tmp_fp, cache_fp)
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: isJobCached()
+#
+# DESCRIPTION: This function checks whether an ABT job can be skipped, which is the case if the cache has
+# an entry for the job with the same job fingerprint, and the job's output file still exists with the same
+# fingerprint it had when the job wrote it. Jobs without an output file are never skipped.
+#
+# FUNCTION INPUT ARGS
+#   - job             = the job dictionary, see def_abtDag_v1.py
+#   - cache           = the cache dictionary
+#   - job_fingerprint = the current fingerprint of the job, from getJobFingerprint()
+#
+# OUTPUT
+#   - True if the job can be skipped, False otherwise
+############################################################################################################
+############################################################################################################
+def isJobCached(
+    job,
+    cache,
+    job_fingerprint
+):
+
+    # Import packages.
+    from def_abtDag_v1 import getJobOutput
+
+    # Compare the job fingerprint and the output file fingerprint.
+    entry = cache.get(job['name'], {})
+    out_fp = getJobOutput(job)
+    if len(out_fp)==0 or entry.get('job_fingerprint')!=job_fingerprint or entry.get('output')!=out_fp:
+        return False
+    return entry.get('output_fingerprint')==getFileFingerprint(out_fp)
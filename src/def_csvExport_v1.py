@@ -0,0 +1,196 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_csvExport_v1
+#
+# DESCRIPTION: The CSV export of the ABT builders, which writes the output dataframe with the columnar CSV
+# writer of pyarrow instead of out_df.to_csv(). The dataframe is converted and written in chunks of
+# CSV_CHUNK_ROWS rows, so the CSV text of the whole ABT is never held in memory, and the file can be gzip or
+# zstd compressed on the fly by its extension (see CSV_EXTENSIONS). The write can run in a background
+# thread with startCSVWrite(), so it runs at the same time as the parquet write of the builder, and it can
+# be limited to a subset of the columns for the consumers that open the CSV files in Excel.
+#
+# The output is close to the to_csv() output: the timestamp columns without a time of day are written as
+# dates and the other timestamp columns without fractional seconds, and missing values are empty. The
+# string values are quoted and the booleans are written as true/false. The object columns with mixed value
+# types (e.g. numbers and strings), which have no Arrow type, are written as strings.
+#
+# EXAMPLES
+#   writeCSV(out_df, 'C:/DATA/ABT/PRICE_ABT/priceABT_month_stock.csv.gz', cols=['symbol','date','r_1y'])
+#   csv_write = startCSVWrite(out_df, f'{outpath}/{outdsn_csv}')
+#   out_df.to_parquet(f'{outpath}/{outdsn_parquet}', index=False)
+#   csv_write.result()
+############################################################################################################
+############################################################################################################
+
+# The number of rows that are converted and written at a time.
+CSV_CHUNK_ROWS = 100000
+
+# The CSV file extensions, as {extension: pyarrow compression codec}, where '' is no compression. zstd
+# compresses about as well as gzip in a fraction of the time.
+CSV_EXTENSIONS = {
+    '.csv':     '',
+    '.csv.gz':  'gzip',
+    '.csv.zst': 'zstd',
+}
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getCSVExtension()
+#
+# DESCRIPTION: This function returns the longest of the CSV_EXTENSIONS that the
+# file name ends with, or '' if it is not a CSV file name.
+###############################################################################
+###############################################################################
+def getCSVExtension(
+    outdsn_csv
+):
+
+    extensions = [ext for ext in CSV_EXTENSIONS if outdsn_csv.endswith(ext) and len(outdsn_csv)>len(ext)]
+    return max(extensions, key=len, default='')
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: isCSVName()
+#
+# DESCRIPTION: This function returns True if the file name ends with one of
+# the CSV_EXTENSIONS.
+###############################################################################
+###############################################################################
+def isCSVName(
+    outdsn_csv
+):
+
+    return len(getCSVExtension(outdsn_csv))>0
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getMixedColumns()
+#
+# DESCRIPTION: This function returns the object columns of a dataframe whose
+# values have mixed types (e.g. [1, 'a', None]), which cannot be converted to
+# an Arrow column.
+###############################################################################
+###############################################################################
+def getMixedColumns(
+    out_df
+):
+
+    # Import packages.
+    import pandas as pd
+
+    # Infer the value types of the object columns, skipping missing values.
+    obj_cols = [col for col in out_df.columns if out_df[col].dtype==object]
+    return [col for col in obj_cols if pd.api.types.infer_dtype(out_df[col], skipna=True) in ['mixed','mixed-integer']]
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getCSVSchema()
+#
+# DESCRIPTION: This function returns the pyarrow schema that the dataframe is
+# written with, where the timestamp columns without a time of day are dates
+# and the timestamp columns without fractional seconds are in seconds.
+###############################################################################
+###############################################################################
+def getCSVSchema(
+    out_df
+):
+
+    # Import packages.
+    import pyarrow as pa
+
+    # Infer the schema and narrow the timestamp columns.
+    schema = pa.Schema.from_pandas(out_df, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_timestamp(field.type) and field.type.tz is None:
+            values = out_df[field.name]
+            if (values.dropna()==values.dropna().dt.normalize()).all():
+                schema = schema.set(i, pa.field(field.name, pa.date32()))
+            elif (values.dropna()==values.dropna().dt.floor('s')).all():
+                schema = schema.set(i, pa.field(field.name, pa.timestamp('s')))
+    return schema
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: writeCSV()
+#
+# DESCRIPTION: This function writes a dataframe to a CSV file with the pyarrow CSV writer, converting and
+# writing CSV_CHUNK_ROWS rows at a time. The file is compressed if its name ends with .csv.gz or .csv.zst.
+#
+# FUNCTION INPUT ARGS
+#   - out_df     = the dataframe to write
+#   - out_csv    = the complete filepath to the CSV file
+#   - cols       = the list of columns to write (optional, defaults to all columns)
+#   - chunk_rows = the number of rows that are converted and written at a time (optional)
+#
+# OUTPUT
+#   - the number of rows written
+############################################################################################################
+############################################################################################################
+def writeCSV(
+    out_df,
+    out_csv,
+    cols       = [],
+    chunk_rows = CSV_CHUNK_ROWS
+):
+
+    # Import packages.
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    # Select the columns and get the compression from the file extension.
+    if len(cols)>0:
+        missing_cols = [col for col in cols if col not in out_df.columns]
+        if len(missing_cols)>0:
+            raise ValueError(f"The CSV columns are not in the output dataframe: {missing_cols}")
+        out_df = out_df[list(cols)]
+    extension = getCSVExtension(out_csv)
+    if len(extension)==0:
+        raise ValueError(f"The CSV file {out_csv} must end with one of {list(CSV_EXTENSIONS.keys())}")
+    compression = CSV_EXTENSIONS[extension]
+
+    # Convert the mixed type object columns to strings, keeping the missing
+    # values, so they can be converted to Arrow.
+    mixed_cols = getMixedColumns(out_df)
+    if len(mixed_cols)>0:
+        out_df = out_df.assign(**{col: out_df[col].astype('string') for col in mixed_cols})
+
+    # Write the chunks.
+    schema = getCSVSchema(out_df)
+    options = pa_csv.WriteOptions(quoting_header='none')
+    sink = pa.CompressedOutputStream(out_csv, compression) if len(compression)>0 else pa.OSFile(out_csv, 'wb')
+    with sink, pa_csv.CSVWriter(sink, schema, write_options=options) as writer:
+        for start in range(0, max(len(out_df), 1), chunk_rows):
+            chunk = pa.Table.from_pandas(out_df.iloc[start:start+chunk_rows], preserve_index=False)
+            writer.write_table(chunk.cast(schema))
+    return len(out_df)
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: startCSVWrite()
+#
+# DESCRIPTION: This function starts writeCSV() in a background thread and
+# returns its future, whose result() waits for the write and raises its error.
+# The dataframe must not be changed until the write is done.
+###############################################################################
+###############################################################################
+def startCSVWrite(
+    out_df,
+    out_csv,
+    cols       = [],
+    chunk_rows = CSV_CHUNK_ROWS
+):
+
+    # Import packages.
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Start the write.
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='writeCSV')
+    future = executor.submit(writeCSV, out_df, out_csv, cols=cols, chunk_rows=chunk_rows)
+    executor.shutdown(wait=False)
+    return future
@@ -0,0 +1,163 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_dqRules_v1
+#
+# DESCRIPTION: A declarative data quality (DQ) rule engine for the ABT builders. Each DQ rule is declared
+# as data (a dictionary) instead of code, so thresholds can be tuned by editing a rule list or a JSON file.
+# All rules are evaluated over one float numpy array of the referenced columns, and the result of every
+# rule is packed into a single integer bitmask column (bit i is set when rule i fails). The existing
+# '1'/'0' dqPass_* flag columns are derived from the bitmask by grouping the rules by their flag name.
+#
+# RULE KEYS
+#   - name    = the unique name of the rule, used in the failure count report
+#   - flag    = the name of the dqPass_* flag column the rule contributes to
+#   - cols    = the list of columns that are checked by the rule
+#   - notnull = if True, the rule fails when any of the columns is missing (optional)
+#   - lower   = exclusive lower bound, the rule fails when a non-missing value is <= lower (optional)
+#   - upper   = inclusive upper bound, the rule fails when a non-missing value is > upper (optional)
+#
+# Note that a rule with bounds also fails when all of its columns are missing, which matches the behavior
+# of the original min(axis=1)/max(axis=1) comparisons.
+############################################################################################################
+############################################################################################################
+
+# The default DQ rules for the Key Metric ABT, which are based on chapters 3 and 4 of O'Neil's book.
+KEYMETRIC_DQ_RULES = [
+
+    # Missing data checks on the lagged RPS and NIPS values.
+    {'name':'RPS_q_notNull',  'flag':'dqPass_notNull', 'notnull':True, 'cols':['RPS_0_1q','RPS_1_2q','RPS_4_5q','RPS_5_6q']},
+    {'name':'RPS_y_notNull',  'flag':'dqPass_notNull', 'notnull':True, 'cols':['RPS_0_1y','RPS_1_2y','RPS_2_3y','RPS_3_4y']},
+    {'name':'NIPS_q_notNull', 'flag':'dqPass_notNull', 'notnull':True, 'cols':['NIPS_0_1q','NIPS_1_2q','NIPS_4_5q','NIPS_5_6q']},
+    {'name':'NIPS_y_notNull', 'flag':'dqPass_notNull', 'notnull':True, 'cols':['NIPS_0_1y','NIPS_1_2y','NIPS_2_3y','NIPS_3_4y']},
+
+    # Lower and upper-bound checks on the lagged RPS and NIPS values.
+    {'name':'RPS_q_limits',   'flag':'dqPass_limits', 'lower':0.0,     'upper':1200.0, 'cols':['RPS_0_1q','RPS_1_2q','RPS_4_5q','RPS_5_6q']},
+    {'name':'RPS_y_limits',   'flag':'dqPass_limits', 'lower':0.0,     'upper':1200.0, 'cols':['RPS_0_1y','RPS_1_2y','RPS_2_3y','RPS_3_4y']},
+    {'name':'NIPS_q_limits',  'flag':'dqPass_limits', 'lower':-1000.0, 'upper':1200.0, 'cols':['NIPS_0_1q','NIPS_1_2q','NIPS_4_5q','NIPS_5_6q']},
+    {'name':'NIPS_y_limits',  'flag':'dqPass_limits', 'lower':-1000.0, 'upper':1200.0, 'cols':['NIPS_0_1y','NIPS_1_2y','NIPS_2_3y','NIPS_3_4y']},
+
+    # Lower and upper-bound checks on the RPS and NIPS percent change values.
+    {'name':'RPS_pc_q',       'flag':'dqPass_pc', 'lower':-2.0, 'upper':12.0, 'cols':['RPS_pc_0_1q','RPS_pc_1_2q']},
+    {'name':'RPS_pc_y',       'flag':'dqPass_pc', 'lower':-2.0, 'upper':12.0, 'cols':['RPS_pc_0_1y','RPS_pc_1_2y','RPS_pc_2_3y']},
+    {'name':'NIPS_pc_q',      'flag':'dqPass_pc', 'lower':-2.0, 'upper':12.0, 'cols':['NIPS_pc_0_1q','NIPS_pc_1_2q']},
+    {'name':'NIPS_pc_y',      'flag':'dqPass_pc', 'lower':-2.0, 'upper':12.0, 'cols':['NIPS_pc_0_1y','NIPS_pc_1_2y','NIPS_pc_2_3y']},
+]
+
+# The default DQ rules for an annual Key Metric ABT, which has no quarterly lag columns, so only the rules
+# on the annual columns are kept.
+KEYMETRIC_DQ_RULES_ANNUAL = [rule for rule in KEYMETRIC_DQ_RULES if all(col.endswith('y') for col in rule['cols'])]
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: loadDQRules()
+#
+# DESCRIPTION: This function returns a validated list of DQ rules. The rules can either be given as a list
+# of dictionaries or as a complete filepath to a JSON file containing that list.
+#
+# FUNCTION INPUT ARGS
+#   - rules = the list of DQ rules or the complete filepath to a JSON file
+#
+# OUTPUT
+#   - the list of DQ rule dictionaries
+############################################################################################################
+############################################################################################################
+def loadDQRules(
+    rules = KEYMETRIC_DQ_RULES
+):
+
+    # Import packages.
+    import json
+
+    # Load the rules from a JSON file, if a filepath was specified.
+    if isinstance(rules, str):
+        with open(rules, 'r') as f:
+            rules = json.load(f)
+
+    # Validate the rules.
+    valid_keys = {'name','flag','cols','notnull','lower','upper'}
+    names = set()
+    for rule in rules:
+        bad_keys = set(rule.keys()) - valid_keys
+        if len(bad_keys)>0:
+            raise ValueError(f"DQ rule {rule.get('name')} has unknown keys: {sorted(bad_keys)}")
+        if 'name' not in rule or 'flag' not in rule or len(rule.get('cols',[]))==0:
+            raise ValueError(f"DQ rule {rule} must specify a name, a flag and at least one column")
+        if rule['name'] in names:
+            raise ValueError(f"DQ rule name {rule['name']} is not unique")
+        names.add(rule['name'])
+    if len(rules)>63:
+        raise ValueError(f"At most 63 DQ rules fit in the bitmask column, but {len(rules)} were given")
+    return list(rules)
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: applyDQRules()
+#
+# DESCRIPTION: This function evaluates a list of DQ rules over a dataframe and adds the packed bitmask
+# column and the '1'/'0' dqPass_* flag columns, where a flag is '1' only if none of its rules failed.
+#
+# FUNCTION INPUT ARGS
+#   - out_df   = input dataframe, which is updated in place and returned
+#   - rules    = the list of DQ rules or the complete filepath to a JSON file
+#   - mask_col = the name of the bitmask column (optional, no bitmask column is added if '')
+#
+# OUTPUT
+#   - out_df    = the input dataframe with the bitmask and flag columns added
+#   - report_df = the per-rule failure count report (rule, flag, bit, n_fail, pct_fail)
+############################################################################################################
+############################################################################################################
+def applyDQRules(
+    out_df,
+    rules    = KEYMETRIC_DQ_RULES,
+    mask_col = 'dqFail_mask'
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+
+    # Load and validate the rules.
+    rules = loadDQRules(rules)
+
+    # Build one float array (and its missing value mask) over all the
+    # columns referenced by any rule.
+    cols = list(dict.fromkeys([col for rule in rules for col in rule['cols']]))
+    col_idx = {col:i for i, col in enumerate(cols)}
+    arr = out_df[cols].to_numpy(dtype='float64', na_value=np.nan)
+    isnull = np.isnan(arr)
+
+    # Evaluate each rule over its column block and set its bit in the mask
+    # for the rows that fail the rule.
+    mask = np.zeros(len(arr), dtype='int64')
+    report = []
+    for bit, rule in enumerate(rules):
+        idx = [col_idx[col] for col in rule['cols']]
+        block = arr[:, idx]
+        block_null = isnull[:, idx]
+        fail = np.zeros(len(arr), dtype=bool)
+        if rule.get('notnull', False):
+            fail |= block_null.any(axis=1)
+        if rule.get('lower') is not None or rule.get('upper') is not None:
+            inside = np.ones(block.shape, dtype=bool)
+            with np.errstate(invalid='ignore'):
+                if rule.get('lower') is not None:
+                    inside &= (block > rule['lower'])
+                if rule.get('upper') is not None:
+                    inside &= (block <= rule['upper'])
+            fail |= ~(inside|block_null).all(axis=1) | block_null.all(axis=1)
+        mask |= fail.astype('int64') << bit
+        report.append([rule['name'], rule['flag'], bit, int(fail.sum())])
+
+    # Add the bitmask column and derive the flag columns from it.
+    if len(mask_col)>0:
+        out_df[mask_col] = mask
+    for flag in dict.fromkeys([rule['flag'] for rule in rules]):
+        flag_bits = sum([1<<bit for bit, rule in enumerate(rules) if rule['flag']==flag])
+        out_df[flag] = np.where((mask & flag_bits)==0, '1', '0')
+
+    # Create the per-rule failure count report.
+    report_df = pd.DataFrame(report, columns=['rule','flag','bit','n_fail'])
+    report_df['pct_fail'] = report_df['n_fail'] / max(len(arr),1)
+    return out_df, report_df
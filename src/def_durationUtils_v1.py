@@ -0,0 +1,163 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_durationUtils_v1
+#
+# DESCRIPTION: Shared duration normalization utilities for the quarterly and annual ABT builders. The builders measure
+# the number of days spanned by the last 4 (and 8) reported periods of each stock and snap that value onto
+# a grid of (365/4) day increments, so that a company reporting every quarter lands exactly on 365 days
+# and a company reporting bi-annually lands exactly on 639 days. The same utilities also infer the
+# reporting cadence (quarterly, semi-annual, annual) of each stock from the gaps between its report dates.
+############################################################################################################
+############################################################################################################
+
+# The bucket grid, in days, for the rolling 1-year and 2-year durations. Each value is a multiple of
+# (365/4) days rounded to the nearest whole day.
+DURATION_BUCKETS = [274,365,456,547,639,730,821,913,1004,1095,1186,1278,1369,1460]
+
+# The typical number of days between two consecutive reports for each reporting cadence.
+CADENCE_DAYS = {'quarterly':91, 'semi-annual':182, 'annual':365}
+
+# The number of reported periods per year for each statement frequency supported by the ABT builders,
+# which is the number of rows that a 1-year lag spans.
+FREQUENCY_NPER = {'quarterly':4, 'annual':1}
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getPeriodsPerYear()
+#
+# DESCRIPTION: This function returns the number of reported periods per year for a statement frequency.
+#
+# FUNCTION INPUT ARGS
+#   - frequency = the statement frequency, either 'quarterly' or 'annual'
+#
+# OUTPUT
+#   - the number of periods per year (4 for quarterly and 1 for annual data)
+############################################################################################################
+############################################################################################################
+def getPeriodsPerYear(
+    frequency = 'quarterly'
+):
+
+    # Look up the frequency.
+    if frequency not in FREQUENCY_NPER:
+        raise ValueError(f"Unknown frequency '{frequency}', expected one of {list(FREQUENCY_NPER.keys())}")
+    return FREQUENCY_NPER[frequency]
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: snapDurationBuckets()
+#
+# DESCRIPTION: This function snaps every value of a duration column to the nearest value of a bucket grid,
+# if the value is within +/- tol days of that bucket value. Values that are not close enough to any bucket
+# (and missing values) are returned unchanged. The nearest bucket is found for all values at once with a
+# single searchsorted pass over the sorted bucket grid.
+#
+# FUNCTION INPUT ARGS
+#   - days    = the duration values (series, array or list), in days
+#   - buckets = the bucket grid values, in days (optional, defaults to DURATION_BUCKETS)
+#   - tol     = the maximum distance, in days, from a bucket value for a duration to be snapped
+#
+# OUTPUT
+#   - a float numpy array with the snapped duration values
+############################################################################################################
+############################################################################################################
+def snapDurationBuckets(
+    days,
+    buckets = DURATION_BUCKETS,
+    tol     = 10
+):
+
+    # Import packages.
+    import numpy as np
+
+    # Convert the inputs to float arrays and make sure the bucket grid is sorted.
+    days = np.asarray(days, dtype='float64')
+    buckets = np.sort(np.asarray(buckets, dtype='float64'))
+    if len(buckets)==0:
+        return days.copy()
+
+    # Find the bucket values just below and just above each duration value.
+    idx = np.searchsorted(buckets, days)
+    lo = buckets[np.clip(idx-1, 0, len(buckets)-1)]
+    hi = buckets[np.clip(idx, 0, len(buckets)-1)]
+
+    # Pick the nearest of the two bucket values and only snap to it if the
+    # duration is within the tolerance. NaN values fail the comparison and are
+    # passed through unchanged.
+    nearest = np.where(np.abs(days-lo)<=np.abs(hi-days), lo, hi)
+    return np.where(np.abs(days-nearest)<=tol, nearest, days)
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getReportingCadence()
+#
+# DESCRIPTION: This function infers the reporting cadence of each stock from the median number of days
+# between its consecutive report dates. The median gap is snapped to the closest value in CADENCE_DAYS, if
+# it is within +/- tol days of that value, and is labeled 'unknown' otherwise (e.g. only 1 report).
+#
+# FUNCTION INPUT ARGS
+#   - in_df  = input dataframe sorted by symbol and date
+#   - tol    = the maximum distance, in days, from a cadence value for a median gap to be matched
+#
+# OUTPUT
+#   - a string numpy array, aligned to the rows of in_df, containing the cadence of each row's stock
+############################################################################################################
+############################################################################################################
+def getReportingCadence(
+    in_df,
+    tol = 30
+):
+
+    # Import packages.
+    import numpy as np
+
+    # Compute the gap, in days, between each report date and the previous
+    # report date of the same stock, and then the median gap for each stock.
+    gap_days = in_df.groupby(['symbol'])['date'].diff().dt.days
+    med_days = gap_days.groupby(in_df['symbol']).transform('median').to_numpy(dtype='float64')
+
+    # Snap the median gap to the cadence grid and label the snapped values.
+    snapped = snapDurationBuckets(med_days, buckets=list(CADENCE_DAYS.values()), tol=tol)
+    cadence = np.full(len(snapped), 'unknown', dtype=object)
+    for label, days in CADENCE_DAYS.items():
+        cadence[snapped==days] = label
+    return cadence
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: addReportingDurations()
+#
+# DESCRIPTION: This function adds the bucket-snapped 'days_0_1y' and 'days_1_2y' duration columns and the
+# 'report_cadence' column to a dataframe that is sorted by symbol and date. The duration columns give the
+# number of days spanned by the last 1 and 2 years of reported periods (4 and 8 periods for quarterly data,
+# 1 and 2 periods for annual data), including the length of the current period.
+#
+# FUNCTION INPUT ARGS
+#   - out_df = input dataframe sorted by symbol and date, which is updated in place and returned
+#   - tol    = the maximum distance, in days, from a bucket value for a duration to be snapped
+#   - nper   = the number of periods per year (4 for quarterly data and 1 for annual data)
+#
+# OUTPUT
+#   - out_df
+############################################################################################################
+############################################################################################################
+def addReportingDurations(
+    out_df,
+    tol  = 10,
+    nper = 4
+):
+
+    # Calculate and snap the number of days spanned by the last 1 and 2 years
+    # of periods, where the current period adds (365/nper) days.
+    group = out_df.groupby(['symbol'])['date']
+    period_days = round(365/nper)
+    out_df['days_0_1y'] = snapDurationBuckets((out_df['date']-group.shift(nper-1)).dt.days + period_days, tol=tol)
+    out_df['days_1_2y'] = snapDurationBuckets((out_df['date']-group.shift(2*nper-1)).dt.days + period_days, tol=tol)
+
+    # Add the inferred reporting cadence of each stock.
+    out_df['report_cadence'] = getReportingCadence(out_df)
+    return out_df
@@ -0,0 +1,145 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_fxUtils_v1
+#
+# DESCRIPTION: Shared utilities for normalizing the monetary columns of the ABT builders to USD. The FX
+# rates are read from a local parquet file with one row per (currency, date), where the rate column holds
+# the USD value of 1 unit of the currency on that date. Each statement row is matched with the latest FX
+# rate of its reported currency on or before its date by the as-of join of def_asofJoin_v1, so all rows of
+# all currencies are matched in one searchsorted pass.
+############################################################################################################
+############################################################################################################
+
+# The monetary columns of the FinStatement ABT inputs that are converted to USD (the share counts are not
+# monetary and are left as is).
+FINSTATEMENT_FX_COLS = [
+    'revenue','netIncome','grossProfit','operatingIncome','ebitda','eps_qtr','epsDiluted_qtr',
+    'totalAssets','totalLiabilities','totalDebt','netDebt','totalStockholdersEquity',
+    'inventory','debtRepayment','commonStockIssued','commonStockRepurchased',
+    'operatingCashFlow','capitalExpenditure','freeCashFlow'
+]
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: loadFXRates()
+#
+# DESCRIPTION: This function loads the FX rates, if no input dataframe was specified, and returns only the
+# currency, date, and rate columns with the rows sorted by currency and date.
+#
+# FUNCTION INPUT ARGS
+#   - fx_df        = the FX rate dataframe, which takes precedent over fx_fp
+#   - fx_fp        = the complete filepath to the FX rate parquet file
+#   - currency_col = the name of the currency column of the FX rates
+#   - date_col     = the name of the date column of the FX rates
+#   - rate_col     = the name of the rate column (USD per 1 unit of the currency) of the FX rates
+#
+# OUTPUT DATAFRAMES
+#   - out_df = the FX rates (currency, date, rate) sorted by currency and date
+############################################################################################################
+############################################################################################################
+def loadFXRates(
+    fx_df        = '',
+    fx_fp        = '',
+    currency_col = 'currency',
+    date_col     = 'date',
+    rate_col     = 'rate'
+):
+
+    # Import packages.
+    import pandas as pd
+
+    # Load only the needed columns, if no input dataframe was specified.
+    fx_cols = [currency_col, date_col, rate_col]
+    if len(fx_df)==0:
+        fx_df = pd.read_parquet(fx_fp, engine='pyarrow', columns=fx_cols)
+    missing_cols = [col for col in fx_cols if col not in fx_df.columns]
+    if len(missing_cols)>0:
+        raise ValueError(f"The FX rates are missing the columns: {missing_cols}")
+
+    # Standardize the column names and sort by currency and date.
+    out_df = fx_df[fx_cols].rename(columns={currency_col:'currency', date_col:'date', rate_col:'rate'})
+    out_df['currency'] = out_df['currency'].astype(str).str.upper()
+    out_df['date'] = pd.to_datetime(out_df['date'])
+    out_df = out_df.sort_values(by=['currency','date']).reset_index(drop=True)
+    return out_df
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: convertToUSD()
+#
+# DESCRIPTION: This function converts the monetary columns of a dataframe from their reported currency to
+# USD. The latest FX rate of each row's currency on or before the row's date (within a tolerance) is
+# attached with an as-of join on (currency, date), and all the monetary columns are then converted with
+# a single broadcast multiply of the column block by the per-row rate. Rows that are already in USD get a
+# rate of 1 without a lookup. Rows without a reported currency are assumed to be in USD (the FMP default)
+# and are left unconverted. Rows without a matching FX rate get missing monetary values and keep their
+# reported currency, while all the other rows have their reported currency set to USD. Both kinds of rows
+# are listed in the report.
+#
+# FUNCTION INPUT ARGS
+#   - out_df         = input dataframe
+#   - fx_df          = the FX rate dataframe, which takes precedent over fx_fp
+#   - fx_fp          = the complete filepath to the FX rate parquet file
+#   - cols           = the list of monetary columns to convert (columns that do not exist are skipped)
+#   - currency_col   = the name of the reported currency column of out_df
+#   - date_col       = the name of the date column of out_df
+#   - tolerance_days = the maximum age, in days, of the matched FX rate (optional, None for no limit)
+#   - rate_col       = the name of the output column that receives the applied FX rate (optional)
+#
+# OUTPUT
+#   - out_df    = the input dataframe with the monetary columns in USD
+#   - report_df = the count of rows that were not converted by currency and issue (currency, issue, n_rows),
+#                 where the issue is 'missing_currency' (assumed USD) or 'no_fx_rate' (set to missing)
+############################################################################################################
+############################################################################################################
+def convertToUSD(
+    out_df,
+    fx_df          = '',
+    fx_fp          = '',
+    cols           = FINSTATEMENT_FX_COLS,
+    currency_col   = 'reportedCurrency',
+    date_col       = 'date',
+    tolerance_days = 7,
+    rate_col       = 'fx_rate_usd'
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+    from def_asofJoin_v1 import asofJoin
+
+    # Load the FX rates.
+    fx_df = loadFXRates(fx_df, fx_fp)
+
+    # Match every non-USD row with the latest FX rate of its currency. A missing currency is assumed to be
+    # USD.
+    currency = out_df[currency_col].astype('string').str.strip().str.upper()
+    no_currency = (currency.isna() | (currency=='')).to_numpy(dtype=bool)
+    currency = currency.fillna('').to_numpy(dtype=object)
+    is_usd = (currency=='USD') | no_currency
+    rate = np.ones(len(out_df), dtype='float64')
+    if not is_usd.all():
+        left_df = pd.DataFrame({'currency':currency[~is_usd], 'date':out_df[date_col].to_numpy()[~is_usd]})
+        match_df = asofJoin(left_df, fx_df, cols=['rate'], by='currency', tolerance_days=tolerance_days)
+        rate[~is_usd] = match_df['rate'].to_numpy(dtype='float64', na_value=np.nan)
+
+    # Convert all the monetary columns with one broadcast multiply.
+    cols = [col for col in cols if col in out_df.columns]
+    out_df = out_df.copy()
+    out_df[cols] = out_df[cols].to_numpy(dtype='float64', na_value=np.nan) * rate[:,None]
+    if len(rate_col)>0:
+        out_df[rate_col] = rate
+
+    # Set the reported currency of the converted rows to USD.
+    no_rate = np.isnan(rate)
+    out_df[currency_col] = np.where(no_rate, currency, 'USD')
+
+    # Report the rows without a currency and the rows without an FX rate by currency.
+    report_df = pd.concat([
+        pd.DataFrame({'currency':currency[no_currency], 'issue':'missing_currency'}),
+        pd.DataFrame({'currency':currency[no_rate], 'issue':'no_fx_rate'})
+    ], ignore_index=True)
+    report_df = report_df.groupby(['currency','issue']).size().reset_index(name='n_rows')
+    return out_df, report_df
@@ -1,5 +1,33 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_getEtfABT_v1
+#
+# DESCRIPTION: The ETF statevector, which merges the company overviews into the monthly ETF price ABT.
+# Importing the module does not read any file, the statevector is only built when getEtfStatevector() is
+# called.
+#
+# EXAMPLES
+#   etf_sv = getEtfStatevector(
+#       in_priceabt_fp  = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\ABT\PRICE_ABT\priceABT_month_etf.parquet',
+#       in_company_fp   = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\COMPANY\companyOverviews_fmp_etf.parquet',
+#       in_etfinfo_fp   = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\ETF_INFO\etfInfo_fmp.parquet',
+#       min_date        = '2018-01-01'
+#   )
+############################################################################################################
+############################################################################################################
 
 
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getEtfStatevector()
+#
+# DESCRIPTION: This function merges the company overviews (sector, industry, exchange and the current beta,
+# average volume and market cap) into the monthly ETF price ABT.
+#
+# OUTPUT DATAFRAMES
+#   - out_df = the monthly ETF price ABT with the company overview columns
+############################################################################################################
+############################################################################################################
 def getEtfStatevector(
     in_priceabt_fp  = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\ABT\PRICE_ABT\priceABT_month_etf.parquet',    
     in_company_fp   = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\COMPANY\companyOverviews_fmp_etf.parquet',
@@ -49,20 +77,4 @@ def getEtfStatevector(
     ###################################################################
     # RETURN the output dataframe.
     ###################################################################
-    return out_df    
-
-
-etf_sv = getEtfStatevector(
-    in_priceabt_fp  = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\ABT\PRICE_ABT\priceABT_month_etf.parquet',    
-    in_company_fp   = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\COMPANY\companyOverviews_fmp_etf.parquet',
-    in_etfinfo_fp   = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\ETF_INFO\etfInfo_fmp.parquet',    
-    min_date        = '2018-01-01',
-    max_date        = '',
-    outpath         = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\ABT\ETF_ABT',
-    outdsn_parquet  = 'etfPriceABT_month.parquet',
-    outdsn_csv      = 'etfPriceABT_month.csv'   
-)
-
-
-
-
+    return out_df
@@ -26,6 +26,8 @@ def getStatevectorABT_qtr(
     import pandas as pd    
     import numpy as np
     import fastparquet as fp
+    from def_durationUtils_v1 import addReportingDurations
+    from def_asofJoin_v1 import asofJoin
     
     ###########################################################################
     # Load input data from the specified input file, if no input dataframe was 
@@ -158,17 +160,18 @@ def getStatevectorABT_qtr(
         in_piotroski_df = in_piotroski_df[keeplist]
         out_df = pd.merge(out_df, in_piotroski_df, on=['symbol','date'], how='left')
 
-    # Merge in the Stock Price Return Stats.
+    # Merge in the Stock Price Return Stats. The 1-year return that starts 2
+    # months after each key metric date is attached with a point-in-time join
+    # on the first 'date_14m' month-end on or after the key metric date, so
+    # that key metric dates that are not month-ends are no longer dropped.
     curr_len = len(in_price_fp)
     if curr_len>=9 and in_price_fp[curr_len-8:curr_len]=='.parquet':    
         in_price_df = pd.read_parquet(in_price_fp, engine='pyarrow') 
         # keeplist = ['symbol','date','date_1m','date_3m','date_6m','date_1y','r_1m','r_3m','r_6m','r_1y']      
         keeplist = ['symbol','date_14m','r_1y']
         in_price_df = in_price_df[keeplist]
-        in_price_df.rename({
-            'date_14m':'date'
-        }, axis='columns', inplace=True)   
-        out_df = pd.merge(out_df, in_price_df, on=['symbol','date'], how='left')
+        out_df = asofJoin(out_df, in_price_df, left_on='date', right_on='date_14m', cols=['r_1y'],
+                          direction='forward', tolerance_days=31)
         
     ###########################################################################
     # Create the rolling quarter and annual Key Metric summary columns. 
@@ -293,15 +296,12 @@ def getStatevectorABT_qtr(
     # Calculate the number of days from current date to the date 4 periods ago. 
     # We round this number of days to increments of (365/4) days and if its
     # value is within +/- 10 days of the increment value. For companies that 
-    # report financials quarterly, the duration after rounding should be 274 
-    # days (9 months=365-91). For companies that report financials bi-annually,  
-    # the duration should be 639 days (730-91).
-    ###########################################################################
-    out_df['days_0_1y'] = (out_df['date']-out_df.groupby(['symbol'])['date'].shift(3)).dt.days + 91
-    out_df['days_1_2y'] = (out_df['date']-out_df.groupby(['symbol'])['date'].shift(7)).dt.days + 91
-    for i in [274,365,456,547,639,730,821,913,1004,1095,1186,1278,1369,1460]:
-        out_df['days_0_1y'] = np.where((out_df['days_0_1y']-i).abs()<=10, i, out_df['days_0_1y'])
-        out_df['days_1_2y'] = np.where((out_df['days_1_2y']-i).abs()<=10, i, out_df['days_1_2y'])
+    # report financials quarterly, the duration after rounding should be 365 
+    # days (274+91). For companies that report financials bi-annually, the 
+    # duration should be 639 days (547+91). The reporting cadence inferred
+    # from the gaps between report dates is also added for each stock.
+    ###########################################################################
+    out_df = addReportingDurations(out_df, tol=10)
     
     ###########################################################################
     # Apply the min date thresholds, if they were specified.
@@ -326,7 +326,7 @@ def getStatevectorABT_qtr(
     col_order += ['symbol','date','date_year','fiscal_qtr']
     col_order += ['nlag','max_nlag','firstLast_flag','reverse_nlag']
     col_order += ['dqPass_notNull','dqPass_limits','dqPass_pc']
-    col_order += ['days_0_1y','days_1_2y']
+    col_order += ['days_0_1y','days_1_2y','report_cadence']
     col_order += ['r_1y']
     for i, cm in enumerate(metric_list):
                 
@@ -362,8 +362,189 @@ def getStatevectorABT_qtr(
     ###################################################################
     # RETURN the output dataframe.
     ###################################################################
-    return in_df, out_df 
+    return in_df, out_df
+
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getStatevectorABT_month()
+#
+# DESCRIPTION: This function builds the monthly state-vector panel used for model training, with one row 
+# per stock and month-end. Each row of the monthly price ABT is given the columns of the latest Key Metric
+# ABT, Financial Statement ABT and Piotroski ABT rows that were available as of that month-end. A quarterly
+# row becomes available on its 'date_avail' availability date (the filing date, see def_pointInTime_v1.py)
+# if the ABT has one, and lag_days after its period date otherwise, to account for the filing delay. 
+#
+# The quarterly ABTs are attached with the point-in-time join asofJoin(), which aligns the symbol-sorted
+# arrays in one pass instead of repeated merges and forward fills. Only the requested columns are read
+# from each parquet file (column projection), so the full universe fits in memory. The quarterly ABT 
+# bookkeeping columns that duplicate price ABT columns are not read unless they are requested explicitly. 
+# The period date of each attached row is kept as 'date_km', 'date_fs' and 'date_pt', and attached 
+# columns whose name already exists are given the suffix '_km', '_fs' or '_pt'.
+#
+# FUNCTION INPUT ARGS
+#   - symbol_filters     = input list of stocks that are used to filter the input data (optional)
+#   - in_priceabt_fp     = the complete filepath to the monthly price ABT parquet file
+#   - in_keymetric_fp    = the complete filepath to the quarterly Key Metric ABT parquet file (optional)
+#   - in_finstatement_fp = the complete filepath to the quarterly Financial Statement ABT parquet file (optional)
+#   - in_piotroski_fp    = the complete filepath to the quarterly Piotroski ABT parquet file (optional)
+#   - price_cols         = the price ABT columns to keep (optional, defaults to all columns)
+#   - keymetric_cols     = the Key Metric ABT columns to attach (optional, defaults to all non-bookkeeping columns)
+#   - finstatement_cols  = the Financial Statement ABT columns to attach (optional, same default)
+#   - piotroski_cols     = the Piotroski ABT columns to attach (optional, same default)
+#   - lag_days           = the filing delay, in days, after which a quarterly row without an availability 
+#                          date is available
+#   - tolerance_days     = the maximum age, in days, of an attached quarterly row (optional, None for no limit)
+#   - min_date           = the minimum date filter to apply to the output data (optional)
+#   - max_date           = the maximum date filter to apply to the output data (optional)
+#   - outpath            = the folder path where all output data will be saved
+#   - outdsn_parquet     = the name of output parquet dataset, which is partitioned by year
+#   - outdsn_csv         = the name of the output csv file (.csv, .csv.gz or .csv.zst, see def_csvExport_v1.py)
+#   - csv_cols           = the list of columns written to the csv file (optional, defaults to all columns)
+#   - outdsn_arrow       = the name of the output Arrow IPC file (optional, .arrow or .feather, see def_arrowExport_v1.py)
+#
+# OUTPUT DATAFRAMES
+#   - out_df
+#
+# OUTPUT FILES
+#   - outdsn_parquet (optional, a parquet dataset folder with one date_year=YYYY partition per year)
+#   - outdsn_csv (optional)
+#   - outdsn_arrow (optional)
+############################################################################################################
+############################################################################################################
+def getStatevectorABT_month(
+    symbol_filters     = [],
+    in_priceabt_fp     = '',
+    in_keymetric_fp    = '',
+    in_finstatement_fp = '',
+    in_piotroski_fp    = '',
+    price_cols         = [],
+    keymetric_cols     = [],
+    finstatement_cols  = [],
+    piotroski_cols     = [],
+    lag_days           = 45,
+    tolerance_days     = None,
+    min_date           = '2018-01-01',
+    max_date           = '',
+    outpath            = '',
+    outdsn_parquet     = '',
+    outdsn_csv         = '',
+    csv_cols           = [],
+    outdsn_arrow       = ''
+):
+
+    ###########################################################################
+    # Import Packages
+    ###########################################################################
+    import pandas as pd    
+    import pyarrow.parquet as pq
+    from def_asofJoin_v1 import asofJoin
+    from def_pointInTime_v1 import getKnownRows
+    from def_csvExport_v1 import isCSVName, startCSVWrite
+    from def_arrowExport_v1 import isArrowName, writeArrow
+
+    ###########################################################################
+    # Specify the bookkeeping columns of the quarterly ABTs that are not read
+    # by default, since the price ABT already has its own version of them.
+    ###########################################################################
+    skip_cols = ['symbol','date','year','year_char','month_char','date_qtr']
+    skip_cols += ['max_nlag','firstLast_flag','nlag','reverse_nlag']
+    skip_cols += ['sector','industry','ipo_date','isActivelyTrading']
+    skip_cols += ['fillingDate','acceptedDate','date_avail']
+
+    ###########################################################################
+    # Load the monthly price ABT, using only the requested columns.
+    ###########################################################################
+    if len(price_cols)>0:
+        price_cols = list(dict.fromkeys(['symbol','date'] + price_cols))
+        price_df = pd.read_parquet(in_priceabt_fp, engine='pyarrow', columns=price_cols)   
+    else:
+        price_df = pd.read_parquet(in_priceabt_fp, engine='pyarrow')   
+
+    ###########################################################################
+    # If a stock filter list was specified, filter the price grid. Then apply 
+    # the min and max date thresholds, if they were specified, and sort by 
+    # symbol and date.
+    ###########################################################################
+    if len(symbol_filters)>0:
+        symbol_filters = list(map(lambda x: x.upper(),symbol_filters))
+        price_df = price_df[price_df['symbol'].isin(symbol_filters)]
+    if len(min_date)>0:
+        price_df = price_df.loc[price_df['date']>=pd.to_datetime(min_date)] 
+    if len(max_date)>0:
+        price_df = price_df.loc[price_df['date']<=pd.to_datetime(max_date)]  
+    out_df = price_df.sort_values(by=['symbol','date'], ascending=[True,True])
+    out_df.reset_index(level=0, drop=True, inplace=True) 
+    del price_df
+
+    ###########################################################################
+    # Attach the latest available row of each quarterly ABT to the monthly
+    # price grid, one ABT at a time, reading only the projected columns of
+    # the stocks that are on the price grid. If the ABT has availability 
+    # dates, the superseded rows are dropped and the rows are matched on 
+    # their availability date instead of their period date plus lag_days.
+    ###########################################################################
+    abt_list = [
+        [in_keymetric_fp,    keymetric_cols,    '_km'],
+        [in_finstatement_fp, finstatement_cols, '_fs'],
+        [in_piotroski_fp,    piotroski_cols,    '_pt']
+    ]
+    for in_abt_fp, abt_cols, suffix in abt_list:
+        curr_len = len(in_abt_fp)
+        if curr_len>=9 and in_abt_fp[curr_len-8:curr_len]=='.parquet':
+            abt_names = pq.read_schema(in_abt_fp).names
+            if len(abt_cols)==0:
+                abt_cols = [col for col in abt_names if col not in skip_cols]
+            if 'date_avail' in abt_names:
+                read_cols = list(dict.fromkeys(['symbol','date','date_avail']+abt_cols))
+                abt_df = pd.read_parquet(in_abt_fp, engine='pyarrow', columns=read_cols)
+                abt_df = abt_df[abt_df['symbol'].isin(pd.unique(out_df['symbol']))]
+                abt_df = getKnownRows(abt_df.sort_values(by=['symbol','date']), avail_col='date_avail')
+                out_df = asofJoin(out_df, abt_df, left_on='date', right_on='date_avail', cols=['date']+abt_cols,
+                                  tolerance_days=tolerance_days, direction='backward', suffix=suffix)
+            else:
+                abt_df = pd.read_parquet(in_abt_fp, engine='pyarrow', columns=['symbol','date']+abt_cols)
+                abt_df = abt_df[abt_df['symbol'].isin(pd.unique(out_df['symbol']))]
+                out_df = asofJoin(out_df, abt_df, left_on='date', right_on='date', cols=abt_cols, lag_days=lag_days,
+                                  tolerance_days=tolerance_days, direction='backward', match_col='date'+suffix, 
+                                  suffix=suffix)
+            del abt_df
+
+    ###################################################################
+    # Create the year column that the parquet output is partitioned by, 
+    # if it does not already exist.
+    ###################################################################
+    if 'date_year' not in out_df.columns:
+        out_df['date_year'] = out_df['date'].dt.year
 
+    ###################################################################
+    # SAVE the output dataframe as a file.
+    ###################################################################
+    
+    # Start writing the CSV file in a background thread, if one was given, so
+    # it is written at the same time as the parquet dataset.
+    if isCSVName(outdsn_csv):
+        csv_write = startCSVWrite(out_df, f'{outpath}/{outdsn_csv}', cols=csv_cols)
 
+    # Save as a PARQUET dataset partitioned by year, if one was given. Only
+    # the year partitions that are being written are replaced.
+    curr_len = len(outdsn_parquet)
+    if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
+        out_parquet = f'{outpath}/{outdsn_parquet}' 
+        out_df.to_parquet(f'{out_parquet}', index=False, partition_cols=['date_year'],
+                          existing_data_behavior='delete_matching')
+    
+    # Save as an ARROW IPC file, if one was given, which downstream processes
+    # can memory-map.
+    if isArrowName(outdsn_arrow):
+        writeArrow(out_df, f'{outpath}/{outdsn_arrow}')
 
-        
\ No newline at end of file
+    # Wait for the CSV file, if one was given.
+    if isCSVName(outdsn_csv):
+        csv_write.result()
+    
+    ###################################################################
+    # RETURN the output dataframe.
+    ###################################################################
+    return out_df
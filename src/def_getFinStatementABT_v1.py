@@ -1,3 +1,48 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_getFinStatementABT_v1
+#
+# DESCRIPTION: The Financial Statement ABT of stocks, which combines the quarterly (or annual) income
+# statements, balance sheets and cashflow statements of the FMP API service into one row per stock and
+# period, with the trailing-twelve-month (TTM) sums of the flow items, the lagged and percent change
+# columns, and the ratio block declared in FIN_RATIOS.
+############################################################################################################
+############################################################################################################
+
+# The builder decorator that stops the profiling of a failed run is applied at import time.
+from def_runReport_v1 import closeRunReports
+
+# The ratio block of the FinStatement ABT. Each ratio is declared as (name, numerator, denominator, sign),
+# where the ratio is sign*numerator/denominator and is missing unless the denominator is > 0. The flow
+# items use their TTM values and the balance sheet items use their current or average-of-period values.
+FIN_RATIOS = [
+
+    # Margins on TTM revenue.
+    ('grossMargin_ttm',      'grossProfit_ttm',            'revenue_ttm',                  1.0),
+    ('operatingMargin_ttm',  'operatingIncome_ttm',        'revenue_ttm',                  1.0),
+    ('ebitdaMargin_ttm',     'ebitda_ttm',                 'revenue_ttm',                  1.0),
+    ('netMargin_ttm',        'netIncome_ttm',              'revenue_ttm',                  1.0),
+    ('fcfMargin_ttm',        'freeCashFlow_ttm',           'revenue_ttm',                  1.0),
+
+    # Returns on the average of the current and 1-year ago balances.
+    ('roa_ttm',              'netIncome_ttm',              'totalAssets_avg',              1.0),
+    ('roe_ttm',              'netIncome_ttm',              'totalStockholdersEquity_avg',  1.0),
+
+    # Cash conversion of the TTM earnings.
+    ('fcfConversion_ttm',    'freeCashFlow_ttm',           'netIncome_ttm',                1.0),
+    ('ocfConversion_ttm',    'operatingCashFlow_ttm',      'netIncome_ttm',                1.0),
+
+    # Leverage.
+    ('netDebtToEbitda_ttm',  'netDebt',                    'ebitda_ttm',                   1.0),
+    ('debtToEquity',         'totalDebt',                  'totalStockholdersEquity',      1.0),
+    ('debtToAssets',         'totalDebt',                  'totalAssets',                  1.0),
+
+    # Buybacks (the repurchases are negative cash flows) relative to the
+    # average book equity, since no market value is available here.
+    ('buybackYield_bv_ttm',  'commonStockRepurchased_ttm', 'totalStockholdersEquity_avg', -1.0),
+]
+
+
 ############################################################################################################
 ############################################################################################################
 # FUNCTION DEFINITION: getFinStatementABT()
@@ -21,14 +66,30 @@
 #   - bs_fp          = the complete filepath to the balance sheet statement parquet file
 #   - cf_fp          = the complete filepath to the cashflow statement parquet file
 #
+#   - in_company_df  = input company overview dataframe, which takes precedent over in_company_fp (optional)
 #   - in_company_fp  = input company overview complete filepath (optional)
 #
+#   - fx_df          = the FX rate dataframe (currency, date, rate), which takes precedent over fx_fp
+#   - fx_fp          = the complete filepath to the FX rate parquet file (optional, the monetary columns
+#                      are converted from the reported currency to USD if FX rates are given)
+#
+#   - frequency      = the frequency of the statement data, either 'quarterly' or 'annual', which sets the
+#                      number of periods spanned by the 1-year lags and TTM sums (optional)
+#
 #   - min_date       = the minimum date filter to apply to output data (optional, format is '2018-01-01')
 #   - max_date       = the maximum date filter to apply to output data (optional)
 #
+#   - as_of          = one as-of date or a list of as-of dates (optional). If specified, the output only has
+#                      the latest row of each stock that was available on each as-of date, see
+#                      getAsOfSnapshot() in def_pointInTime_v1.py
+#
 #   - outpath        = the folder path where all output data will be saved
 #   - outdsn_parquet = the name of output parquet file
-#   - outdsn_csv     = the name of the output csv file
+#   - outdsn_csv     = the name of the output csv file (.csv, .csv.gz or .csv.zst, see def_csvExport_v1.py)
+#   - csv_cols       = the list of columns written to the csv file (optional, defaults to all columns)
+#   - outdsn_arrow   = the name of the output Arrow IPC file (optional, .arrow or .feather, see def_arrowExport_v1.py)
+#
+#   - profile        = the profile mode, '' (none), 'cpu', 'memory' or 'all' (optional, see def_runReport_v1.py)
 #
 # OUTPUT DATAFRAMES
 #   - out_df
@@ -36,8 +97,10 @@
 # OUTPUT FILES
 #   - outdsn_parquet (optional)
 #   - outdsn_csv (optional)
+#   - outdsn_arrow (optional)
 ############################################################################################################
 ############################################################################################################
+@closeRunReports
 def getFinStatementABT(
     symbol_filters = [],    
     is_df          = '',
@@ -46,12 +109,20 @@ def getFinStatementABT(
     is_fp          = '',
     bs_fp          = '',
     cf_fp          = '',
+    in_company_df  = '',
     in_company_fp  = '',
+    fx_df          = '',
+    fx_fp          = '',
+    frequency      = 'quarterly',
     min_date       = '2018-01-01',
     max_date       = '',    
+    as_of          = '',
     outpath        = '',
     outdsn_parquet = '',
-    outdsn_csv     = ''      
+    outdsn_csv     = '',
+    csv_cols       = [],
+    outdsn_arrow   = '',
+    profile        = ''
 ):
     
     ###################################################################
@@ -60,81 +131,138 @@ def getFinStatementABT(
     import pandas as pd
     from pandas.tseries.offsets import MonthEnd
     import numpy as np
-
-    ###################################################################
-    # Load the data, if no input dataframe was specfied.
-    ###################################################################
-    if len(is_df)==0:    
-        is_df = pd.read_parquet(is_fp, engine='pyarrow')
-    if len(bs_df)==0:     
-        bs_df = pd.read_parquet(bs_fp, engine='pyarrow')
-    if len(cf_df)==0:    
-        cf_df = pd.read_parquet(cf_fp, engine='pyarrow')
+    from def_durationUtils_v1 import addReportingDurations, getPeriodsPerYear
+    from def_ttmKernel_v1 import addTTMColumns
+    from def_statementUtils_v1 import loadStatement, mergeStatements
+    from def_fxUtils_v1 import convertToUSD
+    from def_pointInTime_v1 import AVAIL_LAG_DAYS, addAvailabilityDate, getAsOfSnapshot
+    from def_runReport_v1 import startRunReport, runStage, finishRunReport
+    from def_csvExport_v1 import isCSVName, startCSVWrite
+    from def_arrowExport_v1 import isArrowName, writeArrow
 
     ###########################################################################
-    # If a stock filter list was specified, filter the input dataframe.
+    # Start the run report, which records the wall time, rows, and peak memory
+    # of the builder stages.
     ###########################################################################
-    if len(symbol_filters)>0:
-        symbol_filters = list(map(lambda x: x.upper(),symbol_filters))
-        is_df = is_df[is_df['symbol'].isin(symbol_filters)]
-        bs_df = bs_df[bs_df['symbol'].isin(symbol_filters)]
-        cf_df = cf_df[cf_df['symbol'].isin(symbol_filters)]
+    report = startRunReport('getFinStatementABT', profile=profile)
 
     ###########################################################################
-    # Sort by symbol and date.
-    ###########################################################################  
-    is_df.sort_values(by=['symbol','date'], ascending=[True,True], inplace=True)
-    is_df.reset_index(level=0, drop=True, inplace=True)
-
-    bs_df.sort_values(by=['symbol','date'], ascending=[True,True], inplace=True)
-    bs_df.reset_index(level=0, drop=True, inplace=True)
-    
-    cf_df.sort_values(by=['symbol','date'], ascending=[True,True], inplace=True)
-    cf_df.reset_index(level=0, drop=True, inplace=True)   
+    # Get the number of periods per year of the statement frequency, which is
+    # the lag distance, in rows, of all the 1-year lags.
+    ###########################################################################
+    nper = getPeriodsPerYear(frequency)
 
     ###########################################################################
-    # Keep only the columns that are needed for the desired summaries. 
+    # Specify the columns that are needed for the desired summaries. 
     ###########################################################################
     is_cols = ['symbol','date']
     is_cols += ['fiscal_year','fiscal_qtr','reportedCurrency']
     is_cols += ['numShares','revenue','netIncome','netIncomeRatio']
+    is_cols += ['grossProfit','operatingIncome','ebitda']
     is_cols += ['eps_qtr','epsdiluted']
     is_cols += ['url_SEC','url_10K']
     is_cols += ['admin_runDate']
-    is_df = is_df[is_cols]
-    is_df.rename(columns={\
-        'epsdiluted':'epsDiluted_qtr',\
-        'admin_runDate':'admin_runDate_is'\
-    }, inplace=True)
-    # is_df.rename(columns={'epsdiluted':'epsDiluted_qtr','admin_runDate':'admin_runDate_is'}, inplace=True)        
+
+    # The filing date columns are optional, since older files do not have them.
+    filing_cols = ['fillingDate','acceptedDate']
             
     bs_cols = ['symbol','date']
     bs_cols += ['totalAssets','totalLiabilities','totalDebt','netDebt']
+    bs_cols += ['totalStockholdersEquity']
     bs_cols += ['admin_runDate']
-    bs_df = bs_df[bs_cols]
-    bs_df.rename(columns={'admin_runDate':'admin_runDate_bs'},inplace=True)  
     
     cf_cols = ['symbol','date']
     cf_cols += ['inventory','debtRepayment','commonStockIssued','commonStockRepurchased']
     cf_cols += ['operatingCashFlow','capitalExpenditure','freeCashFlow']    
     cf_cols += ['admin_runDate']
-    cf_df = cf_df[cf_cols] 
-    cf_df.rename(columns={'admin_runDate':'admin_runDate_cf'},inplace=True) 
+
+    ###########################################################################
+    # Load the data (only the needed columns), if no input dataframe was 
+    # specified, and apply the stock filter list, if one was specified. The
+    # shared loader also deduplicates restated (symbol, date) rows by keeping
+    # the row with the latest admin_runDate, and sorts by symbol and date.
+    ###########################################################################
+    with runStage(report, 'load') as stage:
+        is_df, is_restate = loadStatement(is_df, is_fp, symbol_filters, cols=is_cols, optional_cols=filing_cols, name='is')
+        bs_df, bs_restate = loadStatement(bs_df, bs_fp, symbol_filters, cols=bs_cols, name='bs')
+        cf_df, cf_restate = loadStatement(cf_df, cf_fp, symbol_filters, cols=cf_cols, name='cf')
+        stage['rows'] = len(is_df) + len(bs_df) + len(cf_df)
+    restate_df = pd.concat([is_restate, bs_restate, cf_restate], ignore_index=True)
+    if len(restate_df)>0:
+        print(f'Restated (symbol, date) rows that were deduplicated:\n{restate_df.groupby(["statement"]).size().to_string()}')
+
+    ###########################################################################
+    # Rename the columns that need to be distinguished between statements.
+    ###########################################################################
+    is_df = is_df.rename(columns={
+        'epsdiluted':'epsDiluted_qtr',
+        'admin_runDate':'admin_runDate_is'
+    })
+    bs_df = bs_df.rename(columns={'admin_runDate':'admin_runDate_bs'})  
+    cf_df = cf_df.rename(columns={'admin_runDate':'admin_runDate_cf'}) 
         
     ###########################################################################
-    # Merge the 3 financial statement dataframes into one overall dataframe
-    # and then sort.
+    # Merge the 3 financial statement dataframes into one overall dataframe.
+    # Since all 3 statements are sorted by symbol and date, the balance sheets
+    # and cashflows are joined onto the income statements with a sorted merge
+    # that keeps the sort order, and the rows that failed to match between the
+    # statements are reported.
     ###########################################################################
-    
-    # Merge the balance sheets to the income statements.
-    out_df = pd.merge(is_df, bs_df, on=['symbol','date'], how='left')     
-    out_df.sort_values(by=['symbol','date'], ascending=[True,True], inplace=True)
-    out_df.reset_index(level=0, drop=True, inplace=True) 
+    with runStage(report, 'merge_statements') as stage:
+        out_df, merge_report = mergeStatements(is_df, [bs_df, cf_df], names=['is','bs','cf'])
+        stage['rows'] = len(out_df)
+    if len(merge_report)>0:
+        print(f'Statement rows that failed to match:\n{merge_report.groupby(["statement","issue"]).size().to_string()}')
 
-    # Merge the cashflows into the output dataframe.
-    out_df = pd.merge(out_df, cf_df, on=['symbol','date'], how='left') 
-    out_df.sort_values(by=['symbol','date'], ascending=[True,True], inplace=True)
-    out_df.reset_index(level=0, drop=True, inplace=True) 
+    ###########################################################################
+    # Convert the monetary columns from the reported currency to USD, if FX
+    # rates were specified, so the values are comparable across stocks. The
+    # rates are attached with an as-of join on (currency, date) and applied
+    # with one multiply over the whole block of monetary columns.
+    ###########################################################################
+    curr_len = len(fx_fp)
+    if len(fx_df)>0 or (curr_len>=9 and fx_fp[curr_len-8:curr_len]=='.parquet'):
+        with runStage(report, 'fx_convert') as stage:
+            out_df, fx_report = convertToUSD(out_df, fx_df=fx_df, fx_fp=fx_fp)
+            stage['rows'] = len(out_df)
+        if len(fx_report)>0:
+            print(f'Rows that were not converted to USD (missing_currency is assumed USD, no_fx_rate is set to missing):\n{fx_report.to_string(index=False)}')
+
+    ###########################################################################
+    # Calculate the bucket-snapped number of days spanned by the last 1 and 2
+    # years of reported periods, and the inferred reporting cadence of each 
+    # stock.
+    ###########################################################################
+    with runStage(report, 'durations') as stage:
+        out_df = addReportingDurations(out_df, tol=10, nper=nper)
+        stage['rows'] = len(out_df)
+
+    ###########################################################################
+    # Create the trailing-twelve-month (TTM) columns. The TTM, TTM 1-year lag,
+    # and TTM growth values of the income and cashflow statement flow items, 
+    # and the 1-year lag and average-of-period values of the balance sheet 
+    # stock items, are computed in one pass by the shared TTM kernel. This is
+    # done before the date thresholds are applied, so the full history of
+    # each stock is used.
+    ###########################################################################
+    flow_cols = ['revenue','netIncome','eps_qtr','epsDiluted_qtr']
+    flow_cols += ['grossProfit','operatingIncome','ebitda']
+    flow_cols += ['inventory','debtRepayment','commonStockIssued','commonStockRepurchased']
+    flow_cols += ['operatingCashFlow','capitalExpenditure','freeCashFlow']
+    stock_cols = ['numShares','totalAssets','totalLiabilities','totalDebt','netDebt']
+    stock_cols += ['totalStockholdersEquity']
+    with runStage(report, 'ttm_windows') as stage:
+        out_df = addTTMColumns(out_df, flow_cols=flow_cols, stock_cols=stock_cols, nper=nper)
+        stage['rows'] = len(out_df)
+
+    ###########################################################################
+    # Create the profitability, cash conversion, leverage, and buyback ratio
+    # columns and their 1-year changes from the TTM and average-of-period
+    # columns, also before the date thresholds are applied.
+    ###########################################################################
+    with runStage(report, 'ratios') as stage:
+        out_df = addFinRatioColumns(out_df, ratios=FIN_RATIOS, nper=nper)
+        stage['rows'] = len(out_df)
 
     ###################################################################
     # Apply the min and max date thresholds, if they were specified.
@@ -164,11 +292,21 @@ def getFinStatementABT(
     ###################################################################
     # Merge in company overview data, if it is specified.
     ###################################################################
-    curr_len = len(in_company_fp)
-    if curr_len>=9 and in_company_fp[curr_len-8:curr_len]=='.parquet':
-        in_company_df = pd.read_parquet(in_company_fp, engine='pyarrow') 
-        in_company_df = in_company_df[['symbol','sector','industry','ipo_date','isActivelyTrading']]
-        out_df = pd.merge(out_df, in_company_df, on=['symbol'], how='left')
+    with runStage(report, 'merge') as stage:
+        curr_len = len(in_company_fp)
+        if len(in_company_df)>0 or (curr_len>=9 and in_company_fp[curr_len-8:curr_len]=='.parquet'):
+            if len(in_company_df)==0:
+                in_company_df = pd.read_parquet(in_company_fp, engine='pyarrow') 
+            in_company_df = in_company_df[['symbol','sector','industry','ipo_date','isActivelyTrading']]
+            out_df = pd.merge(out_df, in_company_df, on=['symbol'], how='left')
+        stage['rows'] = len(out_df)
+
+    ###################################################################
+    # POINT-IN-TIME: Add the availability date of each row, which is the
+    # date its data was public (the SEC acceptance or filing date, or the
+    # period date plus a fixed filing delay if neither exists).
+    ###################################################################
+    out_df = addAvailabilityDate(out_df, lag_days=AVAIL_LAG_DAYS[frequency])
 
     ###################################################################
     # Reorder the output columns and also only keep columns specified.
@@ -180,10 +318,12 @@ def getFinStatementABT(
     # Specify the left to right ordering of the key columns.
     col_order += ['symbol','date','year','fiscal_year','fiscal_qtr']
     col_order += ['max_nlag','firstLast_flag','nlag','reverse_nlag']
+    col_order += ['days_0_1y','days_1_2y','report_cadence']
 
     # Specify the columns that are to be placed at the end.
     col_end = ['year_char','month_char']
     col_end += ['url_SEC','url_10K']
+    col_end += [col for col in filing_cols if col in out_df.columns] + ['date_avail']
     col_end += ['admin_runDate_is','admin_runDate_bs','admin_runDate_cf']
     
     # Get the remaining columns that are not specifically specified.
@@ -193,32 +333,105 @@ def getFinStatementABT(
     # Reorder the columns in the output dataframe.
     out_df = out_df[col_order + col_remain + col_end] 
 
+    ###################################################################
+    # If as-of dates were specified, only keep the rows that were the 
+    # latest known rows of each stock on those dates.
+    ###################################################################
+    if len(as_of)>0:
+        with runStage(report, 'as_of_snapshot') as stage:
+            out_df = getAsOfSnapshot(out_df, as_of)
+            stage['rows'] = len(out_df)
+
     ###################################################################
     # SAVE the output dataframe as a file.
     ###################################################################
     
+    # Start writing the CSV file in a background thread, if one was given, so
+    # it is written at the same time as the parquet file.
+    if isCSVName(outdsn_csv):
+        csv_write = startCSVWrite(out_df, f'{outpath}/{outdsn_csv}', cols=csv_cols)
+
     # Save as a PARQUET file, if one was given.
     curr_len = len(outdsn_parquet)
     if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
         out_parquet = f'{outpath}/{outdsn_parquet}' 
-        out_df.to_parquet(f'{out_parquet}',index=False)
+        with runStage(report, 'to_parquet', rows=len(out_df)):
+            out_df.to_parquet(f'{out_parquet}',index=False)
+    
+    # Save the restatement log as a CSV file next to the parquet file, if any
+    # restated rows were deduplicated.
+    if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet' and len(restate_df)>0:
+        restate_df.to_csv(f'{outpath}/{outdsn_parquet[0:curr_len-8]}_restatements.csv',index=False)
     
-    # Save as a CSV file, if one was given.
-    curr_len = len(outdsn_csv)
-    if curr_len>=5 and outdsn_csv[curr_len-4:curr_len]=='.csv':
-        out_csv = f'{outpath}/{outdsn_csv}' 
-        out_df.to_csv(f'{out_csv}',index=False)  
+    # Save as an ARROW IPC file, if one was given, which downstream processes
+    # can memory-map.
+    if isArrowName(outdsn_arrow):
+        with runStage(report, 'to_arrow', rows=len(out_df)):
+            writeArrow(out_df, f'{outpath}/{outdsn_arrow}')
+
+    # Wait for the CSV file, if one was given.
+    if isCSVName(outdsn_csv):
+        with runStage(report, 'to_csv', rows=len(out_df)):
+            csv_write.result()
+
+    ###################################################################
+    # Finish the run report and save it next to the output files.
+    ###################################################################
+    finishRunReport(report, rows=len(out_df), outpath=outpath, outdsn_parquet=outdsn_parquet, outdsn_csv=outdsn_csv)
 
     ###################################################################
     # RETURN the output dataframe.
     ###################################################################
-    return out_df  
+    return out_df
 
 
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: addFinRatioColumns()
+#
+# DESCRIPTION: This function adds a block of ratio columns, and their 1-year changes, to a dataframe sorted
+# by symbol and date. All numerators and denominators are gathered into two float arrays, so every ratio
+# is computed in one vectorized pass, and the 1-year changes are computed with the per-symbol lag kernel
+# of def_ttmKernel_v1. For each ratio it adds:
+#
+#   - <ratio>          = sign*numerator/denominator, missing unless the denominator is > 0
+#   - <ratio>_chg_1y   = the change of the ratio over 1 year (nper periods), as a difference
+#
+# FUNCTION INPUT ARGS
+#   - out_df = input dataframe sorted by symbol and date
+#   - ratios = the list of (name, numerator, denominator, sign) ratio definitions, see FIN_RATIOS
+#   - nper   = the number of periods per year (4 for quarterly data)
+#
+# OUTPUT
+#   - out_df
+############################################################################################################
+############################################################################################################
+def addFinRatioColumns(
+    out_df,
+    ratios = FIN_RATIOS,
+    nper   = 4
+):
 
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+    from def_ttmKernel_v1 import getGroupPosition, groupShift
 
-    
-    
-        
-    
-    
\ No newline at end of file
+    # Gather the numerators, denominators and signs of all the ratios.
+    names = [ratio[0] for ratio in ratios]
+    num = out_df[[ratio[1] for ratio in ratios]].to_numpy(dtype='float64', na_value=np.nan)
+    den = out_df[[ratio[2] for ratio in ratios]].to_numpy(dtype='float64', na_value=np.nan)
+    sign = np.array([ratio[3] for ratio in ratios], dtype='float64')
+
+    # Compute all the ratios and their 1-year changes at once.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.where(den>0, sign*num/den, np.nan)
+    values_chg = values - groupShift(values, getGroupPosition(out_df), nper)
+
+    # Add all the new columns to the dataframe at once.
+    new_df = pd.concat([
+        pd.DataFrame(values, index=out_df.index, columns=names),
+        pd.DataFrame(values_chg, index=out_df.index, columns=[name+'_chg_1y' for name in names])
+    ], axis=1)
+    out_df = out_df.drop(columns=[col for col in new_df.columns if col in out_df.columns])
+    return pd.concat([out_df, new_df], axis=1)
@@ -1,3 +1,16 @@
+# The builder decorator that stops the profiling of a failed run is applied at import time.
+from def_runReport_v1 import closeRunReports
+
+# The Key Metric input columns that are needed ('date_qtr' is removed later b/c it is has a data type in
+# pandas that is not compatible with parquet). marketCap is not used, since the market cap coming from the
+# Company Overview data is more reliable.
+KEYMETRIC_COLS  = ['symbol','date','date_qtr','fiscal_year','fiscal_qtr']
+KEYMETRIC_COLS += ['peRatio','revenuePerShare','netIncomePerShare','cashPerShare','freeCashFlowPerShare']
+KEYMETRIC_COLS += ['bookValuePerShare','shareholdersEquityPerShare','interestDebtPerShare']
+KEYMETRIC_COLS += ['earningsYield','freeCashFlowYield','debtToEquity','debtToAssets']
+KEYMETRIC_COLS += ['admin_runDate']
+
+
 ############################################################################################################
 ############################################################################################################
 # FUNCTION DEFINITION: getKeyMetricsABT()
@@ -16,14 +29,28 @@
 #   - in_df          = input key metrics dataframe, where in_df takes priority over in_fp
 #   - in_fp          = input key metrics complete filepath
 #
+#   - in_company_df  = input company overview dataframe, which takes precedent over in_company_fp (optional)
 #   - in_company_fp  = input company overview complete filepath (optional)
 #
+#   - frequency      = the frequency of the key metric data, either 'quarterly' or 'annual' (optional). For
+#                      annual data, only the annual summary columns are created.
+#
 #   - min_date       = the minimum date filter to apply to output data (optional, format is '2018-01-01')
 #   - max_date       = the maximum date filter to apply to output data (optional)
 #
+#   - as_of          = one as-of date or a list of as-of dates (optional). If specified, the output only has
+#                      the latest row of each stock that was available on each as-of date, see
+#                      getAsOfSnapshot() in def_pointInTime_v1.py
+#
 #   - outpath        = the folder path where all output data will be saved
 #   - outdsn_parquet = the name of output parquet file
-#   - outdsn_csv     = the name of the output csv file
+#   - outdsn_csv     = the name of the output csv file (.csv, .csv.gz or .csv.zst, see def_csvExport_v1.py)
+#   - csv_cols       = the list of columns written to the csv file (optional, defaults to all columns)
+#   - outdsn_arrow   = the name of the output Arrow IPC file (optional, .arrow or .feather, see def_arrowExport_v1.py)
+#
+#   - dq_rules       = list of data quality rules or a JSON filepath (optional, see def_dqRules_v1.py)
+#
+#   - profile        = the profile mode, '' (none), 'cpu', 'memory' or 'all' (optional, see def_runReport_v1.py)
 #
 # OUTPUT DATAFRAMES
 #   - out_df
@@ -31,18 +58,27 @@
 # OUTPUT FILES
 #   - outdsn_parquet (optional)
 #   - outdsn_csv (optional)
+#   - outdsn_arrow (optional)
 ############################################################################################################
 ############################################################################################################
+@closeRunReports
 def getKeyMetricABT_qtr(
     symbol_filters  = [],
     in_df           = '',
     in_fp           = '',      
+    in_company_df   = '',
     in_company_fp   = '',
+    frequency       = 'quarterly',
     min_date        = '2018-01-01',
     max_date        = '',
+    as_of           = '',
     outpath         = '',
     outdsn_parquet  = '',
-    outdsn_csv      = ''   
+    outdsn_csv      = '',
+    csv_cols        = [],
+    outdsn_arrow    = '',
+    dq_rules        = '',
+    profile         = ''
 ):
     
     ###########################################################################
@@ -51,42 +87,56 @@ def getKeyMetricABT_qtr(
     import pandas as pd    
     import numpy as np
     # import fastparquet as fp
-    
+    from def_durationUtils_v1 import addReportingDurations, getPeriodsPerYear
+    from def_dqRules_v1 import KEYMETRIC_DQ_RULES, KEYMETRIC_DQ_RULES_ANNUAL, applyDQRules
+    from def_statementUtils_v1 import loadStatement
+    from def_pointInTime_v1 import AVAIL_LAG_DAYS, addAvailabilityDate, getAsOfSnapshot
+    from def_runReport_v1 import startRunReport, runStage, finishRunReport
+    from def_csvExport_v1 import isCSVName, startCSVWrite
+    from def_arrowExport_v1 import isArrowName, writeArrow
+    from def_incrementalUtils_v1 import saveInputHash
+
     ###########################################################################
-    # Load input data from the specified input file, if no input dataframe was 
-    # specfied.
+    # Start the run report, which records the wall time, rows, and peak memory
+    # of the builder stages.
     ###########################################################################
-    if len(in_df)==0:
-        in_df = pd.read_parquet(in_fp, engine='pyarrow')   
-    numStocks = len(pd.unique(in_df['symbol']))
-    print(f'The number of distinct stocks in the input list = {numStocks}')
+    report = startRunReport('getKeyMetricABT_qtr', profile=profile)
 
     ###########################################################################
-    # If a stock filter list was specified, filter the input dataframe.
+    # Get the number of periods per year of the key metric frequency, which is
+    # the lag distance, in rows, of all the 1-year lags.
     ###########################################################################
-    if len(symbol_filters)>0:
-        symbol_filters = list(map(lambda x: x.upper(),symbol_filters))
-        in_df = in_df[in_df['symbol'].isin(symbol_filters)]
+    nper = getPeriodsPerYear(frequency)
+    
+    ###########################################################################
+    # Specify the Key Metric columns that are needed (see KEYMETRIC_COLS).
+    ###########################################################################
+    keeplist = KEYMETRIC_COLS
 
     ###########################################################################
-    # Keep only the Key Metric columns that are needed ('date_qtr' is removed 
-    # b/c it is has a data type in pandas that is not compatible with parquet).
-    # Also, we drop marketCap and instead use the market cap coming from the 
-    # Company Overview data since it is more reliable.
+    # Load input data (only the needed columns) from the specified input file,
+    # if no input dataframe was specfied, and apply the stock filter list, if
+    # one was specified. The shared loader also deduplicates restated (symbol,
+    # date) rows by keeping the row with the latest admin_runDate, and sorts 
+    # by symbol and date.
     ###########################################################################
-    keeplist  = ['symbol','date','date_qtr','fiscal_year','fiscal_qtr']
-    keeplist += ['peRatio','revenuePerShare','netIncomePerShare','cashPerShare','freeCashFlowPerShare']
-    keeplist += ['bookValuePerShare','shareholdersEquityPerShare','interestDebtPerShare']    
-    keeplist += ['earningsYield','freeCashFlowYield','debtToEquity','debtToAssets']
-    keeplist += ['admin_runDate']
-    in_df = in_df[keeplist]
-    in_df.rename(columns={'admin_runDate':'admin_runDate_km'},inplace=True) 
-    
+    with runStage(report, 'load') as stage:
+        in_df, restate_df = loadStatement(in_df, in_fp, symbol_filters, cols=keeplist, name='km')
+        stage['rows'] = len(in_df)
+    in_df = in_df.rename(columns={'admin_runDate':'admin_runDate_km'}) 
+    numStocks = len(pd.unique(in_df['symbol']))
+    print(f'The number of distinct stocks in the input list = {numStocks}')
+    if len(restate_df)>0:
+        print(f'The number of restated (symbol, date) rows that were deduplicated = {len(restate_df)}')
+
+    ###########################################################################
+    # Hash the input rows of each stock, if a parquet file is saved, so the
+    # next incremental update can detect the changed stocks by content hash
+    # (see updateKeyMetricABT_qtr()).
     ###########################################################################
-    # Sort by symbol and date.
-    ###########################################################################  
-    in_df.sort_values(by=['symbol','date'], ascending=[True,True], inplace=True)
-    in_df.reset_index(level=0, drop=True, inplace=True)
+    curr_len = len(outdsn_parquet)
+    if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
+        in_hash = getKeyMetricInputHash(in_df, min_date=min_date, max_date=max_date, rundate_col='admin_runDate_km')
     
     ###########################################################################
     # Initialize the output dataframe.
@@ -123,18 +173,7 @@ def getKeyMetricABT_qtr(
     # companies are reporting financials.
     ###########################################################################
     
-    # Create temporary nlag and max_nlag columns.
-    out_df['nlag'] = out_df.groupby(['symbol']).cumcount()
-    out_df['max_nlag'] = out_df.groupby(['symbol'])['nlag'].transform('max')
-        
-    # Get rid of the most recent row of data for a stock if it is incomplete.
-    cond1 = (out_df['nlag']==out_df['max_nlag']) 
-    cond2 = ((pd.isnull(out_df['RPS_0_1q'])==True)|(pd.isnull(out_df['NIPS_0_1q'])==True)|(pd.isnull(out_df['BVPS_0_1q'])==True))
-    cond3 = ((out_df['RPS_0_1q']==0)|(out_df['BVPS_0_1q']==True) )
-    out_df = out_df.loc[~(cond1&(cond2|cond3))]
-    
-    # Drop the temporary columns.
-    out_df = out_df.drop(['nlag','max_nlag'], axis=1)
+    out_df = dropIncompleteLastRow(out_df)
     
     ###########################################################################
     # DELETE HISTORICAL KEY METRIC DATA THAT IS NOT NEEDED: Apply a 4-year 
@@ -162,11 +201,14 @@ def getKeyMetricABT_qtr(
     # Merge in the Company Overview data, the Piotroski Score data, and the
     # Stock Price Return Stats data, if specified.
     ###########################################################################
-    curr_len = len(in_company_fp)
-    if curr_len>=9 and in_company_fp[curr_len-8:curr_len]=='.parquet':
-        in_company_df = pd.read_parquet(in_company_fp, engine='pyarrow') 
-        in_company_df = in_company_df[['symbol','sector','industry','ipo_date','isActivelyTrading']]        
-        out_df = pd.merge(out_df, in_company_df, on=['symbol'], how='left')
+    with runStage(report, 'merge') as stage:
+        curr_len = len(in_company_fp)
+        if len(in_company_df)>0 or (curr_len>=9 and in_company_fp[curr_len-8:curr_len]=='.parquet'):
+            if len(in_company_df)==0:
+                in_company_df = pd.read_parquet(in_company_fp, engine='pyarrow') 
+            in_company_df = in_company_df[['symbol','sector','industry','ipo_date','isActivelyTrading']]        
+            out_df = pd.merge(out_df, in_company_df, on=['symbol'], how='left')
+        stage['rows'] = len(out_df)
     
     ###########################################################################
     # Create the rolling quarter and annual Key Metric summary columns. 
@@ -181,131 +223,102 @@ def getKeyMetricABT_qtr(
     metric_list = ['RPS','NIPS','BVPS']
     
     # Create the metrics analysis columns by looping over the list items.
-    for i, cm in enumerate(metric_list):
+    with runStage(report, 'rolling_windows') as stage:
+        for i, cm in enumerate(metric_list):
         
-        ##########################
-        # QUARTER SUMMARY METRICS
-        ##########################
+            ##########################
+            # QUARTER SUMMARY METRICS
+            ##########################
         
-        # Calculate the lag values for 1-, 2-, 3-, 4-, 5-, 6-, 7-, and 8-qtrs 
-        # ago. Note that the current quarter value (_0_1q) already exists.
-        out_df[cm+'_1_2q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(1)
-        out_df[cm+'_2_3q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(2)
-        out_df[cm+'_3_4q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(3)
-        out_df[cm+'_4_5q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(4)
-        out_df[cm+'_5_6q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(5)  
-        out_df[cm+'_6_7q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(6)
-        out_df[cm+'_7_8q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(6)
-        out_df[cm+'_8_9q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(8)
-
-        # Calculate the percent change columns over a 1-year period.
-        out_df[cm+'_pc_0_1q'] = np.where(out_df[cm+'_4_5q']>0, out_df[cm+'_0_1q']/out_df[cm+'_4_5q']-1.0, np.nan)        
-        out_df[cm+'_pc_1_2q'] = np.where(out_df[cm+'_5_6q']>0, out_df[cm+'_1_2q']/out_df[cm+'_5_6q']-1.0, np.nan)        
-        out_df[cm+'_pc_2_3q'] = np.where(out_df[cm+'_6_7q']>0, out_df[cm+'_2_3q']/out_df[cm+'_6_7q']-1.0, np.nan)     
-        out_df[cm+'_pc_3_4q'] = np.where(out_df[cm+'_7_8q']>0, out_df[cm+'_3_4q']/out_df[cm+'_7_8q']-1.0, np.nan)     
-        out_df[cm+'_pc_4_5q'] = np.where(out_df[cm+'_8_9q']>0, out_df[cm+'_4_5q']/out_df[cm+'_8_9q']-1.0, np.nan) 
+            # Calculate the lag values for 1-, 2-, 3-, 4-, 5-, 6-, 7-, and 8-qtrs 
+            # ago. Note that the current quarter value (_0_1q) already exists. 
+            # These are only created for quarterly data.
+            if nper==4:
+                out_df[cm+'_1_2q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(1)
+                out_df[cm+'_2_3q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(2)
+                out_df[cm+'_3_4q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(3)
+                out_df[cm+'_4_5q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(4)
+                out_df[cm+'_5_6q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(5)  
+                out_df[cm+'_6_7q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(6)
+                out_df[cm+'_7_8q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(6)
+                out_df[cm+'_8_9q']= out_df.groupby(['symbol'])[cm+'_0_1q'].shift(8)
+
+                # Calculate the percent change columns over a 1-year period.
+                out_df[cm+'_pc_0_1q'] = np.where(out_df[cm+'_4_5q']>0, out_df[cm+'_0_1q']/out_df[cm+'_4_5q']-1.0, np.nan)        
+                out_df[cm+'_pc_1_2q'] = np.where(out_df[cm+'_5_6q']>0, out_df[cm+'_1_2q']/out_df[cm+'_5_6q']-1.0, np.nan)        
+                out_df[cm+'_pc_2_3q'] = np.where(out_df[cm+'_6_7q']>0, out_df[cm+'_2_3q']/out_df[cm+'_6_7q']-1.0, np.nan)     
+                out_df[cm+'_pc_3_4q'] = np.where(out_df[cm+'_7_8q']>0, out_df[cm+'_3_4q']/out_df[cm+'_7_8q']-1.0, np.nan)     
+                out_df[cm+'_pc_4_5q'] = np.where(out_df[cm+'_8_9q']>0, out_df[cm+'_4_5q']/out_df[cm+'_8_9q']-1.0, np.nan)
         
-        ##########################
-        # ANNUAL SUMMARY METRICS
-        ##########################
+            ##########################
+            # ANNUAL SUMMARY METRICS
+            ##########################
         
-        # Calculate the lag values for 0-, 1-, 2-, and 3-years ago. 
-        temp_col = out_df.groupby(['symbol'])[cm+'_0_1q'].rolling(4, min_periods=4).sum()
-        out_df[cm+'_0_1y'] = temp_col.reset_index(level=0,drop=True)
+            # Calculate the lag values for 0-, 1-, 2-, and 3-years ago, where each
+            # year sums the last nper periods. 
+            temp_col = out_df.groupby(['symbol'])[cm+'_0_1q'].rolling(nper, min_periods=nper).sum()
+            out_df[cm+'_0_1y'] = temp_col.reset_index(level=0,drop=True)
          
-        temp_col = out_df.groupby(['symbol'])[cm+'_0_1q'].rolling(8, min_periods=8).sum()
-        out_df[cm+'_1_2y'] = temp_col.reset_index(level=0,drop=True)
-        out_df[cm+'_1_2y'] = out_df[cm+'_1_2y'] - out_df[cm+'_0_1y']       
+            temp_col = out_df.groupby(['symbol'])[cm+'_0_1q'].rolling(2*nper, min_periods=2*nper).sum()
+            out_df[cm+'_1_2y'] = temp_col.reset_index(level=0,drop=True)
+            out_df[cm+'_1_2y'] = out_df[cm+'_1_2y'] - out_df[cm+'_0_1y']       
         
-        temp_col = out_df.groupby(['symbol'])[cm+'_0_1q'].rolling(12, min_periods=12).sum()
-        out_df[cm+'_2_3y'] = temp_col.reset_index(level=0,drop=True)
-        out_df[cm+'_2_3y'] = out_df[cm+'_2_3y'] - out_df[cm+'_0_1y'] - out_df[cm+'_1_2y']    
+            temp_col = out_df.groupby(['symbol'])[cm+'_0_1q'].rolling(3*nper, min_periods=3*nper).sum()
+            out_df[cm+'_2_3y'] = temp_col.reset_index(level=0,drop=True)
+            out_df[cm+'_2_3y'] = out_df[cm+'_2_3y'] - out_df[cm+'_0_1y'] - out_df[cm+'_1_2y']    
       
-        temp_col = out_df.groupby(['symbol'])[cm+'_0_1q'].rolling(16, min_periods=16).sum()
-        out_df[cm+'_3_4y'] = temp_col.reset_index(level=0,drop=True)
-        out_df[cm+'_3_4y'] = out_df[cm+'_3_4y'] - out_df[cm+'_0_1y'] - out_df[cm+'_1_2y'] - out_df[cm+'_2_3y']      
+            temp_col = out_df.groupby(['symbol'])[cm+'_0_1q'].rolling(4*nper, min_periods=4*nper).sum()
+            out_df[cm+'_3_4y'] = temp_col.reset_index(level=0,drop=True)
+            out_df[cm+'_3_4y'] = out_df[cm+'_3_4y'] - out_df[cm+'_0_1y'] - out_df[cm+'_1_2y'] - out_df[cm+'_2_3y']      
     
-        # Calculate the percent change columns over a 1-year period.  
-        out_df[cm+'_pc_0_1y'] = np.where(out_df[cm+'_1_2y']>0, out_df[cm+'_0_1y']/out_df[cm+'_1_2y']-1.0, np.nan) 
-        out_df[cm+'_pc_1_2y'] = np.where(out_df[cm+'_2_3y']>0, out_df[cm+'_1_2y']/out_df[cm+'_2_3y']-1.0, np.nan) 
-        out_df[cm+'_pc_2_3y'] = np.where(out_df[cm+'_3_4y']>0, out_df[cm+'_2_3y']/out_df[cm+'_3_4y']-1.0, np.nan)
-
-    ###########################################################################
-    # DATA QUALITY checks on the RPS, NIPS, and BVPS lagged values and their
-    # percent change values.
-    #
-    # Missing Date Logic: Check that all the key RPS, NIPS, and BVPS values are 
-    # not missing. If NONE of these values are missing, then we only then do we
-    # set the missing data value to '1' and '0' o/w. The values we check are
-    # based on those specified in chapters 3 and 4 of O'Neil's book.
-    #
-    # Notes: MMYT, SFM are interesting case studies. 
-    ###########################################################################
+            # Calculate the percent change columns over a 1-year period.  
+            out_df[cm+'_pc_0_1y'] = np.where(out_df[cm+'_1_2y']>0, out_df[cm+'_0_1y']/out_df[cm+'_1_2y']-1.0, np.nan) 
+            out_df[cm+'_pc_1_2y'] = np.where(out_df[cm+'_2_3y']>0, out_df[cm+'_1_2y']/out_df[cm+'_2_3y']-1.0, np.nan) 
+            out_df[cm+'_pc_2_3y'] = np.where(out_df[cm+'_3_4y']>0, out_df[cm+'_2_3y']/out_df[cm+'_3_4y']-1.0, np.nan)
+        stage['rows'] = len(out_df)
 
-    # Create the combined RPS and NIPS missing data column.
-    cond1 = ( pd.isnull(out_df['RPS_0_1q'])==True )
-    cond2 = ( pd.isnull(out_df['RPS_1_2q'])==True )
-    cond3 = ( pd.isnull(out_df['RPS_4_5q'])==True )
-    cond4 = ( pd.isnull(out_df['RPS_5_6q'])==True )    
-    cond5 = ( pd.isnull(out_df['RPS_0_1y'])==True )
-    cond6 = ( pd.isnull(out_df['RPS_1_2y'])==True )
-    cond7 = ( pd.isnull(out_df['RPS_2_3y'])==True )
-    cond8 = ( pd.isnull(out_df['RPS_3_4y'])==True )
-    cond9 = ( pd.isnull(out_df['NIPS_0_1q'])==True )
-    cond10 = ( pd.isnull(out_df['NIPS_1_2q'])==True )
-    cond11 = ( pd.isnull(out_df['NIPS_4_5q'])==True )
-    cond12 = ( pd.isnull(out_df['NIPS_5_6q'])==True )    
-    cond13 = ( pd.isnull(out_df['NIPS_0_1y'])==True )
-    cond14 = ( pd.isnull(out_df['NIPS_1_2y'])==True )
-    cond15 = ( pd.isnull(out_df['NIPS_2_3y'])==True )       
-    cond16 = ( pd.isnull(out_df['NIPS_3_4y'])==True )       
-    cond = cond1|cond2|cond3|cond4|cond5|cond6|cond7|cond8
-    cond = cond|cond9|cond10|cond11|cond12|cond13|cond14|cond15|cond16
-    out_df['dqPass_notNull'] = np.where(cond,'0','1')
-
-    # Create the combined RPS and NIPS lower and upper-bound check column.
-    cond1 = ( out_df[['RPS_0_1q','RPS_1_2q','RPS_4_5q','RPS_5_6q']].min(axis=1) > 0.0 )
-    cond2 = ( out_df[['RPS_0_1q','RPS_1_2q','RPS_4_5q','RPS_5_6q']].max(axis=1) <= 1200.0 )     
-    cond3 = ( out_df[['RPS_0_1y','RPS_1_2y','RPS_2_3y','RPS_3_4y']].min(axis=1) > 0.0 )
-    cond4 = ( out_df[['RPS_0_1y','RPS_1_2y','RPS_2_3y','RPS_3_4y']].max(axis=1) <= 1200.0 )
-    cond5 = ( out_df[['NIPS_0_1q','NIPS_1_2q','NIPS_4_5q','NIPS_5_6q']].min(axis=1) > -1000.0 )
-    cond6 = ( out_df[['NIPS_0_1q','NIPS_1_2q','NIPS_4_5q','NIPS_5_6q']].max(axis=1) <= 1200.0 )   
-    cond7 = ( out_df[['NIPS_0_1y','NIPS_1_2y','NIPS_2_3y','NIPS_3_4y']].min(axis=1) > -1000.0 )
-    cond8 = ( out_df[['NIPS_0_1y','NIPS_1_2y','NIPS_2_3y','NIPS_3_4y']].max(axis=1) <= 1200.0 )
-    cond = cond1&cond2&cond3&cond4&cond5&cond6&cond7&cond8
-    out_df['dqPass_limits'] = np.where(cond,'1','0')    
-    
-    # Create the combined RPS and NIPS percent change check column.
-    cond1 = ( out_df[['RPS_pc_0_1q','RPS_pc_1_2q']].min(axis=1) > -2.0 )
-    cond2 = ( out_df[['RPS_pc_0_1q','RPS_pc_1_2q']].max(axis=1) <= 12.0 )        
-    cond3 = ( out_df[['RPS_pc_0_1y','RPS_pc_1_2y','RPS_pc_2_3y']].min(axis=1) > -2.0 )
-    cond4 = ( out_df[['RPS_pc_0_1y','RPS_pc_1_2y','RPS_pc_2_3y']].max(axis=1) <= 12.0 )
-    cond5 = ( out_df[['NIPS_pc_0_1q','NIPS_pc_1_2q']].min(axis=1) > -2.0 )
-    cond6 = ( out_df[['NIPS_pc_0_1q','NIPS_pc_1_2q']].max(axis=1) <= 12.0 )        
-    cond7 = ( out_df[['NIPS_pc_0_1y','NIPS_pc_1_2y','NIPS_pc_2_3y']].min(axis=1) > -2.0 )
-    cond8 = ( out_df[['NIPS_pc_0_1y','NIPS_pc_1_2y','NIPS_pc_2_3y']].max(axis=1) <= 12.0 )
-    cond = cond1&cond2&cond3&cond4&cond5&cond6&cond7&cond8
-    out_df['dqPass_pc'] = np.where(cond,'1','0')  
-    
     ###########################################################################
     # Calculate the number of days from current date to the date 4 periods ago. 
     # We round this number of days to increments of (365/4) days and if its
     # value is within +/- 10 days of the increment value. For companies that 
-    # report financials quarterly, the duration after rounding should be 274 
-    # days (9 months=365-91). For companies that report financials bi-annually,  
-    # the duration should be 639 days (730-91).
-    ###########################################################################
-    out_df['days_0_1y'] = (out_df['date']-out_df.groupby(['symbol'])['date'].shift(3)).dt.days + 91
-    out_df['days_1_2y'] = (out_df['date']-out_df.groupby(['symbol'])['date'].shift(7)).dt.days + 91
-    for i in [274,365,456,547,639,730,821,913,1004,1095,1186,1278,1369,1460]:
-        out_df['days_0_1y'] = np.where((out_df['days_0_1y']-i).abs()<=10, i, out_df['days_0_1y'])
-        out_df['days_1_2y'] = np.where((out_df['days_1_2y']-i).abs()<=10, i, out_df['days_1_2y'])
+    # report financials quarterly, the duration after rounding should be 365 
+    # days (274+91). For companies that report financials bi-annually, the 
+    # duration should be 639 days (547+91). The reporting cadence inferred
+    # from the gaps between report dates is also added for each stock. For
+    # annual data, the durations span the last 1 and 2 periods instead.
+    ###########################################################################
+    with runStage(report, 'durations') as stage:
+        out_df = addReportingDurations(out_df, tol=10, nper=nper)
+        stage['rows'] = len(out_df)
     
     ###########################################################################
     # Apply the min date thresholds, if they were specified.
     ###########################################################################
     if len(min_date)>0:
         out_df = out_df.loc[out_df['date']>=pd.to_datetime(min_date)]    
+
+    ###########################################################################
+    # DATA QUALITY checks on the RPS, NIPS, and BVPS lagged values and their
+    # percent change values.
+    #
+    # The checks are declared as data in KEYMETRIC_DQ_RULES (or in the dq_rules
+    # list or JSON file, if one was given) and are evaluated in one pass. Each
+    # failed rule sets a bit in 'dqFail_mask', and the dqPass_notNull,
+    # dqPass_limits and dqPass_pc flags are set to '1' only if none of their 
+    # rules failed. The values we check are based on those specified in 
+    # chapters 3 and 4 of O'Neil's book.
+    #
+    # Notes: MMYT, SFM are interesting case studies. 
+    ###########################################################################
+    if len(dq_rules)==0 and nper==4:
+        dq_rules = KEYMETRIC_DQ_RULES
+    elif len(dq_rules)==0:
+        dq_rules = KEYMETRIC_DQ_RULES_ANNUAL
+    out_df = out_df.copy()
+    with runStage(report, 'dq_rules') as stage:
+        out_df, dq_report = applyDQRules(out_df, rules=dq_rules, mask_col='dqFail_mask')
+        stage['rows'] = len(out_df)
+    print(f'Data quality rule failure counts:\n{dq_report.to_string(index=False)}')
     
     ###########################################################################
     # Create a row record count (nlag) for each symbol, the max record count,
@@ -317,6 +330,13 @@ def getKeyMetricABT_qtr(
     conds = [ out_df['nlag']==out_df['max_nlag'], out_df['nlag']==0 ]
     out_df['firstLast_flag'] = np.select(conds, ['L','F'], default='I')     
         
+    ###################################################################
+    # POINT-IN-TIME: Add the availability date of each row. The key 
+    # metrics have no filing dates, so a row is available a fixed filing 
+    # delay after its period date.
+    ###################################################################
+    out_df = addAvailabilityDate(out_df, lag_days=AVAIL_LAG_DAYS[frequency])
+
     ###################################################################
     # Reorder the output columns and also only keep columns specified.
     ###################################################################
@@ -327,12 +347,15 @@ def getKeyMetricABT_qtr(
     # Specify the left to right ordering of the key columns.
     col_order += ['symbol','date','year','fiscal_year','fiscal_qtr']
     col_order += ['max_nlag','firstLast_flag','nlag','reverse_nlag']
-    col_order += ['dqPass_notNull','dqPass_limits','dqPass_pc']
-    col_order += ['days_0_1y','days_1_2y']
+    col_order += ['dqPass_notNull','dqPass_limits','dqPass_pc','dqFail_mask']
+    col_order += ['days_0_1y','days_1_2y','report_cadence']
     for i, cm in enumerate(metric_list):
                 
-        col_order += [cm+'_0_1q',cm+'_1_2q',cm+'_2_3q',cm+'_3_4q',cm+'_4_5q',cm+'_5_6q',cm+'_6_7q',cm+'_7_8q',cm+'_8_9q']
-        col_order += [cm+'_pc_0_1q',cm+'_pc_1_2q',cm+'_pc_2_3q',cm+'_pc_3_4q',cm+'_pc_4_5q']
+        if nper==4:
+            col_order += [cm+'_0_1q',cm+'_1_2q',cm+'_2_3q',cm+'_3_4q',cm+'_4_5q',cm+'_5_6q',cm+'_6_7q',cm+'_7_8q',cm+'_8_9q']
+            col_order += [cm+'_pc_0_1q',cm+'_pc_1_2q',cm+'_pc_2_3q',cm+'_pc_3_4q',cm+'_pc_4_5q']
+        else:
+            col_order += [cm+'_0_1q']
         
         col_order += [cm+'_0_1y',cm+'_1_2y',cm+'_2_3y',cm+'_3_4y']
         col_order += [cm+'_pc_0_1y',cm+'_pc_1_2y',cm+'_pc_2_3y']
@@ -341,6 +364,7 @@ def getKeyMetricABT_qtr(
     
     # Specify the columns that are to be placed at the end.
     col_end = ['date_qtr','year_char','month_char']
+    col_end += ['date_avail']
     col_end += ['admin_runDate_km']    
     
     # Get the remaining columns that are not specifically specified.
@@ -349,23 +373,57 @@ def getKeyMetricABT_qtr(
     
     # Reorder the columns in the output dataframe.
     out_df = out_df[col_order + col_remain + col_end] 
+
+    ###################################################################
+    # If as-of dates were specified, only keep the rows that were the 
+    # latest known rows of each stock on those dates.
+    ###################################################################
+    if len(as_of)>0:
+        with runStage(report, 'as_of_snapshot') as stage:
+            out_df = getAsOfSnapshot(out_df, as_of)
+            stage['rows'] = len(out_df)
     
     ###################################################################
     # SAVE the output dataframe as a file.
     ###################################################################
     
+    # Start writing the CSV file in a background thread, if one was given, so
+    # it is written at the same time as the parquet file.
+    if isCSVName(outdsn_csv):
+        csv_write = startCSVWrite(out_df, f'{outpath}/{outdsn_csv}', cols=csv_cols)
+
     # Save as a PARQUET file, if one was given.
     curr_len = len(outdsn_parquet)
     if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
         out_parquet = f'{outpath}/{outdsn_parquet}' 
-        out_df.to_parquet(f'{out_parquet}',index=False)
+        with runStage(report, 'to_parquet', rows=len(out_df)):
+            out_df.to_parquet(f'{out_parquet}',index=False)
+    
+    # Save the restatement log as a CSV file next to the parquet file, if any
+    # restated rows were deduplicated.
+    if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet' and len(restate_df)>0:
+        restate_df.to_csv(f'{outpath}/{outdsn_parquet[0:curr_len-8]}_restatements.csv',index=False)
+
+    # Save the input hashes next to the parquet file, if one was given.
+    if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
+        saveInputHash(in_hash, out_parquet)
     
-    # Save as a CSV file, if one was given.
-    curr_len = len(outdsn_csv)
-    if curr_len>=5 and outdsn_csv[curr_len-4:curr_len]=='.csv':
-        out_csv = f'{outpath}/{outdsn_csv}' 
-        out_df.to_csv(f'{out_csv}',index=False)       
+    # Save as an ARROW IPC file, if one was given, which downstream processes
+    # can memory-map.
+    if isArrowName(outdsn_arrow):
+        with runStage(report, 'to_arrow', rows=len(out_df)):
+            writeArrow(out_df, f'{outpath}/{outdsn_arrow}')
+
+    # Wait for the CSV file, if one was given.
+    if isCSVName(outdsn_csv):
+        with runStage(report, 'to_csv', rows=len(out_df)):
+            csv_write.result()
     
+    ###################################################################
+    # Finish the run report and save it next to the output files.
+    ###################################################################
+    finishRunReport(report, rows=len(out_df), outpath=outpath, outdsn_parquet=outdsn_parquet, outdsn_csv=outdsn_csv)
+
     ###################################################################
     # RETURN the output dataframe.
     ###################################################################
@@ -373,4 +431,281 @@ def getKeyMetricABT_qtr(
 
 
 
-        
\ No newline at end of file
+        
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: dropIncompleteLastRow()
+#
+# DESCRIPTION: This function removes the most recent row of each stock if it
+# has incomplete RPS, NIPS, or BVPS data. The input must have the renamed key
+# metric columns and be sorted by symbol and date.
+###############################################################################
+###############################################################################
+def dropIncompleteLastRow(
+    out_df
+):
+
+    # Import packages.
+    import pandas as pd
+
+    # Create the nlag and max_nlag series, without changing the input.
+    nlag = out_df.groupby(['symbol']).cumcount()
+    max_nlag = nlag.groupby(out_df['symbol']).transform('max')
+        
+    # Get rid of the most recent row of data for a stock if it is incomplete.
+    cond1 = (nlag==max_nlag) 
+    cond2 = ((pd.isnull(out_df['RPS_0_1q'])==True)|(pd.isnull(out_df['NIPS_0_1q'])==True)|(pd.isnull(out_df['BVPS_0_1q'])==True))
+    cond3 = ((out_df['RPS_0_1q']==0)|(out_df['BVPS_0_1q']==True) )
+    return out_df.loc[~(cond1&(cond2|cond3))]
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getKeyMetricInputHash()
+#
+# DESCRIPTION: This function returns the content hash of the input rows of
+# each stock that its Key Metric ABT rows depend on, which are the rows from
+# the 4-year buffered min date to the max date, with all the KEYMETRIC_COLS
+# columns (the _0_1q values feed the lags and sums of the later rows, and the
+# other columns pass through to the ABT). The input must be deduplicated.
+###############################################################################
+###############################################################################
+def getKeyMetricInputHash(
+    in_df,
+    min_date    = '',
+    max_date    = '',
+    rundate_col = 'admin_runDate'
+):
+
+    # Import packages.
+    import pandas as pd
+    from def_incrementalUtils_v1 import getSymbolHash
+
+    # Keep the rows within the buffered date window of getKeyMetricABT_qtr().
+    buffer_yr = 4
+    if len(min_date)>0:
+        min_date_buffer = str(int(min_date[0:4])-buffer_yr)+min_date[4:len(min_date)]
+        in_df = in_df.loc[in_df['date']>=pd.to_datetime(min_date_buffer)]
+    if len(max_date)>0:
+        in_df = in_df.loc[in_df['date']<=pd.to_datetime(max_date)]
+
+    # Hash all the needed input columns.
+    cols = [rundate_col if col=='admin_runDate' else col for col in KEYMETRIC_COLS if col!='symbol']
+    return getSymbolHash(in_df, [col for col in cols if col in in_df.columns])
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: updateKeyMetricABT_qtr()
+#
+# APPLICATION: Only for stock data, since ETFs do not have key metrics data.
+#
+# DESCRIPTION: This function incrementally refreshes an existing Key Metric ABT. It detects the stocks
+# whose key metric rows changed since the previous ABT was built (by admin_runDate or by a content hash),
+# recomputes only those stocks with getKeyMetricABT_qtr() (which applies the same 4-year buffer), and
+# splices them into the previous ABT rows of all the other stocks. If the previous ABT does not exist or
+# its columns do not match the current ABT columns, a full rebuild is done instead. Note that the same
+# min_date and max_date that were used to build the previous ABT should be specified.
+#
+# The change detection compares the deduplicated key metric rows. The 'hash' method compares the content
+# hash of all the input rows and columns that a stock's ABT rows depend on (see getKeyMetricInputHash())
+# with the hashes that the previous build saved next to the ABT, and does a full rebuild if there are none.
+# If company overview data is given, the stocks whose sector, industry, ipo_date or isActivelyTrading
+# changed are also recomputed. The restatement log and the input hashes are saved next to the parquet file,
+# as in the full build, where the restatement log only lists the restated rows of the recomputed stocks.
+#
+# FUNCTION INPUT ARGS
+#
+#   - symbol_filters = input list of stocks that are used to filter in_df (optional)
+#
+#   - in_df          = input key metrics dataframe, where in_df takes priority over in_fp
+#   - in_fp          = input key metrics complete filepath
+#
+#   - in_company_df  = input company overview dataframe, which takes precedent over in_company_fp (optional)
+#   - in_company_fp  = input company overview complete filepath (optional)
+#
+#   - frequency      = the frequency of the key metric data, either 'quarterly' or 'annual' (optional)
+#
+#   - min_date       = the minimum date filter to apply to output data (optional, format is '2018-01-01')
+#   - max_date       = the maximum date filter to apply to output data (optional)
+#
+#   - prev_abt_fp    = the complete filepath to the previous ABT (optional, defaults to outpath/outdsn_parquet)
+#   - change_method  = the change detection method, either 'runDate' or 'hash'
+#
+#   - outpath        = the folder path where all output data will be saved
+#   - outdsn_parquet = the name of output parquet file
+#   - outdsn_csv     = the name of the output csv file (.csv, .csv.gz or .csv.zst, see def_csvExport_v1.py)
+#   - csv_cols       = the list of columns written to the csv file (optional, defaults to all columns)
+#   - outdsn_arrow   = the name of the output Arrow IPC file (optional, .arrow or .feather, see def_arrowExport_v1.py)
+#
+#   - dq_rules       = list of data quality rules or a JSON filepath (optional, see def_dqRules_v1.py)
+#
+#   - profile        = the profile mode, '' (none), 'cpu', 'memory' or 'all' (optional, see def_runReport_v1.py)
+#
+# OUTPUT DATAFRAMES
+#   - out_df
+#
+# OUTPUT FILES
+#   - outdsn_parquet (optional)
+#   - outdsn_csv (optional)
+#   - outdsn_arrow (optional)
+############################################################################################################
+############################################################################################################
+def updateKeyMetricABT_qtr(
+    symbol_filters  = [],
+    in_df           = '',
+    in_fp           = '',      
+    in_company_df   = '',
+    in_company_fp   = '',
+    frequency       = 'quarterly',
+    min_date        = '2018-01-01',
+    max_date        = '',
+    prev_abt_fp     = '',
+    change_method   = 'runDate',
+    outpath         = '',
+    outdsn_parquet  = '',
+    outdsn_csv      = '',
+    csv_cols        = [],
+    outdsn_arrow    = '',
+    dq_rules        = '',
+    profile         = ''
+):
+
+    ###########################################################################
+    # Import Packages
+    ###########################################################################
+    import os
+    import pandas as pd    
+    from def_incrementalUtils_v1 import getChangedSymbols, getChangedCompanySymbols, loadInputHash, saveInputHash
+    from def_statementUtils_v1 import loadStatement
+    from def_csvExport_v1 import isCSVName, startCSVWrite
+    from def_arrowExport_v1 import isArrowName, writeArrow
+
+    ###########################################################################
+    # Load input data from the specified input file, if no input dataframe was 
+    # specfied, and apply the stock filter list, if one was specified. The
+    # shared loader deduplicates the restated rows, as the full build does.
+    ###########################################################################
+    in_df, restate_df = loadStatement(in_df, in_fp, symbol_filters, name='km')
+
+    ###########################################################################
+    # Load the company overview data once, if it was specified, since it is
+    # both compared with the previous ABT and merged into the changed stocks.
+    ###########################################################################
+    curr_len = len(in_company_fp)
+    if len(in_company_df)==0 and curr_len>=9 and in_company_fp[curr_len-8:curr_len]=='.parquet':
+        in_company_df = pd.read_parquet(in_company_fp, engine='pyarrow')
+
+    ###########################################################################
+    # Load the previous ABT. If there is no previous ABT, do a full rebuild.
+    ###########################################################################
+    if len(prev_abt_fp)==0:
+        prev_abt_fp = f'{outpath}/{outdsn_parquet}'
+    full_args = dict(
+        in_company_df  = in_company_df,
+        frequency      = frequency,
+        min_date       = min_date,
+        max_date       = max_date,
+        dq_rules       = dq_rules,
+        csv_cols       = csv_cols,
+        profile        = profile
+    )
+    if not os.path.isfile(prev_abt_fp):
+        print(f'No previous Key Metric ABT was found at {prev_abt_fp}, so a full rebuild is done.')
+        return getKeyMetricABT_qtr(in_df=in_df.copy(), outpath=outpath, outdsn_parquet=outdsn_parquet, 
+                                   outdsn_csv=outdsn_csv, outdsn_arrow=outdsn_arrow, **full_args)
+    prev_df = pd.read_parquet(prev_abt_fp, engine='pyarrow')
+
+    ###########################################################################
+    # Hash the input rows of each stock, which are compared with the hashes
+    # of the previous build (hash method) and saved with the output. If the
+    # previous build saved no hashes, do a full rebuild.
+    ###########################################################################
+    in_hash = getKeyMetricInputHash(in_df, min_date=min_date, max_date=max_date)
+    prev_hash = loadInputHash(prev_abt_fp)
+    if change_method=='hash' and prev_hash is None:
+        print('No input hashes of the previous Key Metric ABT were found, so a full rebuild is done.')
+        return getKeyMetricABT_qtr(in_df=in_df.copy(), outpath=outpath, outdsn_parquet=outdsn_parquet, 
+                                   outdsn_csv=outdsn_csv, outdsn_arrow=outdsn_arrow, **full_args)
+
+    ###########################################################################
+    # Detect the stocks whose key metric rows changed since the previous ABT.
+    ###########################################################################
+    changed = getChangedSymbols(
+        in_df, 
+        prev_df,
+        method       = change_method,
+        in_rundate   = 'admin_runDate',
+        prev_rundate = 'admin_runDate_km',
+        in_hash      = in_hash,
+        prev_hash    = prev_hash
+    )
+
+    # Add the stocks whose company overview columns changed.
+    if len(in_company_df)>0:
+        company_cols = ['sector','industry','ipo_date','isActivelyTrading']
+        changed = sorted(set(changed) | set(getChangedCompanySymbols(in_company_df, prev_df, company_cols)))
+    numStocks = len(pd.unique(in_df['symbol']))
+    print(f'The number of changed stocks that will be recomputed = {len(changed)} of {numStocks}')
+
+    ###########################################################################
+    # Recompute the changed stocks and splice them into the previous ABT rows 
+    # of the unchanged stocks. Stocks that are no longer in the input data are
+    # dropped, just as they would be in a full rebuild.
+    ###########################################################################
+    keep_df = prev_df.loc[prev_df['symbol'].isin(in_df['symbol']) & ~prev_df['symbol'].isin(changed)]
+    if len(changed)==0 and len(keep_df)==len(prev_df):
+        print('The previous Key Metric ABT is up to date, so no output files are written.')
+        return prev_df
+    if len(changed)>0:
+        new_df = getKeyMetricABT_qtr(in_df=in_df.loc[in_df['symbol'].isin(changed)].copy(), **full_args)
+        if set(new_df.columns)!=set(prev_df.columns):
+            print('The previous Key Metric ABT columns do not match, so a full rebuild is done.')
+            return getKeyMetricABT_qtr(in_df=in_df.copy(), outpath=outpath, outdsn_parquet=outdsn_parquet, 
+                                       outdsn_csv=outdsn_csv, outdsn_arrow=outdsn_arrow, **full_args)
+        out_df = pd.concat([keep_df[new_df.columns], new_df], ignore_index=True)
+    else:
+        out_df = keep_df.copy()
+
+    # Sort and reindex the spliced data.
+    out_df.sort_values(by=['symbol','date'], ascending=[True,True], inplace=True)
+    out_df.reset_index(level=0, drop=True, inplace=True) 
+
+    ###################################################################
+    # SAVE the output dataframe as a file.
+    ###################################################################
+    
+    # Start writing the CSV file in a background thread, if one was given, so
+    # it is written at the same time as the parquet file.
+    if isCSVName(outdsn_csv):
+        csv_write = startCSVWrite(out_df, f'{outpath}/{outdsn_csv}', cols=csv_cols)
+
+    # Save as a PARQUET file, if one was given.
+    curr_len = len(outdsn_parquet)
+    if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
+        out_parquet = f'{outpath}/{outdsn_parquet}' 
+        out_df.to_parquet(f'{out_parquet}',index=False)
+
+    # Save the restatement log of the recomputed stocks as a CSV file next to 
+    # the parquet file, if any of their restated rows were deduplicated, and
+    # save the input hashes of all the stocks.
+    if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
+        restate_df = restate_df.loc[restate_df['symbol'].isin(changed)]
+        if len(restate_df)>0:
+            restate_df.to_csv(f'{outpath}/{outdsn_parquet[0:curr_len-8]}_restatements.csv',index=False)
+        saveInputHash(in_hash, out_parquet)
+    
+    # Save as an ARROW IPC file, if one was given, which downstream processes
+    # can memory-map.
+    if isArrowName(outdsn_arrow):
+        writeArrow(out_df, f'{outpath}/{outdsn_arrow}')
+
+    # Wait for the CSV file, if one was given.
+    if isCSVName(outdsn_csv):
+        csv_write.result()
+    
+    ###################################################################
+    # RETURN the output dataframe.
+    ###################################################################
+    return out_df
@@ -1,3 +1,7 @@
+# The builder decorator that stops the profiling of a failed run is applied at import time.
+from def_runReport_v1 import closeRunReports
+
+
 ############################################################################################################
 ############################################################################################################
 # FUNCTION DEFINITION: getPiotroskiABT()
@@ -33,12 +37,19 @@
 #   - is_fp          = the complete filepath to the income statement parquet file
 #   - bs_fp          = the complete filepath to the balance sheet statement parquet file
 #   - cf_fp          = the complete filepath to the cashflow statement parquet file
+#   - in_company_df  = input company overview dataframe, which takes precedent over in_company_fp (optional)
 #   - in_company_fp  = input company overview complete filepath (optional)
+#   - frequency      = the frequency of the statement data, either 'quarterly' or 'annual' (optional)
 #   - min_date       = the minimum date filter to apply to the data (optional)
 #   - max_date       = the maximum date filter to apply to the data (optional)
+#   - as_of          = one as-of date or a list of as-of dates (optional). If specified, the output only has
+#                      the latest row of each stock that was available on each as-of date
 #   - outpath        = the folder path where the output data is saved (optional)
 #   - outdsn_parquet = the name of the output parquet file (optional)
-#   - outdsn_csv     = the name of the output csv file (optional)
+#   - outdsn_csv     = the name of the output csv file (optional, .csv, .csv.gz or .csv.zst, see def_csvExport_v1.py)
+#   - csv_cols       = the list of columns written to the csv file (optional, defaults to all columns)
+#   - outdsn_arrow   = the name of the output Arrow IPC file (optional, .arrow or .feather, see def_arrowExport_v1.py)
+#   - profile        = the profile mode, '' (none), 'cpu', 'memory' or 'all' (optional, see def_runReport_v1.py)
 #
 # FUNCTION DEPENDENCIES: This function calls the function computePiotroskiRules(),
 # which is defined in below in this file.
@@ -53,8 +64,10 @@
 # OUTPUT FILES
 #   - outdsn_parquet (optional)
 #   - outdsn_csv (optional)
+#   - outdsn_arrow (optional)
 ############################################################################################################
 ############################################################################################################
+@closeRunReports
 def getPiotroskiABT(
     symbol_filters = [],    
     is_df          = '',
@@ -63,12 +76,18 @@ def getPiotroskiABT(
     is_fp          = '',
     bs_fp          = '',
     cf_fp          = '',
+    in_company_df  = '',
     in_company_fp  = '',
+    frequency      = 'quarterly',
     min_date       = '2015-01-01',
     max_date       = '',    
+    as_of          = '',
     outpath        = '',
     outdsn_parquet = '',
-    outdsn_csv     = ''      
+    outdsn_csv     = '',
+    csv_cols       = [],
+    outdsn_arrow   = '',
+    profile        = ''
 ):
 
     ###################################################################
@@ -77,107 +96,122 @@ def getPiotroskiABT(
     import pandas as pd
     from pandas.tseries.offsets import MonthEnd
     import numpy as np
-    
+    from def_durationUtils_v1 import addReportingDurations, getPeriodsPerYear
+    from def_ttmKernel_v1 import addTTMColumns
+    from def_statementUtils_v1 import loadStatement, mergeStatements
+    from def_pointInTime_v1 import AVAIL_LAG_DAYS, addAvailabilityDate, getAsOfSnapshot
+    from def_runReport_v1 import startRunReport, runStage, finishRunReport
+    from def_csvExport_v1 import isCSVName, startCSVWrite
+    from def_arrowExport_v1 import isArrowName, writeArrow
+
     ###################################################################
-    # Load input data, if no input dataframe was specfied.
+    # Start the run report, which records the wall time, rows, and peak
+    # memory of the builder stages.
     ###################################################################
-    if len(is_df)==0:    
-        is_df = pd.read_parquet(is_fp, engine='pyarrow')
-    if len(bs_df)==0:     
-        bs_df = pd.read_parquet(bs_fp, engine='pyarrow')
-    if len(cf_df)==0:    
-        cf_df = pd.read_parquet(cf_fp, engine='pyarrow')
-
-    ###########################################################################
-    # If a stock filter list was specified, filter the input dataframe.
-    ###########################################################################
-    if len(symbol_filters)>0:
-        symbol_filters = list(map(lambda x: x.upper(),symbol_filters))
-        is_df = is_df[is_df['symbol'].isin(symbol_filters)]
-        bs_df = bs_df[bs_df['symbol'].isin(symbol_filters)]
-        cf_df = cf_df[cf_df['symbol'].isin(symbol_filters)]
-
-    ###########################################################################
-    # Sort by symbol and date.
-    ###########################################################################  
-    is_df.sort_values(by=['symbol','date'], ascending=[True,True], inplace=True)
-    is_df.reset_index(level=0, drop=True, inplace=True)
-
-    bs_df.sort_values(by=['symbol','date'], ascending=[True,True], inplace=True)
-    bs_df.reset_index(level=0, drop=True, inplace=True)
+    report = startRunReport('getPiotroskiABT', profile=profile)
     
-    cf_df.sort_values(by=['symbol','date'], ascending=[True,True], inplace=True)
-    cf_df.reset_index(level=0, drop=True, inplace=True)
+    ###################################################################
+    # Get the number of periods per year of the statement frequency, 
+    # which is the lag distance, in rows, of all the 1-year lags.
+    ###################################################################
+    nper = getPeriodsPerYear(frequency)
 
     ###################################################################
-    # Keep only the columns that are needed to compute the Piotroski 
+    # Specify the columns that are needed to compute the Piotroski 
     # score.
     ###################################################################
     is_cols = ['date','symbol','netIncome','numShares','revenue','grossProfitRatio']
-    is_df = is_df[is_cols]
+
+    # The filing date columns are optional, since older files do not have them.
+    filing_cols = ['fillingDate','acceptedDate']
     
     bs_cols = ['date','symbol','totalAssets','longTermDebt','totalLiabilities','minorityInterest']
     bs_cols += ['cashAndCashEquivalents','shortTermInvestments','netReceivables','totalCurrentLiabilities']
-    bs_df = bs_df[bs_cols]
     
     cf_cols = ['date','symbol','operatingCashFlow']
-    cf_df = cf_df[cf_cols] 
+
+    ###################################################################
+    # Load input data (only the needed columns), if no input dataframe
+    # was specfied, and apply the stock filter list, if one was given.
+    # The shared loader also deduplicates restated (symbol, date) rows
+    # by keeping the row with the latest admin_runDate, and sorts by 
+    # symbol and date.
+    ###################################################################
+    with runStage(report, 'load') as stage:
+        is_df, is_restate = loadStatement(is_df, is_fp, symbol_filters, cols=is_cols, optional_cols=filing_cols, name='is')
+        bs_df, bs_restate = loadStatement(bs_df, bs_fp, symbol_filters, cols=bs_cols, name='bs')
+        cf_df, cf_restate = loadStatement(cf_df, cf_fp, symbol_filters, cols=cf_cols, name='cf')
+        stage['rows'] = len(is_df) + len(bs_df) + len(cf_df)
+    restate_df = pd.concat([is_restate, bs_restate, cf_restate], ignore_index=True)
+    if len(restate_df)>0:
+        print(f'Restated (symbol, date) rows that were deduplicated:\n{restate_df.groupby(["statement"]).size().to_string()}')
 
     ###################################################################
     # Merge the 3 financial statement dataframes into one overall 
-    # dataframe.
+    # dataframe, with a sorted merge that keeps the symbol and date 
+    # sort order of the income statements.
     ###################################################################
-    out_df = pd.merge(is_df, bs_df, on=['symbol','date'], how='left') 
-    out_df = pd.merge(out_df, cf_df, on=['symbol','date'], how='left') 
+    with runStage(report, 'merge_statements') as stage:
+        out_df, merge_report = mergeStatements(is_df, [bs_df, cf_df], names=['is','bs','cf'])
+        stage['rows'] = len(out_df)
+    if len(merge_report)>0:
+        print(f'Statement rows that failed to match:\n{merge_report.groupby(["statement","issue"]).size().to_string()}')
 
     ###################################################################
-    # Create the rolling 1-year financial metric columns by summing the 
-    # last 4 quarterly values. Note that in some cases, the last 4 
-    # reported values in the data might not be a 1-year period. We 
-    # perform the aggregation on those columns that are quarterly 
-    # values, as opposed to those columns that are already rolling 
-    # 1-year values. We drop the quarterly measurement columns as the  
-    # last step, since they are no longer needed.
+    # Create the rolling 1-year financial metric columns by summing the
+    # last 4 quarterly values (or taking the annual value). Note that
+    # in some cases, the last 4 reported values in the data might not
+    # be a 1-year period. We perform the aggregation on those columns
+    # that are quarterly values, as opposed to those columns that are
+    # already rolling 1-year values. The TTM values of all the columns
+    # are computed in one pass by the shared TTM kernel, and they
+    # replace the quarterly measurement columns, since those are no
+    # longer needed.
     ###################################################################
-    for colname in ['netIncome','revenue','operatingCashFlow']:
-        
-        # Rename the key metric columms to denote they are quarterly measurements.
-        out_df.rename(columns={colname:'qtr_'+colname}, inplace=True) 
-        
-        # Aggregate the values of the metrics over the last 4 quarters. 
-        temp_col = out_df.groupby(['symbol'])['qtr_'+colname].rolling(4,min_periods=4).sum()
-        out_df[colname] = temp_col.reset_index(level=0,drop=True)
-        
-        # Drop the quarterly metricl columns, since they are no longer needed.
-        out_df = out_df.drop(['qtr_'+colname], axis=1)
+    with runStage(report, 'ttm_windows') as stage:
+        ttm_cols = ['netIncome','revenue','operatingCashFlow']
+        ttm_df = addTTMColumns(out_df[['symbol']+ttm_cols].copy(), flow_cols=ttm_cols, nper=nper)
+        out_df = out_df.drop(ttm_cols, axis=1)
+        for colname in ttm_cols:
+            out_df[colname] = ttm_df[colname+'_ttm'].to_numpy()
+        stage['rows'] = len(out_df)
 
     ###################################################################
     # Create any additional columns that are needed to compute the 
     # Piotroski score. Note that to get the measurement values from  
-    # 1-year ago by lagging 4 quarters.
+    # 1-year ago by lagging 4 quarters (or 1 year for annual data).
     ###################################################################
-    out_df['grossProfitRatio_lag4'] = out_df.groupby(['symbol'])[['grossProfitRatio']].shift(4)
+    out_df['grossProfitRatio_lag4'] = out_df.groupby(['symbol'])[['grossProfitRatio']].shift(nper)
     
-    out_df['totalAssets_lag4'] = out_df.groupby(['symbol'])['totalAssets'].shift(4)
+    out_df['totalAssets_lag4'] = out_df.groupby(['symbol'])['totalAssets'].shift(nper)
     
     out_df['returnOnAssets'] = out_df['netIncome'] / ((out_df['totalAssets']+out_df['totalAssets_lag4'])/2)
-    out_df['returnOnAssets_lag4'] = out_df.groupby(['symbol'])['returnOnAssets'].shift(4)
+    out_df['returnOnAssets_lag4'] = out_df.groupby(['symbol'])['returnOnAssets'].shift(nper)
     
-    out_df['longTermDebt_lag4'] = out_df.groupby(['symbol'])['longTermDebt'].shift(4)
+    out_df['longTermDebt_lag4'] = out_df.groupby(['symbol'])['longTermDebt'].shift(nper)
     
     out_df['currentRatio'] = out_df['totalAssets'] / (out_df['totalLiabilities']-out_df['minorityInterest'])
-    out_df['currentRatio_lag4'] = out_df.groupby(['symbol'])[['currentRatio']].shift(4)
+    out_df['currentRatio_lag4'] = out_df.groupby(['symbol'])[['currentRatio']].shift(nper)
     
-    out_df['numShares_lag4'] = out_df.groupby(['symbol'])[['numShares']].shift(4)
+    out_df['numShares_lag4'] = out_df.groupby(['symbol'])[['numShares']].shift(nper)
     
     out_df['assetTurnover'] = out_df['revenue'] / ((out_df['totalAssets']+out_df['totalAssets_lag4'])/2)
-    out_df['assetTurnover_lag4'] = out_df.groupby(['symbol'])['assetTurnover'].shift(4)
+    out_df['assetTurnover_lag4'] = out_df.groupby(['symbol'])['assetTurnover'].shift(nper)
     
     out_df['quickRatio'] = out_df['cashAndCashEquivalents'] + out_df['shortTermInvestments'] + out_df['netReceivables']
     out_df['quickRatio'] = out_df['quickRatio'] / out_df['totalCurrentLiabilities']
     
     out_df['longTermDebtToTotalAssetsRatio'] = out_df['longTermDebt'] / out_df['totalAssets']
 
+    ###################################################################
+    # Calculate the bucket-snapped number of days spanned by the last 
+    # 1 and 2 years of reported periods, and the inferred reporting 
+    # cadence of each stock.
+    ###################################################################
+    with runStage(report, 'durations') as stage:
+        out_df = addReportingDurations(out_df, tol=10, nper=nper)
+        stage['rows'] = len(out_df)
+
     ###################################################################
     # Apply the min and max date thresholds, if they were specified.
     ###################################################################
@@ -191,26 +225,31 @@ def getPiotroskiABT(
     ###################################################################
     # Merge in company overview data, if it is specified.
     ###################################################################
-    curr_len = len(in_company_fp)
-    if curr_len>=9 and in_company_fp[curr_len-8:curr_len]=='.parquet':
-        in_company_df = pd.read_parquet(in_company_fp, engine='pyarrow') 
-        in_company_df = in_company_df[['symbol','sector','industry','ipo_date','isActivelyTrading']]
-        out_df = pd.merge(out_df, in_company_df, on=['symbol'], how='left')
+    with runStage(report, 'merge') as stage:
+        curr_len = len(in_company_fp)
+        if len(in_company_df)>0 or (curr_len>=9 and in_company_fp[curr_len-8:curr_len]=='.parquet'):
+            if len(in_company_df)==0:
+                in_company_df = pd.read_parquet(in_company_fp, engine='pyarrow') 
+            in_company_df = in_company_df[['symbol','sector','industry','ipo_date','isActivelyTrading']]
+            out_df = pd.merge(out_df, in_company_df, on=['symbol'], how='left')
+        stage['rows'] = len(out_df)
 
     ###################################################################
     # Compute the Piotroski scores by calling the Piotroski function.
     ###################################################################
     
     # Compute the Piotroski score for each stock.
-    out_df[['Piotroski_Score','CR1','CR2','CR3','CR4','CR5','CR6','CR7','CR8','CR9']] = out_df.apply(computePiotroskiRules, axis=1)    
+    with runStage(report, 'piotroski_apply', rows=len(out_df)):
+        out_df[['Piotroski_Score','CR1','CR2','CR3','CR4','CR5','CR6','CR7','CR8','CR9']] = out_df.apply(computePiotroskiRules, axis=1)    
 
     # Drop the lag columns, since they are not needed anymore.
     out_df = out_df.loc[:, ~out_df.columns.str.endswith('lag4')]
 
-    # Compute the mean of the last 4 Piotroski scores.
-    out_df['Piotroski_Score_1yrAvg'] = out_df.groupby(['symbol'])['Piotroski_Score'].rolling(4).mean().reset_index(level=0,drop=True)
-    out_df['Piotroski_Score_1yrMin'] = out_df.groupby(['symbol'])['Piotroski_Score'].rolling(4).min().reset_index(level=0,drop=True)
-    out_df['Piotroski_Score_1yrMax'] = out_df.groupby(['symbol'])['Piotroski_Score'].rolling(4).max().reset_index(level=0,drop=True)
+    # Compute the mean of the last 1 year of Piotroski scores.
+    with runStage(report, 'rolling_windows', rows=len(out_df)):
+        out_df['Piotroski_Score_1yrAvg'] = out_df.groupby(['symbol'])['Piotroski_Score'].rolling(nper).mean().reset_index(level=0,drop=True)
+        out_df['Piotroski_Score_1yrMin'] = out_df.groupby(['symbol'])['Piotroski_Score'].rolling(nper).min().reset_index(level=0,drop=True)
+        out_df['Piotroski_Score_1yrMax'] = out_df.groupby(['symbol'])['Piotroski_Score'].rolling(nper).max().reset_index(level=0,drop=True)
 
     ###########################################################################
     # Create a row record count (nlag) for each symbol, the max record count,
@@ -222,32 +261,70 @@ def getPiotroskiABT(
     conds = [ out_df['nlag']==out_df['max_nlag'], out_df['nlag']==0 ]
     out_df['firstLast_flag'] = np.select(conds, ['L','F'], default='I') 
 
+    ###################################################################
+    # POINT-IN-TIME: Add the availability date of each row, which is 
+    # the date its data was public (the SEC acceptance or filing date, 
+    # or the period date plus a fixed filing delay if neither exists).
+    ###################################################################
+    out_df = addAvailabilityDate(out_df, lag_days=AVAIL_LAG_DAYS[frequency])
+
     ###################################################################
     # Reorder the out_df columns.
     ###################################################################
     col_order=[]
     col_order += ['symbol','date'] 
     col_order += ['max_nlag','firstLast_flag','nlag','reverse_nlag'] 
+    col_order += ['days_0_1y','days_1_2y','report_cadence']
     col_order += ['Piotroski_Score','Piotroski_Score_1yrAvg','Piotroski_Score_1yrMin','Piotroski_Score_1yrMax']  
     col_order += ['CR1','CR2','CR3','CR4','CR5','CR6','CR7','CR8','CR9']  
     col_remain = [col for col in out_df.columns if col not in col_order]
     out_df = out_df[col_order+col_remain]       
 
+    ###################################################################
+    # If as-of dates were specified, only keep the rows that were the 
+    # latest known rows of each stock on those dates.
+    ###################################################################
+    if len(as_of)>0:
+        with runStage(report, 'as_of_snapshot') as stage:
+            out_df = getAsOfSnapshot(out_df, as_of)
+            stage['rows'] = len(out_df)
+
     ###################################################################
     # SAVE the output dataframe as a file.
     ###################################################################
     
+    # Start writing the CSV file in a background thread, if one was given, so
+    # it is written at the same time as the parquet file.
+    if isCSVName(outdsn_csv):
+        csv_write = startCSVWrite(out_df, f'{outpath}/{outdsn_csv}', cols=csv_cols)
+
     # Save as a PARQUET file, if one was given.
     curr_len = len(outdsn_parquet)
     if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
         out_parquet = f'{outpath}/{outdsn_parquet}' 
-        out_df.to_parquet(f'{out_parquet}',index=False)
+        with runStage(report, 'to_parquet', rows=len(out_df)):
+            out_df.to_parquet(f'{out_parquet}',index=False)
+    
+    # Save the restatement log as a CSV file next to the parquet file, if any
+    # restated rows were deduplicated.
+    if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet' and len(restate_df)>0:
+        restate_df.to_csv(f'{outpath}/{outdsn_parquet[0:curr_len-8]}_restatements.csv',index=False)
     
-    # Save as a CSV file, if one was given.
-    curr_len = len(outdsn_csv)
-    if curr_len>=5 and outdsn_csv[curr_len-4:curr_len]=='.csv':
-        out_csv = f'{outpath}/{outdsn_csv}' 
-        out_df.to_csv(f'{out_csv}',index=False)  
+    # Save as an ARROW IPC file, if one was given, which downstream processes
+    # can memory-map.
+    if isArrowName(outdsn_arrow):
+        with runStage(report, 'to_arrow', rows=len(out_df)):
+            writeArrow(out_df, f'{outpath}/{outdsn_arrow}')
+
+    # Wait for the CSV file, if one was given.
+    if isCSVName(outdsn_csv):
+        with runStage(report, 'to_csv', rows=len(out_df)):
+            csv_write.result()
+
+    ###################################################################
+    # Finish the run report and save it next to the output files.
+    ###################################################################
+    finishRunReport(report, rows=len(out_df), outpath=outpath, outdsn_parquet=outdsn_parquet, outdsn_csv=outdsn_csv)
 
     ###################################################################
     # RETURN the output dataframe.
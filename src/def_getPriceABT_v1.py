@@ -1,3 +1,7 @@
+# The builder decorator that stops the profiling of a failed run is applied at import time.
+from def_runReport_v1 import closeRunReports
+
+
 ############################################################################################################
 ############################################################################################################
 # FUNCTION DEFINITION: getPriceStats()
@@ -12,12 +16,18 @@
 #   - symbol_filters = input list of stocks that are used to filter in_df (optional)
 #   - in_df          = input price dataframe, where in_df takes priority over in_fp
 #   - in_fp          = input price complete filepath
+#   - in_company_df  = input company overview dataframe, which takes precedent over in_company_fp (optional)
 #   - in_company_fp  = input company overview complete filepath (optional)
 #   - min_date       = the minimum date filter to apply to price data (optional)
 #   - max_date       = the maximum date filter to apply to price data (optional)
 #   - outpath        = the folder path where all output data will be saved
 #   - outdsn_parquet = the name of output parquet file
-#   - outdsn_csv     = the name of the output csv file
+#   - outdsn_csv     = the name of the output csv file (.csv, .csv.gz or .csv.zst, see def_csvExport_v1.py)
+#   - csv_cols       = the list of columns written to the csv file (optional, defaults to all columns)
+#   - outdsn_arrow   = the name of the output Arrow IPC file (optional, .arrow or .feather, see def_arrowExport_v1.py)
+#   - in_etfinfo_df  = input ETF info dataframe, which takes precedent over in_etfinfo_fp (optional, only for ETFs)
+#   - in_etfinfo_fp  = input ETF info complete filepath (optional, only for ETFs)
+#   - profile        = the profile mode, '' (none), 'cpu', 'memory' or 'all' (optional, see def_runReport_v1.py)
 #
 # OUTPUT DATA SCHEMA
 #
@@ -28,19 +38,26 @@
 # OUTPUT FILES
 #   - outdsn_parquet (optional)
 #   - outdsn_csv (optional)
+#   - outdsn_arrow (optional)
 ############################################################################################################
 ############################################################################################################
+@closeRunReports
 def getPriceABT(
     symbol_filters = [],    
     in_df          = '',   
     in_fp          = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\PRICE\MONTHLY\monthlyPrices_av_stock.parquet',      
+    in_company_df  = '',
     in_company_fp  = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\COMPANY\companyOverviews_fmp_stock.parquet',
     min_date       = '2010-01-01',
     max_date       = '',
     outpath        = r'C:\Users\sharo\OneDrive - aiinvestor360.com\DATA\ABT\PRICE_ABT',
     outdsn_parquet = 'monthlyPriceABT_stock.parquet',
     outdsn_csv     = 'monthlyPriceABT_stock.csv',
-    in_etfinfo_fp  = ''
+    csv_cols       = [],
+    outdsn_arrow   = '',
+    in_etfinfo_df  = '',
+    in_etfinfo_fp  = '',
+    profile        = ''
 ):
     
     ###################################################################
@@ -50,18 +67,28 @@ def getPriceABT(
     import csv
     import numpy as np
     import math
-    from scipy import stats
     import datetime 
     from datetime import datetime
     from datetime import date
     from pandas.tseries.offsets import MonthEnd
     import calendar
+    from def_runReport_v1 import startRunReport, runStage, finishRunReport
+    from def_csvExport_v1 import isCSVName, startCSVWrite
+    from def_arrowExport_v1 import isArrowName, writeArrow
+
+    ###################################################################
+    # Start the run report, which records the wall time, rows, and peak
+    # memory of the builder stages.
+    ###################################################################
+    report = startRunReport('getPriceABT', profile=profile)
    
     ###################################################################
     # Load input data, if no input dataframe was specfied.
     ###################################################################
-    if len(in_df)==0:
-        in_df = pd.read_parquet(in_fp, engine='pyarrow')  
+    with runStage(report, 'load') as stage:
+        if len(in_df)==0:
+            in_df = pd.read_parquet(in_fp, engine='pyarrow')  
+        stage['rows'] = len(in_df)
     
     ###########################################################################
     # If a stock filter list was specified, filter the input dataframe.
@@ -125,153 +152,159 @@ def getPriceABT(
     # Initialize the output dataframe.
     out_df = in_df.copy()
     
-    # Merge in company overview data, if it is specified.
-    curr_len = len(in_company_fp)
-    if curr_len>=9 and in_company_fp[curr_len-8:curr_len]=='.parquet':
-        in_company_df = pd.read_parquet(in_company_fp, engine='pyarrow') 
-        keeplist = ['symbol','sector','industry','ipo_date','beta','companyName','description','isActivelyTrading']
-        in_company_df = in_company_df[keeplist]
-        out_df = pd.merge(out_df, in_company_df, on=['symbol'], how='left')
+    with runStage(report, 'merge') as stage:
+        # Merge in company overview data, if it is specified.
+        curr_len = len(in_company_fp)
+        if len(in_company_df)>0 or (curr_len>=9 and in_company_fp[curr_len-8:curr_len]=='.parquet'):
+            if len(in_company_df)==0:
+                in_company_df = pd.read_parquet(in_company_fp, engine='pyarrow') 
+            keeplist = ['symbol','sector','industry','ipo_date','beta','companyName','description','isActivelyTrading']
+            in_company_df = in_company_df[keeplist]
+            out_df = pd.merge(out_df, in_company_df, on=['symbol'], how='left')
    
-    # Merge in ETF info data, if it is specified.
-    curr_len = len(in_etfinfo_fp)
-    if curr_len>=9 and in_etfinfo_fp[curr_len-8:curr_len]=='.parquet':
-        in_etfinfo_df = pd.read_parquet(in_etfinfo_fp, engine='pyarrow') 
-        keeplist = ['symbol','assetClass','expenseRatio','holdingsCount','aum','nav','navCurrency','domicile','website']
-        in_etfinfo_df = in_etfinfo_df[keeplist]
-        out_df = pd.merge(out_df, in_etfinfo_df, on=['symbol'], how='left')    
+        # Merge in ETF info data, if it is specified.
+        curr_len = len(in_etfinfo_fp)
+        if len(in_etfinfo_df)>0 or (curr_len>=9 and in_etfinfo_fp[curr_len-8:curr_len]=='.parquet'):
+            if len(in_etfinfo_df)==0:
+                in_etfinfo_df = pd.read_parquet(in_etfinfo_fp, engine='pyarrow') 
+            keeplist = ['symbol','assetClass','expenseRatio','holdingsCount','aum','nav','navCurrency','domicile','website']
+            in_etfinfo_df = in_etfinfo_df[keeplist]
+            out_df = pd.merge(out_df, in_etfinfo_df, on=['symbol'], how='left')    
+        stage['rows'] = len(out_df)
    
-    # Create a row record count (nlag) for each symbol, the max record count,
-    # the reverese record count, and a first/last record flag.
-    out_df['nlag'] = out_df.groupby(['symbol']).cumcount()
-    out_df['max_nlag'] = out_df.groupby(['symbol'])['nlag'].transform('max')
-    out_df['reverse_nlag'] = out_df['max_nlag'] -out_df['nlag']  
-    conds = [ out_df['nlag']==out_df['max_nlag'], out_df['nlag']==0 ]
-    out_df['firstLast_flag'] = np.select(conds, ['L','F'], default='I')     
+    with runStage(report, 'rolling_windows') as stage:
+        # Create a row record count (nlag) for each symbol, the max record count,
+        # the reverese record count, and a first/last record flag.
+        out_df['nlag'] = out_df.groupby(['symbol']).cumcount()
+        out_df['max_nlag'] = out_df.groupby(['symbol'])['nlag'].transform('max')
+        out_df['reverse_nlag'] = out_df['max_nlag'] -out_df['nlag']  
+        conds = [ out_df['nlag']==out_df['max_nlag'], out_df['nlag']==0 ]
+        out_df['firstLast_flag'] = np.select(conds, ['L','F'], default='I')     
    
-    # Create the 1-month, 3-month, 6-month and 1-year lagged dates.
-    out_df['date_1m'] = out_df.groupby(['symbol'])['date'].shift(1) 
-    out_df['date_3m'] = out_df.groupby(['symbol'])['date'].shift(3)     
-    out_df['date_6m'] = out_df.groupby(['symbol'])['date'].shift(6)
-    out_df['date_8m'] = out_df.groupby(['symbol'])['date'].shift(8) 
-    out_df['date_9m'] = out_df.groupby(['symbol'])['date'].shift(9)     
-    out_df['date_12m'] = out_df.groupby(['symbol'])['date'].shift(12)
-    out_df['date_14m'] = out_df.groupby(['symbol'])['date'].shift(14)     
-    out_df['date_15m'] = out_df.groupby(['symbol'])['date'].shift(15)
+        # Create the 1-month, 3-month, 6-month and 1-year lagged dates.
+        out_df['date_1m'] = out_df.groupby(['symbol'])['date'].shift(1) 
+        out_df['date_3m'] = out_df.groupby(['symbol'])['date'].shift(3)     
+        out_df['date_6m'] = out_df.groupby(['symbol'])['date'].shift(6)
+        out_df['date_8m'] = out_df.groupby(['symbol'])['date'].shift(8) 
+        out_df['date_9m'] = out_df.groupby(['symbol'])['date'].shift(9)     
+        out_df['date_12m'] = out_df.groupby(['symbol'])['date'].shift(12)
+        out_df['date_14m'] = out_df.groupby(['symbol'])['date'].shift(14)     
+        out_df['date_15m'] = out_df.groupby(['symbol'])['date'].shift(15)
     
-    # Create the total number of dividend payouts for each window year.
-    conds = [out_df['div_amount']>0]
-    choices = [1]
-    out_df['div_payout'] = np.select( conds, choices, default=0 ) # =1 if div_amount>0 & =0 o/w
-    temp_col = out_df.groupby(['symbol'])['div_payout'].rolling(12,min_periods=1).sum()
-    out_df['divN_1y'] = temp_col.reset_index(level=0,drop=True)
-    out_df['divN_2y'] = out_df.groupby(['symbol'])['divN_1y'].shift(12)
-    out_df['divN_3y'] = out_df.groupby(['symbol'])['divN_1y'].shift(24)
-    out_df.drop( ['div_payout'] , axis=1, inplace=True, errors='ignore' )    
+        # Create the total number of dividend payouts for each window year.
+        conds = [out_df['div_amount']>0]
+        choices = [1]
+        out_df['div_payout'] = np.select( conds, choices, default=0 ) # =1 if div_amount>0 & =0 o/w
+        temp_col = out_df.groupby(['symbol'])['div_payout'].rolling(12,min_periods=1).sum()
+        out_df['divN_1y'] = temp_col.reset_index(level=0,drop=True)
+        out_df['divN_2y'] = out_df.groupby(['symbol'])['divN_1y'].shift(12)
+        out_df['divN_3y'] = out_df.groupby(['symbol'])['divN_1y'].shift(24)
+        out_df.drop( ['div_payout'] , axis=1, inplace=True, errors='ignore' )    
    
-    # Create the running total dividend amount columns. We create the 1 year sum
-    # and then it to populate all other year sums.
-    temp_col = out_df.groupby(['symbol'])['div_amount'].rolling(12,min_periods=1).sum()
-    out_df['totDiv_1y'] = temp_col.reset_index(level=0,drop=True)
-    out_df['totDiv_2y'] = out_df.groupby(['symbol'])['totDiv_1y'].shift(12)
-    out_df['totDiv_3y'] = out_df.groupby(['symbol'])['totDiv_1y'].shift(24)    
+        # Create the running total dividend amount columns. We create the 1 year sum
+        # and then it to populate all other year sums.
+        temp_col = out_df.groupby(['symbol'])['div_amount'].rolling(12,min_periods=1).sum()
+        out_df['totDiv_1y'] = temp_col.reset_index(level=0,drop=True)
+        out_df['totDiv_2y'] = out_df.groupby(['symbol'])['totDiv_1y'].shift(12)
+        out_df['totDiv_3y'] = out_df.groupby(['symbol'])['totDiv_1y'].shift(24)    
     
-    # Create the dividend yield columns.    
-    out_df['div_yield'] = out_df['div_amount']/out_df['adj_close']
-    temp_col = out_df.groupby(['symbol'])['div_yield'].rolling(12,min_periods=1).sum()
-    out_df['divYld_1y'] = temp_col.reset_index(level=0,drop=True)
-    out_df['divYld_2y'] = out_df.groupby(['symbol'])['divYld_1y'].shift(12)
-    out_df['divYld_3y'] = out_df.groupby(['symbol'])['divYld_1y'].shift(24)     
+        # Create the dividend yield columns.    
+        out_df['div_yield'] = out_df['div_amount']/out_df['adj_close']
+        temp_col = out_df.groupby(['symbol'])['div_yield'].rolling(12,min_periods=1).sum()
+        out_df['divYld_1y'] = temp_col.reset_index(level=0,drop=True)
+        out_df['divYld_2y'] = out_df.groupby(['symbol'])['divYld_1y'].shift(12)
+        out_df['divYld_3y'] = out_df.groupby(['symbol'])['divYld_1y'].shift(24)     
     
-    # Create a grouping object by symbol.
-    group = out_df.groupby(['symbol'])       
+        # Create a grouping object by symbol.
+        group = out_df.groupby(['symbol'])       
     
-    # Create the 1-month, 3-month, and 6-month returns.
-    out_df['r_1m'] = out_df.adj_close.div(group.adj_close.shift(1)) - 1    
-    out_df['r_3m'] = out_df.adj_close.div(group.adj_close.shift(3)) - 1    
-    out_df['r_6m'] = out_df.adj_close.div(group.adj_close.shift(6)) - 1    
+        # Create the 1-month, 3-month, and 6-month returns.
+        out_df['r_1m'] = out_df.adj_close.div(group.adj_close.shift(1)) - 1    
+        out_df['r_3m'] = out_df.adj_close.div(group.adj_close.shift(3)) - 1    
+        out_df['r_6m'] = out_df.adj_close.div(group.adj_close.shift(6)) - 1    
     
-    # Create the annualized returns over time periods ranging from 1 to 7 years.
-    out_df['r_1y'] = out_df.adj_close.div(group.adj_close.shift(12)) - 1
-    out_df['r_2y'] = pow( out_df.adj_close.div(group.adj_close.shift(24)), 1/2 ) - 1
-    out_df['r_3y'] = pow( out_df.adj_close.div(group.adj_close.shift(36)), 1/3 ) - 1
-    out_df['r_4y'] = pow( out_df.adj_close.div(group.adj_close.shift(48)), 1/4 ) - 1
-    out_df['r_5y'] = pow( out_df.adj_close.div(group.adj_close.shift(60)), 1/5 ) - 1
-    out_df['r_6y'] = pow( out_df.adj_close.div(group.adj_close.shift(72)), 1/6 ) - 1
-    out_df['r_7y'] = pow( out_df.adj_close.div(group.adj_close.shift(84)), 1/7 ) - 1    
+        # Create the annualized returns over time periods ranging from 1 to 7 years.
+        out_df['r_1y'] = out_df.adj_close.div(group.adj_close.shift(12)) - 1
+        out_df['r_2y'] = pow( out_df.adj_close.div(group.adj_close.shift(24)), 1/2 ) - 1
+        out_df['r_3y'] = pow( out_df.adj_close.div(group.adj_close.shift(36)), 1/3 ) - 1
+        out_df['r_4y'] = pow( out_df.adj_close.div(group.adj_close.shift(48)), 1/4 ) - 1
+        out_df['r_5y'] = pow( out_df.adj_close.div(group.adj_close.shift(60)), 1/5 ) - 1
+        out_df['r_6y'] = pow( out_df.adj_close.div(group.adj_close.shift(72)), 1/6 ) - 1
+        out_df['r_7y'] = pow( out_df.adj_close.div(group.adj_close.shift(84)), 1/7 ) - 1    
     
-    # Create the one year returns for the time windows 1-2, 2-3, 3-4, and 4-5
-    # years. 
-    out_df['r_1_2y'] = out_df.adj_close.shift(12).div(group.adj_close.shift(24)) - 1
-    out_df['r_2_3y'] = out_df.adj_close.shift(24).div(group.adj_close.shift(36)) - 1
-    out_df['r_3_4y'] = out_df.adj_close.shift(36).div(group.adj_close.shift(48)) - 1    
-    out_df['r_4_5y'] = out_df.adj_close.shift(48).div(group.adj_close.shift(60)) - 1  
+        # Create the one year returns for the time windows 1-2, 2-3, 3-4, and 4-5
+        # years. 
+        out_df['r_1_2y'] = out_df.adj_close.shift(12).div(group.adj_close.shift(24)) - 1
+        out_df['r_2_3y'] = out_df.adj_close.shift(24).div(group.adj_close.shift(36)) - 1
+        out_df['r_3_4y'] = out_df.adj_close.shift(36).div(group.adj_close.shift(48)) - 1    
+        out_df['r_4_5y'] = out_df.adj_close.shift(48).div(group.adj_close.shift(60)) - 1  
     
-    # Create the cumulative returns over time periods ranging from 1 to 7 years.
-    out_df['cr_2y'] = out_df.adj_close.div(group.adj_close.shift(24)) - 1
-    out_df['cr_3y'] = out_df.adj_close.div(group.adj_close.shift(36)) - 1
-    out_df['cr_4y'] = out_df.adj_close.div(group.adj_close.shift(48)) - 1
-    out_df['cr_5y'] = out_df.adj_close.div(group.adj_close.shift(60)) - 1
-    out_df['cr_6y'] = out_df.adj_close.div(group.adj_close.shift(72)) - 1
-    out_df['cr_7y'] = out_df.adj_close.div(group.adj_close.shift(84)) - 1    
+        # Create the cumulative returns over time periods ranging from 1 to 7 years.
+        out_df['cr_2y'] = out_df.adj_close.div(group.adj_close.shift(24)) - 1
+        out_df['cr_3y'] = out_df.adj_close.div(group.adj_close.shift(36)) - 1
+        out_df['cr_4y'] = out_df.adj_close.div(group.adj_close.shift(48)) - 1
+        out_df['cr_5y'] = out_df.adj_close.div(group.adj_close.shift(60)) - 1
+        out_df['cr_6y'] = out_df.adj_close.div(group.adj_close.shift(72)) - 1
+        out_df['cr_7y'] = out_df.adj_close.div(group.adj_close.shift(84)) - 1    
     
-    # Create the monthly return volatilities for 1 through 7 year time windows.    
-    out_df['vol_1y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(12).std().reset_index(level=0,drop=True)
-    out_df['vol_2y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(24).std().reset_index(level=0,drop=True)
-    out_df['vol_3y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(36).std().reset_index(level=0,drop=True)
-    out_df['vol_4y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(48).std().reset_index(level=0,drop=True)    
-    out_df['vol_5y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(60).std().reset_index(level=0,drop=True)
-    out_df['vol_6y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(72).std().reset_index(level=0,drop=True)    
-    out_df['vol_7y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(84).std().reset_index(level=0,drop=True)     
+        # Create the monthly return volatilities for 1 through 7 year time windows.    
+        out_df['vol_1y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(12).std().reset_index(level=0,drop=True)
+        out_df['vol_2y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(24).std().reset_index(level=0,drop=True)
+        out_df['vol_3y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(36).std().reset_index(level=0,drop=True)
+        out_df['vol_4y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(48).std().reset_index(level=0,drop=True)    
+        out_df['vol_5y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(60).std().reset_index(level=0,drop=True)
+        out_df['vol_6y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(72).std().reset_index(level=0,drop=True)    
+        out_df['vol_7y'] = math.sqrt(12)*out_df.groupby(['symbol'])['r_1m'].rolling(84).std().reset_index(level=0,drop=True)     
     
-    # Create the Sharpe ratios for 1 through 7 year time windows, where the 
-    # numerator uses annualized returns and the denominator uses the standard
-    # deviations for the monthly returns.
-    out_df['shp_1y'] = out_df['r_1y']/(out_df.groupby(['symbol'])['r_1m'].rolling(12).std().reset_index(level=0,drop=True))
-    out_df['shp_2y'] = out_df['r_2y']/(out_df.groupby(['symbol'])['r_1m'].rolling(24).std().reset_index(level=0,drop=True))
-    out_df['shp_3y'] = out_df['r_3y']/(out_df.groupby(['symbol'])['r_1m'].rolling(36).std().reset_index(level=0,drop=True))
-    out_df['shp_4y'] = out_df['r_4y']/(out_df.groupby(['symbol'])['r_1m'].rolling(48).std().reset_index(level=0,drop=True))    
-    out_df['shp_5y'] = out_df['r_5y']/(out_df.groupby(['symbol'])['r_1m'].rolling(60).std().reset_index(level=0,drop=True))
-    out_df['shp_6y'] = out_df['r_6y']/(out_df.groupby(['symbol'])['r_1m'].rolling(72).std().reset_index(level=0,drop=True))    
-    out_df['shp_7y'] = out_df['r_7y']/(out_df.groupby(['symbol'])['r_1m'].rolling(84).std().reset_index(level=0,drop=True))      
+        # Create the Sharpe ratios for 1 through 7 year time windows, where the 
+        # numerator uses annualized returns and the denominator uses the standard
+        # deviations for the monthly returns.
+        out_df['shp_1y'] = out_df['r_1y']/(out_df.groupby(['symbol'])['r_1m'].rolling(12).std().reset_index(level=0,drop=True))
+        out_df['shp_2y'] = out_df['r_2y']/(out_df.groupby(['symbol'])['r_1m'].rolling(24).std().reset_index(level=0,drop=True))
+        out_df['shp_3y'] = out_df['r_3y']/(out_df.groupby(['symbol'])['r_1m'].rolling(36).std().reset_index(level=0,drop=True))
+        out_df['shp_4y'] = out_df['r_4y']/(out_df.groupby(['symbol'])['r_1m'].rolling(48).std().reset_index(level=0,drop=True))    
+        out_df['shp_5y'] = out_df['r_5y']/(out_df.groupby(['symbol'])['r_1m'].rolling(60).std().reset_index(level=0,drop=True))
+        out_df['shp_6y'] = out_df['r_6y']/(out_df.groupby(['symbol'])['r_1m'].rolling(72).std().reset_index(level=0,drop=True))    
+        out_df['shp_7y'] = out_df['r_7y']/(out_df.groupby(['symbol'])['r_1m'].rolling(84).std().reset_index(level=0,drop=True))      
     
-    # Create the rolling one-year volatilties.
-    out_df['vol_1_2y'] = out_df.groupby(['symbol'])['vol_1y'].shift(12) 
-    out_df['vol_2_3y'] = out_df.groupby(['symbol'])['vol_1y'].shift(24) 
-    out_df['vol_3_4y'] = out_df.groupby(['symbol'])['vol_1y'].shift(36) 
-    out_df['vol_4_5y'] = out_df.groupby(['symbol'])['vol_1y'].shift(48) 
+        # Create the rolling one-year volatilties.
+        out_df['vol_1_2y'] = out_df.groupby(['symbol'])['vol_1y'].shift(12) 
+        out_df['vol_2_3y'] = out_df.groupby(['symbol'])['vol_1y'].shift(24) 
+        out_df['vol_3_4y'] = out_df.groupby(['symbol'])['vol_1y'].shift(36) 
+        out_df['vol_4_5y'] = out_df.groupby(['symbol'])['vol_1y'].shift(48) 
 
-    # Create the rolling one-year Sharpe ratios.
-    out_df['shp_1_2y'] = out_df['r_1_2y']/out_df['vol_1_2y']
-    out_df['shp_2_3y'] = out_df['r_2_3y']/out_df['vol_2_3y']
-    out_df['shp_3_4y'] = out_df['r_3_4y']/out_df['vol_3_4y']
-    out_df['shp_4_5y'] = out_df['r_4_5y']/out_df['vol_4_5y']
+        # Create the rolling one-year Sharpe ratios.
+        out_df['shp_1_2y'] = out_df['r_1_2y']/out_df['vol_1_2y']
+        out_df['shp_2_3y'] = out_df['r_2_3y']/out_df['vol_2_3y']
+        out_df['shp_3_4y'] = out_df['r_3_4y']/out_df['vol_3_4y']
+        out_df['shp_4_5y'] = out_df['r_4_5y']/out_df['vol_4_5y']
 
-    # Create the overall missing data columns for returns and sharpe ratios.
-    out_df['isnull_1y'] = np.where( (pd.isnull(out_df['r_1y'])==True) | (pd.isnull(out_df['shp_1y'])==True) , True, False )
-    out_df['isnull_2y'] = np.where( (pd.isnull(out_df['r_2y'])==True) | (pd.isnull(out_df['shp_2y'])==True) , True, False )
-    out_df['isnull_3y'] = np.where( (pd.isnull(out_df['r_3y'])==True) | (pd.isnull(out_df['shp_3y'])==True) , True, False )
-    out_df['isnull_4y'] = np.where( (pd.isnull(out_df['r_4y'])==True) | (pd.isnull(out_df['shp_4y'])==True) , True, False )
-    out_df['isnull_5y'] = np.where( (pd.isnull(out_df['r_5y'])==True) | (pd.isnull(out_df['shp_5y'])==True) , True, False )
-    out_df['isnull_6y'] = np.where( (pd.isnull(out_df['r_6y'])==True) | (pd.isnull(out_df['shp_6y'])==True) , True, False )
-    out_df['isnull_7y'] = np.where( (pd.isnull(out_df['r_7y'])==True) | (pd.isnull(out_df['shp_7y'])==True) , True, False )     
+        # Create the overall missing data columns for returns and sharpe ratios.
+        out_df['isnull_1y'] = np.where( (pd.isnull(out_df['r_1y'])==True) | (pd.isnull(out_df['shp_1y'])==True) , True, False )
+        out_df['isnull_2y'] = np.where( (pd.isnull(out_df['r_2y'])==True) | (pd.isnull(out_df['shp_2y'])==True) , True, False )
+        out_df['isnull_3y'] = np.where( (pd.isnull(out_df['r_3y'])==True) | (pd.isnull(out_df['shp_3y'])==True) , True, False )
+        out_df['isnull_4y'] = np.where( (pd.isnull(out_df['r_4y'])==True) | (pd.isnull(out_df['shp_4y'])==True) , True, False )
+        out_df['isnull_5y'] = np.where( (pd.isnull(out_df['r_5y'])==True) | (pd.isnull(out_df['shp_5y'])==True) , True, False )
+        out_df['isnull_6y'] = np.where( (pd.isnull(out_df['r_6y'])==True) | (pd.isnull(out_df['shp_6y'])==True) , True, False )
+        out_df['isnull_7y'] = np.where( (pd.isnull(out_df['r_7y'])==True) | (pd.isnull(out_df['shp_7y'])==True) , True, False )     
     
-    # Create the overall missing data column, which gives the number of
-    # complete number of years that we have non-missing data.
-    conds = [out_df['isnull_7y']==False, out_df['isnull_6y']==False, out_df['isnull_5y']==False, out_df['isnull_4y']==False,
-             out_df['isnull_3y']==False, out_df['isnull_2y']==False, out_df['isnull_1y']==False]
-    choices = [7,6,5,4,3,2,1]
-    out_df['data_years'] = np.select(conds,choices,default=0)     
+        # Create the overall missing data column, which gives the number of
+        # complete number of years that we have non-missing data.
+        conds = [out_df['isnull_7y']==False, out_df['isnull_6y']==False, out_df['isnull_5y']==False, out_df['isnull_4y']==False,
+                 out_df['isnull_3y']==False, out_df['isnull_2y']==False, out_df['isnull_1y']==False]
+        choices = [7,6,5,4,3,2,1]
+        out_df['data_years'] = np.select(conds,choices,default=0)     
     
-    # Drop columns that are not needed in the final output dataset.
-    drop_list = ['isnull_1y','isnull_2y','isnull_3y','isnull_4y','isnull_5y','isnull_6y','isnull_7y']     
-    out_df.drop(drop_list, axis=1, inplace=True, errors='ignore')    
+        # Drop columns that are not needed in the final output dataset.
+        drop_list = ['isnull_1y','isnull_2y','isnull_3y','isnull_4y','isnull_5y','isnull_6y','isnull_7y']     
+        out_df.drop(drop_list, axis=1, inplace=True, errors='ignore')    
     
-    # Create any additional columns that make general purpose data filtering easy to perform.
-    out_df['date_year'] = out_df['date'].dt.year
-    out_df['min_date'] = out_df.groupby(['symbol'])['date'].transform('min')
-    out_df['max_date'] = out_df.groupby(['symbol'])['date'].transform('max')
-    out_df['max_data_years'] = out_df.groupby(['symbol'])['data_years'].transform('max')  
+        # Create any additional columns that make general purpose data filtering easy to perform.
+        out_df['date_year'] = out_df['date'].dt.year
+        out_df['min_date'] = out_df.groupby(['symbol'])['date'].transform('min')
+        out_df['max_date'] = out_df.groupby(['symbol'])['date'].transform('max')
+        out_df['max_data_years'] = out_df.groupby(['symbol'])['data_years'].transform('max')  
+        stage['rows'] = len(out_df)
     
     ###################################################################
     # Reorder the output columns and also only keep columns specified.
@@ -289,18 +322,34 @@ def getPriceABT(
     # SAVE the output dataframe as a file.
     ###################################################################
     
+    # Start writing the CSV file in a background thread, if one was given, so
+    # it is written at the same time as the parquet file.
+    if isCSVName(outdsn_csv):
+        csv_write = startCSVWrite(out_df, f'{outpath}/{outdsn_csv}', cols=csv_cols)
+
     # Save as a PARQUET file, if one was given.
     curr_len = len(outdsn_parquet)
     if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
         out_parquet = f'{outpath}/{outdsn_parquet}' 
-        out_df.to_parquet(f'{out_parquet}',index=False)
+        with runStage(report, 'to_parquet', rows=len(out_df)):
+            out_df.to_parquet(f'{out_parquet}',index=False)
     
-    # Save as a CSV file, if one was given.
-    curr_len = len(outdsn_csv)
-    if curr_len>=5 and outdsn_csv[curr_len-4:curr_len]=='.csv':
-        out_csv = f'{outpath}/{outdsn_csv}' 
-        out_df.to_csv(f'{out_csv}',index=False)
+    # Save as an ARROW IPC file, if one was given, which downstream processes
+    # can memory-map.
+    if isArrowName(outdsn_arrow):
+        with runStage(report, 'to_arrow', rows=len(out_df)):
+            writeArrow(out_df, f'{outpath}/{outdsn_arrow}')
+
+    # Wait for the CSV file, if one was given.
+    if isCSVName(outdsn_csv):
+        with runStage(report, 'to_csv', rows=len(out_df)):
+            csv_write.result()
     
+    ###################################################################
+    # Finish the run report and save it next to the output files.
+    ###################################################################
+    finishRunReport(report, rows=len(out_df), outpath=outpath, outdsn_parquet=outdsn_parquet, outdsn_csv=outdsn_csv)
+
     ###################################################################
     # RETURN the output dataframe.
     ###################################################################
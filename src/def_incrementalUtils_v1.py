@@ -0,0 +1,223 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_incrementalUtils_v1
+#
+# DESCRIPTION: Shared utilities for the incremental (refresh only what changed) mode of the ABT builders.
+# Every ABT row only depends on the history of its own stock, so an ABT can be refreshed by recomputing
+# the stocks whose input rows changed since the previous ABT was built and splicing them into the rows of
+# the previous ABT for all the other stocks. The content hash change detection compares the input rows
+# with a per-stock hash of the input rows of the previous build, which the builder saves next to its ABT
+# (<output name>_inputHash.parquet, see getInputHashPath()).
+############################################################################################################
+############################################################################################################
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getChangedSymbols()
+#
+# DESCRIPTION: This function compares the input data of an ABT builder with the previous ABT output and
+# returns the list of stocks that need to be recomputed. A stock is always recomputed if it is not in the
+# previous ABT. Otherwise, two change detection methods are supported:
+#
+#   - 'runDate' = the stock is recomputed if its latest input admin_runDate is newer than the latest
+#                 admin_runDate stored in the previous ABT for that stock
+#   - 'hash'    = the stock is recomputed if the content hash of its input rows (all the input columns
+#                 of the builder, over every row that the ABT rows depend on, including the lag buffer)
+#                 differs from the hash of the previous build. The builder computes both hashes with
+#                 getSymbolHash(), and a stock without a previous hash is recomputed.
+#
+# FUNCTION INPUT ARGS
+#   - in_df        = the input dataframe of the builder
+#   - prev_df      = the previous ABT dataframe
+#   - method       = the change detection method, either 'runDate' or 'hash'
+#   - in_rundate   = the name of the admin_runDate column in in_df ('runDate' method)
+#   - prev_rundate = the name of the admin_runDate column in prev_df ('runDate' method)
+#   - in_hash      = the content hash series of the input, indexed by symbol ('hash' method)
+#   - prev_hash    = the content hash series of the previous build, indexed by symbol ('hash' method)
+#
+# OUTPUT
+#   - the sorted list of stock symbols that need to be recomputed
+############################################################################################################
+############################################################################################################
+def getChangedSymbols(
+    in_df,
+    prev_df,
+    method       = 'runDate',
+    in_rundate   = 'admin_runDate',
+    prev_rundate = 'admin_runDate',
+    in_hash      = None,
+    prev_hash    = None
+):
+
+    # Import packages.
+    import pandas as pd
+
+    # Stocks that are not in the previous ABT always need to be computed.
+    in_symbols = pd.unique(in_df['symbol'])
+    new_symbols = set(in_symbols) - set(pd.unique(prev_df['symbol']))
+
+    if method=='runDate':
+
+        # Compare the latest admin_runDate of each stock.
+        in_last = in_df.groupby(['symbol'])[in_rundate].max()
+        prev_last = prev_df.groupby(['symbol'])[prev_rundate].max()
+        cmp_df = pd.concat([in_last.rename('in_last'), prev_last.rename('prev_last')], axis=1, join='inner')
+        changed = set(cmp_df.index[cmp_df['in_last']>cmp_df['prev_last']])
+
+    elif method=='hash':
+
+        # Compare the content hash of each stock with its previous hash, where
+        # a stock without a previous hash counts as changed.
+        if in_hash is None or prev_hash is None:
+            raise ValueError("The 'hash' change detection method needs the in_hash and prev_hash series")
+        cmp_df = pd.concat([in_hash.rename('in_hash'), prev_hash.rename('prev_hash')], axis=1)
+        cmp_df = cmp_df.loc[cmp_df.index.isin(in_symbols)]
+        changed = set(cmp_df.index[(cmp_df['in_hash']!=cmp_df['prev_hash']) | cmp_df['prev_hash'].isna()])
+
+    else:
+        raise ValueError(f"Unknown change detection method '{method}', expected 'runDate' or 'hash'")
+
+    return sorted(changed | new_symbols)
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getSymbolHash()
+#
+# DESCRIPTION: This function computes an order independent content hash for each stock by hashing every
+# row of the given columns and summing the row hashes by symbol. Dates are hashed as whole days, numeric
+# columns as float64 and all other columns as strings, so that a parquet round trip does not change the
+# hash.
+#
+# FUNCTION INPUT ARGS
+#   - in_df = the input dataframe
+#   - cols  = the list of columns to hash, where the 'date' column and datetime columns are hashed as dates
+#
+# OUTPUT
+#   - a uint64 series of content hashes indexed by symbol
+############################################################################################################
+############################################################################################################
+def getSymbolHash(
+    in_df,
+    cols
+):
+
+    # Import packages.
+    import pandas as pd
+
+    # Build a normalized frame of the hashed columns.
+    hash_df = pd.DataFrame(index=in_df.index)
+    for i, col in enumerate(cols):
+        if col=='date' or pd.api.types.is_datetime64_any_dtype(in_df[col]):
+            hash_df[f'c{i}'] = in_df[col].to_numpy().astype('datetime64[D]').astype('int64')
+        elif pd.api.types.is_numeric_dtype(in_df[col]) or pd.api.types.is_bool_dtype(in_df[col]):
+            hash_df[f'c{i}'] = in_df[col].astype('float64')
+        else:
+            hash_df[f'c{i}'] = in_df[col].astype('string')
+
+    # Hash each row and sum the row hashes for each stock.
+    row_hash = pd.util.hash_pandas_object(hash_df, index=False)
+    return row_hash.groupby(in_df['symbol'].to_numpy()).sum()
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getChangedCompanySymbols()
+#
+# DESCRIPTION: This function compares the company overview columns that a builder merges into every row of
+# a stock with the same columns of the previous ABT, and returns the stocks whose values changed. The
+# latest previous ABT row of each stock is compared, and two missing values are equal. Stocks that are not
+# in both dataframes are left to getChangedSymbols().
+#
+# FUNCTION INPUT ARGS
+#   - in_company_df = the company overview dataframe
+#   - prev_df       = the previous ABT dataframe
+#   - cols          = the company overview columns that are merged into the ABT
+#
+# OUTPUT
+#   - the sorted list of stock symbols whose company overview columns changed
+############################################################################################################
+############################################################################################################
+def getChangedCompanySymbols(
+    in_company_df,
+    prev_df,
+    cols
+):
+
+    # Import packages.
+    import pandas as pd
+
+    # Keep one row per stock and line up the stocks of both dataframes.
+    in_last = in_company_df.drop_duplicates(subset=['symbol'], keep='last').set_index('symbol')
+    prev_last = prev_df.drop_duplicates(subset=['symbol'], keep='last').set_index('symbol')
+    symbols = in_last.index.intersection(prev_last.index)
+
+    # Compare the columns as strings, where a column that is missing from the
+    # previous ABT counts as changed.
+    changed = pd.Series(False, index=symbols)
+    for col in cols:
+        if col not in prev_last.columns:
+            return sorted(symbols)
+        in_col = in_last.loc[symbols, col].astype('string')
+        prev_col = prev_last.loc[symbols, col].astype('string')
+        changed |= (in_col!=prev_col).fillna(True) & ~(in_col.isna() & prev_col.isna())
+    return sorted(changed.index[changed])
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getInputHashPath()
+#
+# DESCRIPTION: This function returns the filepath of the input hash file that
+# is saved next to an ABT parquet file, e.g. keyMetricABT_qtr_stock.parquet
+# has the input hashes in keyMetricABT_qtr_stock_inputHash.parquet.
+###############################################################################
+###############################################################################
+def getInputHashPath(
+    parquet_fp
+):
+
+    # Replace the parquet file extension.
+    return parquet_fp[0:len(parquet_fp)-8] + '_inputHash.parquet'
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: saveInputHash()
+#
+# DESCRIPTION: This function saves the per-stock input hashes of an ABT build
+# next to the ABT parquet file (see getInputHashPath()).
+###############################################################################
+###############################################################################
+def saveInputHash(
+    in_hash,
+    parquet_fp
+):
+
+    # Save one (symbol, input_hash) row per stock.
+    hash_df = in_hash.rename('input_hash').rename_axis('symbol').reset_index()
+    hash_df.to_parquet(getInputHashPath(parquet_fp), index=False)
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: loadInputHash()
+#
+# DESCRIPTION: This function loads the per-stock input hashes that were saved
+# next to an ABT parquet file, or returns None if there are none.
+###############################################################################
+###############################################################################
+def loadInputHash(
+    parquet_fp
+):
+
+    # Import packages.
+    import os
+    import pandas as pd
+
+    # Load the input hashes as a series indexed by symbol.
+    hash_fp = getInputHashPath(parquet_fp)
+    if not os.path.isfile(hash_fp):
+        return None
+    return pd.read_parquet(hash_fp, engine='pyarrow').set_index('symbol')['input_hash']
@@ -0,0 +1,291 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_parity_v1
+#
+# DESCRIPTION: A golden-output parity harness for the ABT builders. A reference engine (e.g. the current
+# getPiotroskiABT) and a candidate engine (e.g. a vectorized or parallel rewrite) are run on the same
+# inputs, the synthetic files of def_syntheticData_v1 or a sample of stocks of the real files, and their
+# output ABTs are compared column by column. The rows are aligned on the key columns (symbol, date), the
+# float columns are compared with a relative and absolute tolerance and must have their missing values in
+# the same places, and all the other columns (integers, booleans, strings, dates) must match exactly. For
+# every column that differs, the number of differing rows, the largest absolute difference, and the first
+# differing row (its symbol and date, and both values) are reported.
+#
+# The outputs are compared as they are, so a candidate must also reproduce the quirks of the reference
+# (e.g. the _7_8q lags of the key metric ABT, which use shift(6)) until they are fixed in both.
+#
+# EXAMPLES
+#   python run/create_abt.py parity --builder piotroski --candidate def_getPiotroskiFast_v1:getPiotroskiABT
+#       --data C:/TEMP/SYNTH --min-date 2015-01-01
+#   python run/create_abt.py parity --ref-fp piotroskiABT_qtr_stock.parquet --cand-fp piotroskiABT_fast.parquet
+############################################################################################################
+############################################################################################################
+
+# The default tolerances of the float columns, where a candidate value matches the reference value if
+# |candidate - reference| <= PARITY_ATOL + PARITY_RTOL*|reference|.
+PARITY_RTOL = 1e-9
+PARITY_ATOL = 1e-12
+
+# The default key columns that align the rows of the reference and candidate ABTs.
+PARITY_KEYS = ['symbol','date']
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getEngine()
+#
+# DESCRIPTION: This function returns the function of an engine, which is given
+# as a function, a builder name of ABT_BUILDERS (e.g. 'piotroski'), or a
+# 'module:function' string (e.g. 'def_getPiotroskiABT_v1:getPiotroskiABT').
+###############################################################################
+###############################################################################
+def getEngine(
+    engine
+):
+
+    # Import packages.
+    import importlib
+    from def_abtDag_v1 import ABT_BUILDERS, getBuilder
+
+    # Resolve the engine.
+    if callable(engine):
+        return engine
+    if engine in ABT_BUILDERS:
+        return getBuilder(engine)
+    if ':' in engine:
+        module_name, func_name = engine.split(':', 1)
+        return getattr(importlib.import_module(module_name), func_name)
+    raise ValueError(f"The engine {engine} must be a function, one of {list(ABT_BUILDERS.keys())}, or 'module:function'")
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: sampleSymbols()
+#
+# DESCRIPTION: This function returns a reproducible random sample of n symbols
+# of an input parquet file, reading only its symbol column.
+###############################################################################
+###############################################################################
+def sampleSymbols(
+    in_fp,
+    n,
+    seed = 0
+):
+
+    # Import packages.
+    import numpy as np
+    import pyarrow.parquet as pq
+
+    # Draw the sample from the sorted distinct symbols.
+    symbols = np.sort(pq.read_table(in_fp, columns=['symbol']).column('symbol').unique().to_numpy(zero_copy_only=False))
+    rng = np.random.default_rng(seed)
+    return sorted(rng.choice(symbols, size=min(n, len(symbols)), replace=False).tolist())
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: compareColumn()
+#
+# DESCRIPTION: This function compares one column of the aligned reference and
+# candidate ABTs and returns the comparison kind ('tolerance' for the float
+# columns and 'exact' otherwise), the boolean mask of the differing rows, and
+# the absolute differences (None for exact comparisons).
+###############################################################################
+###############################################################################
+def compareColumn(
+    ref,
+    cand,
+    rtol,
+    atol
+):
+
+    # Import packages.
+    import numpy as np
+    import pandas as pd
+    from pandas.api.types import is_bool_dtype, is_float_dtype, is_numeric_dtype
+
+    # Compare the float columns with the tolerance, where the missing values
+    # must be in the same places.
+    ref = ref.reset_index(drop=True)
+    cand = cand.reset_index(drop=True)
+    numeric = is_numeric_dtype(ref) and is_numeric_dtype(cand) and not is_bool_dtype(ref) and not is_bool_dtype(cand)
+    if numeric and (is_float_dtype(ref) or is_float_dtype(cand)):
+        ref_values = ref.to_numpy(dtype='float64', na_value=np.nan)
+        cand_values = cand.to_numpy(dtype='float64', na_value=np.nan)
+        diff = ~np.isclose(cand_values, ref_values, rtol=rtol, atol=atol, equal_nan=True)
+        with np.errstate(invalid='ignore'):
+            abs_diff = np.abs(cand_values - ref_values)
+        return 'tolerance', diff, abs_diff
+
+    # Compare all the other columns exactly, where two missing values match.
+    if isinstance(ref.dtype, pd.CategoricalDtype) or isinstance(cand.dtype, pd.CategoricalDtype):
+        ref, cand = ref.astype(object), cand.astype(object)
+    try:
+        equal = (ref==cand).fillna(False).astype(bool)
+    except TypeError:
+        equal = ref.astype(str)==cand.astype(str)
+    diff = ~(equal | (ref.isna() & cand.isna())).to_numpy()
+    return 'exact', diff, None
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: compareABTs()
+#
+# DESCRIPTION: This function compares a candidate ABT with a reference ABT. The rows are aligned on the key
+# columns (and on their order within duplicate keys), so the row order of the outputs does not matter, and
+# the rows that only one of the ABTs has are reported separately. Every column is then compared with
+# compareColumn(), with the tolerances of col_tols for the columns listed there. A column passes if it
+# has no differing rows and, if check_dtype is True, the same dtype in both ABTs.
+#
+# FUNCTION INPUT ARGS
+#   - ref_df      = the reference ABT dataframe
+#   - cand_df     = the candidate ABT dataframe
+#   - keys        = the key columns that align the rows (optional)
+#   - rtol        = the relative tolerance of the float columns (optional)
+#   - atol        = the absolute tolerance of the float columns (optional)
+#   - col_tols    = a dictionary of (rtol, atol) tolerances by column that override rtol and atol (optional)
+#   - check_dtype = whether the columns must have the same dtype (optional)
+#   - check_order = whether the columns must be in the same order (optional)
+#
+# OUTPUT DATAFRAMES
+#   - parity_df = one row per column (column, status, compare, ref_dtype, cand_dtype, n_diff,
+#                 max_abs_diff, first_<key> for every key, ref_value, cand_value), where status is 'ok',
+#                 'diff', 'dtype', 'missing' (reference only), or 'extra' (candidate only)
+#   - row_df    = the rows that only one of the ABTs has (the key columns and side, which is 'missing' or
+#                 'extra')
+#   - passed    = True if all the columns and rows match (and the column order, if check_order is True)
+############################################################################################################
+############################################################################################################
+def compareABTs(
+    ref_df,
+    cand_df,
+    keys        = PARITY_KEYS,
+    rtol        = PARITY_RTOL,
+    atol        = PARITY_ATOL,
+    col_tols    = {},
+    check_dtype = True,
+    check_order = True
+):
+
+    # Import packages.
+    import numpy as np
+    import pandas as pd
+
+    ###################################################################
+    # Align the rows on the keys, numbering the rows of duplicate keys
+    # so they are aligned in order.
+    ###################################################################
+    missing_keys = [key for key in keys if key not in ref_df.columns or key not in cand_df.columns]
+    if len(missing_keys)>0:
+        raise ValueError(f"The key columns {missing_keys} are missing from the reference or candidate ABT")
+    key_list = []
+    for df, row_col in [[ref_df, '_ref_row'], [cand_df, '_cand_row']]:
+        key_df = df[keys].reset_index(drop=True)
+        key_df['_dup'] = key_df.groupby(keys, dropna=False).cumcount()
+        key_df[row_col] = np.arange(len(key_df))
+        key_list.append(key_df)
+    align_df = pd.merge(key_list[0], key_list[1], on=keys+['_dup'], how='outer', indicator=True, sort=False)
+    row_df = align_df.loc[align_df['_merge']!='both', keys].copy()
+    row_df['side'] = np.where(align_df.loc[align_df['_merge']!='both', '_merge']=='left_only', 'missing', 'extra')
+    both = align_df.loc[align_df['_merge']=='both'].sort_values('_ref_row')
+    ref_aligned = ref_df.iloc[both['_ref_row'].to_numpy()].reset_index(drop=True)
+    cand_aligned = cand_df.iloc[both['_cand_row'].to_numpy()].reset_index(drop=True)
+
+    ###################################################################
+    # Compare every column and record its first differing row.
+    ###################################################################
+    results = []
+    for col in list(ref_df.columns) + [col for col in cand_df.columns if col not in ref_df.columns]:
+        result = {'column':col, 'status':'ok', 'compare':'', 'ref_dtype':'', 'cand_dtype':'', 'n_diff':0, 'max_abs_diff':np.nan}
+        result.update({f'first_{key}':None for key in keys})
+        result.update(ref_value=None, cand_value=None)
+        if col not in cand_df.columns:
+            result.update(status='missing', ref_dtype=str(ref_df[col].dtype))
+        elif col not in ref_df.columns:
+            result.update(status='extra', cand_dtype=str(cand_df[col].dtype))
+        else:
+            col_rtol, col_atol = col_tols.get(col, (rtol, atol))
+            compare, diff, abs_diff = compareColumn(ref_aligned[col], cand_aligned[col], col_rtol, col_atol)
+            result.update(compare=compare, ref_dtype=str(ref_df[col].dtype), cand_dtype=str(cand_df[col].dtype), n_diff=int(diff.sum()))
+            if result['n_diff']>0:
+                first = int(np.argmax(diff))
+                result.update({f'first_{key}':ref_aligned[key].iloc[first] for key in keys})
+                result.update(status='diff', ref_value=ref_aligned[col].iloc[first], cand_value=cand_aligned[col].iloc[first])
+                finite = diff & np.isfinite(abs_diff) if abs_diff is not None else None
+                if finite is not None and finite.any():
+                    result['max_abs_diff'] = float(abs_diff[finite].max())
+            elif check_dtype and result['ref_dtype']!=result['cand_dtype']:
+                result['status'] = 'dtype'
+        results.append(result)
+    parity_df = pd.DataFrame(results)
+
+    ###################################################################
+    # Print the summary of the comparison.
+    ###################################################################
+    order_ok = [col for col in ref_df.columns if col in cand_df.columns]==[col for col in cand_df.columns if col in ref_df.columns]
+    passed = bool((parity_df['status']=='ok').all()) and len(row_df)==0 and (order_ok or not check_order)
+    print(f"Parity of the candidate ABT ({len(cand_df)} rows, {len(cand_df.columns)} columns) with the reference ABT "
+          f"({len(ref_df)} rows, {len(ref_df.columns)} columns):")
+    print(f"rows only in the reference = {int((row_df['side']=='missing').sum())}")
+    print(f"rows only in the candidate = {int((row_df['side']=='extra').sum())}")
+    print(f"column order matches       = {order_ok}")
+    fail_df = parity_df.loc[parity_df['status']!='ok']
+    if len(fail_df)>0:
+        print(f"\n{len(fail_df)} of {len(parity_df)} columns do not match:")
+        print(fail_df.drop(columns=['compare']).to_string(index=False))
+    print('\nPARITY PASSED' if passed else '\nPARITY FAILED')
+    return parity_df, row_df, passed
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: runParity()
+#
+# DESCRIPTION: This function runs the reference and candidate engines with the same arguments, without
+# saving their outputs, and compares the candidate output ABT with the reference output ABT with
+# compareABTs(). The engines must take the keyword arguments of the ABT builders and return the output ABT
+# (or a tuple that ends with it, as getPriceABT does). The wall time of both engines is printed, so the
+# speedup of the candidate can be read next to its parity.
+#
+# FUNCTION INPUT ARGS
+#   - reference    = the reference engine, see getEngine() (e.g. 'piotroski')
+#   - candidate    = the candidate engine, see getEngine()
+#   - builder_args = the keyword arguments of both engines (e.g. the input filepaths, symbol_filters and
+#                    min_date)
+#   - out_fp       = the complete filepath of a CSV file for the column comparison (optional)
+#   - **kwargs     = the options of compareABTs() (keys, rtol, atol, col_tols, check_dtype, check_order)
+#
+# OUTPUT DATAFRAMES
+#   - parity_df = the column comparison, see compareABTs()
+#   - row_df    = the rows that only one of the ABTs has, see compareABTs()
+#   - passed    = True if the candidate matches the reference
+############################################################################################################
+############################################################################################################
+def runParity(
+    reference,
+    candidate,
+    builder_args = {},
+    out_fp       = '',
+    **kwargs
+):
+
+    # Import packages.
+    import time
+
+    # Run both engines on the same arguments, without saving the outputs.
+    out_list = []
+    for label, engine in [['reference', reference], ['candidate', candidate]]:
+        args = dict(builder_args, outdsn_parquet='', outdsn_csv='')
+        start_time = time.perf_counter()
+        result = getEngine(engine)(**args)
+        wall_sec = time.perf_counter() - start_time
+        out_list.append(result[-1] if isinstance(result, tuple) else result)
+        print(f"The {label} engine {engine} ran in {wall_sec:.2f} seconds.\n")
+
+    # Compare the outputs and save the column comparison, if requested.
+    parity_df, row_df, passed = compareABTs(out_list[0], out_list[1], **kwargs)
+    if len(out_fp)>0:
+        parity_df.to_csv(out_fp, index=False)
+        print(f"Saved the parity report to {out_fp}.")
+    return parity_df, row_df, passed
@@ -0,0 +1,171 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_pointInTime_v1
+#
+# DESCRIPTION: Shared point-in-time utilities for the quarterly and annual ABT builders. A statement row is
+# keyed on its period date, but its data was not known until the statement was filed. These utilities add
+# the availability date of each row (from the SEC acceptance or filing date, with a fixed filing delay as
+# the fallback) and produce "as known on date X" snapshots of a finished ABT with a sorted index lookup,
+# so point-in-time features can be backtested without rebuilding the ABT for every date.
+############################################################################################################
+############################################################################################################
+
+# The fallback filing delay, in days after the period date, for rows without an acceptance or filing date.
+# These match the SEC 10-Q and 10-K deadlines of the smaller filers.
+AVAIL_LAG_DAYS = {'quarterly':45, 'annual':90}
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: addAvailabilityDate()
+#
+# DESCRIPTION: This function adds the availability date of each row, which is the first day on which the
+# row's statement data was public. It is taken from the first filing date column that is not missing:
+#
+#   - acceptedDate = the SEC acceptance timestamp, where filings accepted at or after 16:00 are available
+#                    on the next day
+#   - fillingDate  = the SEC filing date
+#
+# and falls back to the period date plus lag_days. The availability date is never before the period date.
+#
+# FUNCTION INPUT ARGS
+#   - out_df      = input dataframe, which is updated in place and returned
+#   - lag_days    = the fallback filing delay, in days after the period date
+#   - filing_cols = the filing date columns in order of preference (columns that do not exist are skipped)
+#   - date_col    = the name of the period date column
+#   - avail_col   = the name of the output availability date column
+#
+# OUTPUT
+#   - out_df
+############################################################################################################
+############################################################################################################
+def addAvailabilityDate(
+    out_df,
+    lag_days    = 45,
+    filing_cols = ['acceptedDate','fillingDate'],
+    date_col    = 'date',
+    avail_col   = 'date_avail'
+):
+
+    # Import packages.
+    import pandas as pd
+
+    # Start from the fallback date and fill in the filing dates, from the
+    # least to the most preferred column.
+    period_date = pd.to_datetime(out_df[date_col])
+    avail_date = period_date + pd.Timedelta(days=lag_days)
+    for col in reversed([col for col in filing_cols if col in out_df.columns]):
+        filing_date = pd.to_datetime(out_df[col], errors='coerce')
+        if col=='acceptedDate':
+            after_close = (filing_date.dt.hour>=16)
+            filing_date = filing_date.dt.normalize() + pd.to_timedelta(after_close.astype(int), unit='D')
+        avail_date = filing_date.where(filing_date.notnull(), avail_date)
+
+    # The data cannot be known before the end of its period.
+    out_df[avail_col] = avail_date.where(avail_date>=period_date, period_date).dt.normalize()
+    return out_df
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getKnownRows()
+#
+# DESCRIPTION: This function drops the rows that are never the latest known period of their stock. A row
+# is superseded if a later period of the same stock became available on or before the row itself (e.g. a
+# late amendment of an older period), so the remaining rows of each stock have increasing availability
+# dates and a backward as-of lookup on the availability date always returns the latest known period.
+#
+# FUNCTION INPUT ARGS
+#   - in_df     = input dataframe sorted by symbol and period date
+#   - avail_col = the name of the availability date column
+#   - by        = the name of the symbol column
+#
+# OUTPUT DATAFRAMES
+#   - out_df = the rows of in_df that are the latest known period of their stock on some date
+############################################################################################################
+############################################################################################################
+def getKnownRows(
+    in_df,
+    avail_col = 'date_avail',
+    by        = 'symbol'
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+    from def_asofJoin_v1 import getDays
+
+    # Convert the availability dates to days, where rows without an
+    # availability date are never available.
+    day = getDays(in_df[avail_col])
+    day = np.where(day==np.iinfo('int64').min, np.iinfo('int64').max, day)
+
+    # Compute the earliest availability date of the later periods of each
+    # stock with a reversed cumulative minimum.
+    symbol = in_df[by].to_numpy()
+    suffix_min = pd.Series(day[::-1]).groupby(symbol[::-1]).cummin().to_numpy()[::-1]
+    next_min = np.full(len(day), np.iinfo('int64').max)
+    same_symbol = (symbol[1:]==symbol[:-1])
+    next_min[:-1] = np.where(same_symbol, suffix_min[1:], np.iinfo('int64').max)
+
+    # Keep the rows that become available before any later period.
+    keep = (day<next_min) & (day<np.iinfo('int64').max)
+    return in_df.loc[keep]
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getAsOfSnapshot()
+#
+# DESCRIPTION: This function returns "as known on date X" snapshots of a finished ABT. For each as-of date
+# and stock, it returns the ABT row of the latest period that was available on that date. The superseded
+# rows are dropped once, and all (stock, as-of date) pairs are then looked up in one searchsorted pass
+# over the rows sorted by (symbol, availability date) with the as-of join of def_asofJoin_v1.
+#
+# FUNCTION INPUT ARGS
+#   - abt_df       = the ABT dataframe with an availability date column
+#   - as_of_dates  = one as-of date or a list of as-of dates (format is '2020-06-30')
+#   - avail_col    = the name of the availability date column
+#   - by           = the name of the symbol column
+#   - max_age_days = the maximum number of days between the as-of date and the availability date of the
+#                    returned row (optional, None for no limit)
+#
+# OUTPUT DATAFRAMES
+#   - out_df = the snapshot rows (as_of_date, symbol, and the ABT columns) sorted by as_of_date and symbol,
+#              where stocks without an available row on an as-of date are left out
+############################################################################################################
+############################################################################################################
+def getAsOfSnapshot(
+    abt_df,
+    as_of_dates,
+    avail_col    = 'date_avail',
+    by           = 'symbol',
+    max_age_days = None
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+    from def_asofJoin_v1 import asofJoin
+
+    # Drop the superseded rows of the ABT sorted by symbol and period date.
+    if isinstance(as_of_dates, str):
+        as_of_dates = [as_of_dates]
+    abt_df = abt_df.sort_values(by=[by,'date'], ascending=[True,True])
+    known_df = getKnownRows(abt_df, avail_col=avail_col, by=by)
+
+    # Build the (as-of date, stock) grid and look up the latest known row of
+    # every grid row at once.
+    symbols = pd.unique(known_df[by])
+    dates = pd.to_datetime(pd.Series(as_of_dates)).sort_values().to_numpy()
+    grid_df = pd.DataFrame({
+        'as_of_date':np.repeat(dates, len(symbols)),
+        by:np.tile(symbols, len(dates))
+    })
+    cols = [col for col in known_df.columns if col!=by]
+    out_df = asofJoin(grid_df, known_df, left_on='as_of_date', right_on=avail_col, by=by, cols=cols,
+                      tolerance_days=max_age_days, direction='backward')
+
+    # Leave out the grid rows without an available row.
+    out_df = out_df.loc[out_df[avail_col].notnull()].reset_index(drop=True)
+    return out_df
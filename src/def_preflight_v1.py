@@ -0,0 +1,316 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_preflight_v1
+#
+# DESCRIPTION: A preflight check of the ABT builder inputs, which fails fast when an upstream file is
+# missing a column or has a column of the wrong type, instead of failing after gigabytes of data were
+# loaded, sorted and merged. Only the parquet footers are read: the schema gives the column names and
+# types, and the file metadata gives the row count and the row group statistics of the date column, so
+# the check of all the inputs of the nightly jobs takes milliseconds. The required columns of every
+# builder input are declared as data in PREFLIGHT_SCHEMAS, as a dictionary of column name to column kind.
+#
+# COLUMN KINDS
+#   - string   = a string column (e.g. symbol)
+#   - numeric  = an integer, float or decimal column, which the builders do arithmetic on
+#   - temporal = a timestamp or date column, which the builders compare with the date filters
+#   - any      = the column only has to exist
+#
+# A column whose parquet type is null (every value is missing, e.g. in an empty file) passes every kind.
+#
+# EXAMPLES
+#   report_df, passed = runPreflight(loadJobConfig('batch/abt_jobs.json'))
+#   python run/create_abt.py preflight batch/abt_jobs.json
+#   python run/create_abt.py jobs batch/abt_jobs.json --incremental --preflight
+############################################################################################################
+############################################################################################################
+
+# The company overview columns that the statement based builders merge in.
+PREFLIGHT_COMPANY_COLS = {'symbol':'string', 'sector':'any', 'industry':'any', 'ipo_date':'any', 'isActivelyTrading':'any'}
+
+# The required columns of the key metric file.
+PREFLIGHT_KEYMETRIC_COLS = {
+    'symbol':'string', 'date':'temporal', 'date_qtr':'any', 'fiscal_year':'any', 'fiscal_qtr':'any',
+    'peRatio':'numeric', 'revenuePerShare':'numeric', 'netIncomePerShare':'numeric', 'cashPerShare':'numeric',
+    'freeCashFlowPerShare':'numeric', 'bookValuePerShare':'numeric', 'shareholdersEquityPerShare':'numeric',
+    'interestDebtPerShare':'numeric', 'earningsYield':'numeric', 'freeCashFlowYield':'numeric',
+    'debtToEquity':'numeric', 'debtToAssets':'numeric', 'admin_runDate':'temporal',
+}
+
+# The required columns of the input files of each builder, by builder and filepath argument. The statement
+# inputs always need admin_runDate, since the shared statement loader deduplicates by it. The filing date
+# columns (fillingDate, acceptedDate) are optional, so they are not listed.
+PREFLIGHT_SCHEMAS = {
+    'price': {
+        'in_fp': {
+            'symbol':'string', 'asset_type':'any', 'date':'temporal', 'open':'numeric', 'close':'numeric',
+            'adj_close':'numeric', 'volume':'numeric', 'div_amount':'numeric', 'series_type':'any',
+            'api_service':'any', 'admin_runDate':'any',
+        },
+        'in_company_fp': {
+            'symbol':'string', 'sector':'any', 'industry':'any', 'ipo_date':'any', 'beta':'numeric',
+            'companyName':'any', 'description':'any', 'isActivelyTrading':'any',
+        },
+        'in_etfinfo_fp': {
+            'symbol':'string', 'assetClass':'any', 'expenseRatio':'numeric', 'holdingsCount':'numeric',
+            'aum':'numeric', 'nav':'numeric', 'navCurrency':'any', 'domicile':'any', 'website':'any',
+        },
+    },
+    'keymetric': {
+        'in_fp':         PREFLIGHT_KEYMETRIC_COLS,
+        'in_company_fp': PREFLIGHT_COMPANY_COLS,
+    },
+    'keymetric_incremental': {
+        'in_fp':         PREFLIGHT_KEYMETRIC_COLS,
+        'in_company_fp': PREFLIGHT_COMPANY_COLS,
+    },
+    'finstatement': {
+        'is_fp': {
+            'symbol':'string', 'date':'temporal', 'fiscal_year':'any', 'fiscal_qtr':'any', 'reportedCurrency':'any',
+            'numShares':'numeric', 'revenue':'numeric', 'netIncome':'numeric', 'netIncomeRatio':'numeric',
+            'grossProfit':'numeric', 'operatingIncome':'numeric', 'ebitda':'numeric', 'eps_qtr':'numeric',
+            'epsdiluted':'numeric', 'url_SEC':'any', 'url_10K':'any', 'admin_runDate':'temporal',
+        },
+        'bs_fp': {
+            'symbol':'string', 'date':'temporal', 'totalAssets':'numeric', 'totalLiabilities':'numeric',
+            'totalDebt':'numeric', 'netDebt':'numeric', 'totalStockholdersEquity':'numeric',
+            'admin_runDate':'temporal',
+        },
+        'cf_fp': {
+            'symbol':'string', 'date':'temporal', 'inventory':'numeric', 'debtRepayment':'numeric',
+            'commonStockIssued':'numeric', 'commonStockRepurchased':'numeric', 'operatingCashFlow':'numeric',
+            'capitalExpenditure':'numeric', 'freeCashFlow':'numeric', 'admin_runDate':'temporal',
+        },
+        'in_company_fp': PREFLIGHT_COMPANY_COLS,
+        'fx_fp': {'currency':'string', 'date':'temporal', 'rate':'numeric'},
+    },
+    'piotroski': {
+        'is_fp': {
+            'symbol':'string', 'date':'temporal', 'netIncome':'numeric', 'numShares':'numeric', 'revenue':'numeric',
+            'grossProfitRatio':'numeric', 'admin_runDate':'temporal',
+        },
+        'bs_fp': {
+            'symbol':'string', 'date':'temporal', 'totalAssets':'numeric', 'longTermDebt':'numeric',
+            'totalLiabilities':'numeric', 'minorityInterest':'numeric', 'cashAndCashEquivalents':'numeric',
+            'shortTermInvestments':'numeric', 'netReceivables':'numeric', 'totalCurrentLiabilities':'numeric',
+            'admin_runDate':'temporal',
+        },
+        'cf_fp': {'symbol':'string', 'date':'temporal', 'operatingCashFlow':'numeric', 'admin_runDate':'temporal'},
+        'in_company_fp': PREFLIGHT_COMPANY_COLS,
+    },
+    'statevector_month': {
+        'in_priceabt_fp':     {'symbol':'string', 'date':'temporal'},
+        'in_keymetric_fp':    {'symbol':'string', 'date':'temporal'},
+        'in_finstatement_fp': {'symbol':'string', 'date':'temporal'},
+        'in_piotroski_fp':    {'symbol':'string', 'date':'temporal'},
+    },
+}
+
+# The builder arguments with the requested feature columns of an input, as {column argument: filepath
+# argument}. The requested columns are added to the required columns of the input with the kind 'any'.
+PREFLIGHT_FEATURE_ARGS = {
+    'price_cols':        'in_priceabt_fp',
+    'keymetric_cols':    'in_keymetric_fp',
+    'finstatement_cols': 'in_finstatement_fp',
+    'piotroski_cols':    'in_piotroski_fp',
+}
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getColumnKind()
+#
+# DESCRIPTION: This function returns the column kind of a pyarrow type, which
+# is 'string', 'numeric', 'temporal', 'null', or 'other'.
+###############################################################################
+###############################################################################
+def getColumnKind(
+    pa_type
+):
+
+    # Import packages.
+    import pyarrow as pa
+
+    # Classify the type, using the value type of dictionary encoded columns.
+    if pa.types.is_dictionary(pa_type):
+        pa_type = pa_type.value_type
+    if pa.types.is_null(pa_type):
+        return 'null'
+    if pa.types.is_string(pa_type) or pa.types.is_large_string(pa_type):
+        return 'string'
+    if pa.types.is_integer(pa_type) or pa.types.is_floating(pa_type) or pa.types.is_decimal(pa_type):
+        return 'numeric'
+    if pa.types.is_timestamp(pa_type) or pa.types.is_date(pa_type):
+        return 'temporal'
+    return 'other'
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: readParquetFooter()
+#
+# DESCRIPTION: This function reads only the footer of a parquet file and returns its column kinds, row
+# count and, if the file has the date column, the date range from the row group statistics. The date range
+# is left empty if a row group has no statistics.
+#
+# FUNCTION INPUT ARGS
+#   - in_fp    = the complete filepath to the parquet file
+#   - date_col = the name of the date column (optional)
+#
+# OUTPUT
+#   - a dictionary with the keys columns ({column name: column kind}), rows, row_groups, min_date and
+#     max_date
+############################################################################################################
+############################################################################################################
+def readParquetFooter(
+    in_fp,
+    date_col = 'date'
+):
+
+    # Import packages.
+    import pyarrow.parquet as pq
+
+    # Read the footer.
+    pq_file = pq.ParquetFile(in_fp)
+    schema = pq_file.schema_arrow
+    metadata = pq_file.metadata
+    footer = {
+        'columns':    {field.name:getColumnKind(field.type) for field in schema},
+        'rows':       metadata.num_rows,
+        'row_groups': metadata.num_row_groups,
+        'min_date':   None,
+        'max_date':   None
+    }
+
+    # Get the date range from the row group statistics of the date column.
+    if date_col in schema.names and metadata.num_rows>0:
+        col_index = pq_file.schema.names.index(date_col)
+        mins, maxs = [], []
+        for i in range(metadata.num_row_groups):
+            stats = metadata.row_group(i).column(col_index).statistics
+            if metadata.row_group(i).num_rows==0:
+                continue
+            if stats is None or not stats.has_min_max:
+                mins, maxs = [], []
+                break
+            mins.append(stats.min)
+            maxs.append(stats.max)
+        if len(mins)>0:
+            footer['min_date'] = min(mins)
+            footer['max_date'] = max(maxs)
+    return footer
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getInputSchemas()
+#
+# DESCRIPTION: This function returns the required columns of the parquet inputs of a builder run, which are
+# the columns of PREFLIGHT_SCHEMAS plus the requested feature columns of PREFLIGHT_FEATURE_ARGS. Inputs
+# that are not parquet filepaths (e.g. not specified, or passed as dataframes) are left out.
+#
+# FUNCTION INPUT ARGS
+#   - builder = the builder name, see ABT_BUILDERS in def_abtDag_v1.py
+#   - args    = the keyword arguments of the builder
+#
+# OUTPUT
+#   - the dictionary {filepath argument: (filepath, {column name: column kind})}
+############################################################################################################
+############################################################################################################
+def getInputSchemas(
+    builder,
+    args
+):
+
+    # Collect the parquet inputs that have a schema.
+    schemas = {}
+    for arg, cols in PREFLIGHT_SCHEMAS.get(builder, {}).items():
+        in_fp = args.get(arg, '')
+        if isinstance(in_fp, str) and in_fp.endswith('.parquet'):
+            schemas[arg] = (in_fp, dict(cols))
+
+    # Add the requested feature columns.
+    for cols_arg, arg in PREFLIGHT_FEATURE_ARGS.items():
+        if arg in schemas:
+            for col in args.get(cols_arg, []):
+                schemas[arg][1].setdefault(col, 'any')
+    return schemas
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: runPreflight()
+#
+# DESCRIPTION: This function checks the parquet inputs of a list of ABT jobs by reading only their footers,
+# and prints and returns a report with one row per job input. An input fails if its file does not exist,
+# if it is missing required columns, or if a required column has the wrong kind. The inputs that are the
+# output of another job get the status 'pending', since they do not exist yet or will be rebuilt.
+#
+# FUNCTION INPUT ARGS
+#   - jobs       = the list of job dictionaries (name, builder, args), see loadJobConfig() in
+#                  def_abtDag_v1.py
+#   - output_fps = the list of the output filepaths of the jobs that run before the checked jobs
+#                  (optional, defaults to the outputs of the jobs)
+#
+# OUTPUT DATAFRAMES
+#   - report_df = one row per job input (job, builder, arg, fp, status, rows, row_groups, min_date,
+#                 max_date, missing_cols, bad_cols, read_ms)
+#   - passed    = True if no input failed
+############################################################################################################
+############################################################################################################
+def runPreflight(
+    jobs,
+    output_fps = None
+):
+
+    # Import packages.
+    import os
+    import time
+    import pandas as pd
+    from def_abtDag_v1 import getJobOutput
+
+    # Get the outputs of the jobs, which are not checked.
+    if output_fps is None:
+        output_fps = [getJobOutput(job) for job in jobs]
+    output_fps = set(fp for fp in output_fps if len(fp)>0)
+
+    # Check the inputs of every job, reading each footer only once.
+    footers = {}
+    rows = []
+    for job in jobs:
+        for arg, (in_fp, cols) in getInputSchemas(job['builder'], job['args']).items():
+            start = time.perf_counter()
+            row = {'job':job.get('name', job['builder']), 'builder':job['builder'], 'arg':arg, 'fp':in_fp,
+                   'status':'ok', 'rows':None, 'row_groups':None, 'min_date':None, 'max_date':None,
+                   'missing_cols':'', 'bad_cols':''}
+            if in_fp in output_fps:
+                row['status'] = 'pending'
+            elif not os.path.exists(in_fp):
+                row['status'] = 'failed'
+                row['missing_cols'] = 'missing file'
+            else:
+                try:
+                    if in_fp not in footers:
+                        footers[in_fp] = readParquetFooter(in_fp)
+                    footer = footers[in_fp]
+                    missing = [col for col in cols if col not in footer['columns']]
+                    bad = [f"{col} ({footer['columns'][col]}, expected {kind})" for col, kind in cols.items()
+                           if col in footer['columns'] and kind!='any' and footer['columns'][col] not in [kind, 'null']]
+                    row.update(rows=footer['rows'], row_groups=footer['row_groups'], min_date=footer['min_date'],
+                               max_date=footer['max_date'], missing_cols=', '.join(missing), bad_cols=', '.join(bad))
+                    if len(missing)>0 or len(bad)>0:
+                        row['status'] = 'failed'
+                except Exception as e:
+                    row['status'] = 'failed'
+                    row['missing_cols'] = f'unreadable footer: {type(e).__name__}: {e}'
+            row['read_ms'] = 1000*(time.perf_counter()-start)
+            rows.append(row)
+    report_df = pd.DataFrame(rows, columns=['job','builder','arg','fp','status','rows','row_groups','min_date',
+                                            'max_date','missing_cols','bad_cols','read_ms'])
+
+    # Print the report.
+    passed = not (report_df['status']=='failed').any()
+    if len(report_df)>0:
+        print_df = report_df.assign(fp=report_df['fp'].map(os.path.basename), read_ms=report_df['read_ms'].round(1))
+        print(print_df.drop(columns=['builder','row_groups']).to_string(index=False))
+    print(f"PREFLIGHT {'PASSED' if passed else 'FAILED'}: checked {len(report_df)} inputs in {report_df['read_ms'].sum():.0f} ms.\n")
+    return report_df, passed
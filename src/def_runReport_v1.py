@@ -0,0 +1,506 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_runReport_v1
+#
+# DESCRIPTION: Lightweight per-stage instrumentation for the ABT builders. A builder starts a run report,
+# wraps its expensive steps (reading the inputs, the merges, the rolling windows, the row-wise applies, and
+# writing the outputs) in runStage() context managers, and finishes the report, which prints a stage
+# summary and saves it as a JSON file next to the output files. Each stage records its wall time, the rows
+# it processed, the rows per second, and its memory. The time spent outside of the stages is reported as
+# the 'unstaged' stage, so the stage wall times always add up to the total wall time.
+#
+# STAGE MEMORY: Every stage records the resident memory of the process (RSS, or the working set on Windows)
+# when it ends (rss_mb) and its change during the stage (rss_delta_mb), which is cheap and works in every
+# run, so the run report shows which stage grows the memory. The RSS includes the memory that pandas,
+# numpy and pyarrow allocate outside of Python, but it is process-wide, so the stages of concurrent runs
+# in the same process see each other's memory. It is read with psutil, if it is installed, or else from
+# /proc/self/statm on Linux, and is None if neither is available.
+#
+# PEAK MEMORY: If tracemalloc is tracing (e.g. when profiling memory), the peak memory of each stage is the
+# peak traced memory during the stage, which is the precise peak of the Python allocations. Otherwise, the
+# stages have no peak memory, and only the run records the peak resident memory of the process
+# (process_peak_mem_mb) when it finishes. That is a process-wide high-water mark: it never decreases, and
+# it is shared by all the builders that run in the same process, so it is only the peak of the run itself
+# if the run is the only one in its process (e.g. a benchmark case). The peak_mem_mb of the run is the largest stage peak, or else the process peak, and mem_source
+# says which one it is ('tracemalloc', 'process' or 'unavailable').
+#
+# TRACING: tracemalloc traces the whole process, so the builder runs that profile memory share one tracing
+# session: it is started by the first traced run and only stopped when the last traced run is finished (see
+# TRACE_STATE). The traced peak is also process-wide, so it is only reset at the start of a stage when a
+# single run is traced, and the memory profile of concurrent runs is only meaningful with one job at a
+# time (runABTJobs() runs the jobs one at a time when profiling memory).
+#
+# PROFILING: With the profile option of a builder, the run is also profiled from startRunReport() to
+# finishRunReport(). 'cpu' profiles the run with cProfile and saves a <output name>_profile.prof file
+# (open it with pstats or snakeviz), 'memory' traces the allocations with tracemalloc, takes a snapshot at
+# every stage boundary and saves the top allocations of the run and of each stage in a
+# <output name>_allocations.txt file, and 'all' does both.
+#
+# FAILED RUNS: The builders are decorated with closeRunReports(), so if a builder raises an exception between
+# startRunReport() and finishRunReport(), its profiler is still stopped and it still leaves the shared
+# tracing session (see stopProfiling()). Otherwise, every later run of the process (e.g. in the DAG or the
+# resident ABT worker) would run under the stale profiler and tracing.
+############################################################################################################
+############################################################################################################
+
+# The stage context manager and the builder decorator need their decorators at
+# import time, and the tracing state needs its lock.
+import threading
+import functools
+from contextlib import contextmanager
+
+# The valid values of the builder profile option.
+PROFILE_MODES = ['','cpu','memory','all']
+
+# The number of functions and allocation sites listed in the profile summaries.
+PROFILE_TOP_N = 25
+
+# The shared tracemalloc state of the traced builder runs of the process: the
+# number of runs that are tracing, and whether a run started the tracing (and
+# the last run has to stop it). It is only changed while holding TRACE_LOCK.
+TRACE_LOCK = threading.Lock()
+TRACE_STATE = {'runs':0, 'started':False}
+
+# The run reports of each thread that were started and not finished yet, so the
+# profiling of a failed builder run can be stopped (see closeRunReports()).
+OPEN_REPORTS = threading.local()
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: startRunReport()
+#
+# DESCRIPTION: This function starts the run report of a builder run and, if a profile mode was given, starts
+# the cProfile profiler and/or the tracemalloc tracing of the run.
+#
+# FUNCTION INPUT ARGS
+#   - builder = the name of the builder function
+#   - profile = the profile mode, which is '' (no profiling), 'cpu', 'memory', or 'all' (optional)
+#
+# OUTPUT
+#   - the run report dictionary, which is passed to runStage() and finishRunReport()
+############################################################################################################
+############################################################################################################
+def startRunReport(
+    builder,
+    profile = ''
+):
+
+    # Import packages.
+    import time
+    import cProfile
+    import tracemalloc
+    from datetime import datetime
+
+    # Start the allocation tracing, if requested, or join the tracing of the
+    # other traced runs. The snapshots of the stage boundaries are kept in the
+    # report until the report is finished.
+    if profile not in PROFILE_MODES:
+        raise ValueError(f"The profile mode must be one of {PROFILE_MODES}, not {profile}")
+    report = {'builder':builder, 'start_time':datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'profile':profile}
+    if profile in ['memory','all']:
+        with TRACE_LOCK:
+            if TRACE_STATE['runs']==0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                TRACE_STATE['started'] = True
+            TRACE_STATE['runs'] += 1
+            report['snapshots'] = [('start', tracemalloc.take_snapshot())]
+
+    # Start the profiler, if requested. Only one profiler can be active in a
+    # thread, so the run is not profiled if another profiler is active.
+    if profile in ['cpu','all']:
+        report['profiler'] = cProfile.Profile()
+        try:
+            report['profiler'].enable()
+        except ValueError:
+            print(f'Another profiler is already active, so {builder} is not profiled with cProfile.')
+            report['profiler'] = None
+
+    # Initialize the run report and register it as open in this thread.
+    report.update({
+        'stages':[],
+        'perf_start':time.perf_counter()
+    })
+    getOpenReports().append(report)
+    return report
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: runStage()
+#
+# DESCRIPTION: This function is a context manager that times one stage of a builder run, records its
+# memory (see STAGE MEMORY and PEAK MEMORY above), and appends the stage to the run report. The stage
+# dictionary is yielded, so the number of rows processed can be set in the 'rows' key inside the with
+# block, e.g.
+#
+#   with runStage(report, 'read_parquet') as stage:
+#       in_df = pd.read_parquet(in_fp, engine='pyarrow')
+#       stage['rows'] = len(in_df)
+#
+# FUNCTION INPUT ARGS
+#   - report = the run report dictionary from startRunReport()
+#   - name   = the name of the stage
+#   - rows   = the number of rows processed by the stage (optional, can also be set inside the with block)
+############################################################################################################
+############################################################################################################
+@contextmanager
+def runStage(
+    report,
+    name,
+    rows = None
+):
+
+    # Import packages.
+    import time
+    import tracemalloc
+
+    # Reset the traced peak memory, unless another run is traced at the same
+    # time, and start the timer. The stage only has a peak memory if the
+    # traced peak is its own.
+    stage = {'stage':name, 'rows':rows}
+    rss_start = getProcessRSSMB()
+    with TRACE_LOCK:
+        other_runs = TRACE_STATE['runs'] - (1 if 'snapshots' in report else 0)
+        traced = tracemalloc.is_tracing() and other_runs==0
+        if traced:
+            tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield stage
+    finally:
+
+        # Record the wall time, throughput, and peak memory of the stage.
+        stage['wall_sec'] = round(time.perf_counter() - start, 6)
+        if stage['rows'] is not None:
+            stage['rows'] = int(stage['rows'])
+            stage['rows_per_sec'] = round(stage['rows']/stage['wall_sec'], 1) if stage['wall_sec']>0 else None
+        else:
+            stage['rows_per_sec'] = None
+        stage['peak_mem_mb'] = getTracedPeakMB() if traced else None
+        stage['rss_mb'] = getProcessRSSMB()
+        stage['rss_delta_mb'] = round(stage['rss_mb'] - rss_start, 1) if rss_start is not None else None
+        report['stages'].append(stage)
+        if 'snapshots' in report:
+            with TRACE_LOCK:
+                report['snapshots'].append((name, tracemalloc.take_snapshot()))
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: finishRunReport()
+#
+# DESCRIPTION: This function finishes the run report of a builder run. It adds the total wall time and the
+# 'unstaged' stage, prints the stage summary, and saves the report as a JSON file named after the output
+# files (e.g. keyMetricABT_qtr_stock_runReport.json) in the output folder, if an output file was given.
+# If the run was profiled, the profiler is stopped and the profile files are saved in the same way, see
+# saveProfile().
+#
+# FUNCTION INPUT ARGS
+#   - report         = the run report dictionary from startRunReport()
+#   - rows           = the number of output rows
+#   - outpath        = the folder path where all output data will be saved
+#   - outdsn_parquet = the name of output parquet file
+#   - outdsn_csv     = the name of the output csv file
+#
+# OUTPUT
+#   - the finished run report dictionary
+############################################################################################################
+############################################################################################################
+def finishRunReport(
+    report,
+    rows           = None,
+    outpath        = '',
+    outdsn_parquet = '',
+    outdsn_csv     = ''
+):
+
+    # Import packages.
+    import time
+    import json
+    import pandas as pd
+    from def_csvExport_v1 import getCSVExtension
+
+    # Get the name of the output files, if an output file was given.
+    curr_len = len(outdsn_parquet)
+    if curr_len>=9 and outdsn_parquet[curr_len-8:curr_len]=='.parquet':
+        out_name = outdsn_parquet[0:curr_len-8]
+    elif len(getCSVExtension(outdsn_csv))>0:
+        out_name = outdsn_csv[0:len(outdsn_csv)-len(getCSVExtension(outdsn_csv))]
+    else:
+        out_name = ''
+
+    # Add the total wall time and the time spent outside of the stages.
+    wall_sec = time.perf_counter() - report.pop('perf_start')
+    staged_sec = sum([stage['wall_sec'] for stage in report['stages']])
+    report['stages'].append({'stage':'unstaged', 'rows':None, 'wall_sec':round(max(wall_sec-staged_sec, 0.0), 6),
+                             'rows_per_sec':None, 'peak_mem_mb':None, 'rss_mb':None, 'rss_delta_mb':None})
+    report['wall_sec'] = round(wall_sec, 6)
+    report['rows'] = None if rows is None else int(rows)
+    report['rows_per_sec'] = round(report['rows']/wall_sec, 1) if rows is not None and wall_sec>0 else None
+
+    # Add the peak memory of the run: the largest traced stage peak, or else
+    # the process-wide peak resident memory.
+    report['process_peak_mem_mb'] = getProcessPeakMB()
+    stage_peak = max([stage['peak_mem_mb'] for stage in report['stages'] if stage['peak_mem_mb'] is not None], default=None)
+    if stage_peak is not None:
+        report['peak_mem_mb'], report['mem_source'] = stage_peak, 'tracemalloc'
+    elif report['process_peak_mem_mb'] is not None:
+        report['peak_mem_mb'], report['mem_source'] = report['process_peak_mem_mb'], 'process'
+    else:
+        report['peak_mem_mb'], report['mem_source'] = None, 'unavailable'
+
+    # Stop the profiling and save the profile files.
+    open_reports = getOpenReports()
+    if any(open_report is report for open_report in open_reports):
+        open_reports.remove(report)
+    if len(report['profile'])>0:
+        report.update(saveProfile(report, outpath=outpath, out_name=out_name))
+
+    # Print the stage summary.
+    stage_df = pd.DataFrame(report['stages'], columns=['stage','rows','wall_sec','rows_per_sec','peak_mem_mb','rss_mb','rss_delta_mb'])
+    stage_df['rows'] = stage_df['rows'].astype('Int64')
+    print(f"Run report of {report['builder']} ({report['wall_sec']:.2f} seconds, process peak memory {report['process_peak_mem_mb']} MB):\n{stage_df.to_string(index=False)}")
+
+    # Save the report next to the output files, if an output file was given.
+    if len(out_name)>0:
+        report['report_fp'] = f'{outpath}/{out_name}_runReport.json'
+        with open(report['report_fp'], 'w') as f:
+            json.dump(report, f, indent=4)
+    return report
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: saveProfile()
+#
+# DESCRIPTION: This function stops the profiling of a builder run that was started by startRunReport() and
+# summarizes it. The top functions by cumulative time are printed and, if an output name was given, the
+# cProfile stats are saved as <out_name>_profile.prof. The top allocation sites by size at the end of the
+# run, and the top allocation changes of each stage (between the snapshots at its boundaries), are printed
+# and saved as <out_name>_allocations.txt. The profiler and the snapshots are removed from the report.
+#
+# FUNCTION INPUT ARGS
+#   - report   = the run report dictionary from startRunReport()
+#   - outpath  = the folder path where all output data will be saved
+#   - out_name = the name of the output files without the file extension ('' to only print the summaries)
+#   - top_n    = the number of functions and allocation sites listed in the summaries
+#
+# OUTPUT
+#   - a dictionary with the saved profile filepaths (profile_fp, allocations_fp)
+############################################################################################################
+############################################################################################################
+def saveProfile(
+    report,
+    outpath  = '',
+    out_name = '',
+    top_n    = PROFILE_TOP_N
+):
+
+    # Import packages.
+    import io
+    import pstats
+    import cProfile
+    import tracemalloc
+
+    # Stop the profiling, before the summaries allocate any memory.
+    out_fps = {}
+    profiler, snapshots = stopProfiling(report)
+
+    # Summarize the top functions by cumulative time.
+    if profiler is not None:
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top_n)
+        print(f"Top {top_n} functions of {report['builder']} by cumulative time:\n{stream.getvalue()}")
+        if len(out_name)>0:
+            out_fps['profile_fp'] = f'{outpath}/{out_name}_profile.prof'
+            profiler.dump_stats(out_fps['profile_fp'])
+
+    # Summarize the allocations of the run and the stages, leaving out the
+    # allocations of the profilers and the module imports.
+    if snapshots is not None:
+        filters = [tracemalloc.Filter(False, fp) for fp in [tracemalloc.__file__, cProfile.__file__, pstats.__file__]]
+        filters += [tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')]
+        snapshots = [(name, snapshot.filter_traces(filters)) for name, snapshot in snapshots]
+        lines = [f"Top {top_n} allocation sites of {report['builder']} at the end of the run:"]
+        lines += [str(stat) for stat in snapshots[-1][1].statistics('lineno')[:top_n]]
+        for i in range(1, len(snapshots)-1):
+            lines += ['', f"Top {top_n} allocation changes of the stage {snapshots[i][0]}:"]
+            lines += [str(stat) for stat in snapshots[i][1].compare_to(snapshots[i-1][1], 'lineno')[:top_n]]
+        print('\n'.join(lines[0:top_n+1]))
+        if len(out_name)>0:
+            out_fps['allocations_fp'] = f'{outpath}/{out_name}_allocations.txt'
+            with open(out_fps['allocations_fp'], 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+    return out_fps
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: stopProfiling()
+#
+# DESCRIPTION: This function stops the profiling of a builder run that was started by startRunReport(). The
+# cProfile profiler is disabled and, if the run traced its allocations, the last snapshot is taken and the
+# run leaves the shared tracing session. The tracing is only stopped by the last traced run, and only if a
+# traced run started it. The profiler and the snapshots are removed from the report, so calling the function
+# again does nothing.
+#
+# FUNCTION INPUT ARGS
+#   - report = the run report dictionary from startRunReport()
+#
+# OUTPUT
+#   - profiler  = the disabled cProfile profiler, or None if the run was not profiled with cProfile
+#   - snapshots = the list of (stage name, snapshot) of the run, or None if the run was not traced
+############################################################################################################
+############################################################################################################
+def stopProfiling(
+    report
+):
+
+    # Import packages.
+    import tracemalloc
+
+    # Stop the profiler.
+    profiler = report.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+    # Take the last snapshot and leave the tracing session.
+    snapshots = report.pop('snapshots', None)
+    if snapshots is not None:
+        with TRACE_LOCK:
+            snapshots.append(('end', tracemalloc.take_snapshot()))
+            TRACE_STATE['runs'] -= 1
+            if TRACE_STATE['runs']==0 and TRACE_STATE['started']:
+                tracemalloc.stop()
+                TRACE_STATE['started'] = False
+    return profiler, snapshots
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: closeRunReports()
+#
+# DESCRIPTION: This function is the decorator of the builder functions. If the builder raises an exception,
+# the run reports that the builder started in this thread and did not finish are closed, i.e. their
+# profiling is stopped with stopProfiling(), before the exception is passed on. The run reports of the
+# builder runs that were already open when the builder was called (e.g. of an outer builder that calls it)
+# are left alone.
+#
+# FUNCTION INPUT ARGS
+#   - builder_func = the builder function
+#
+# OUTPUT
+#   - the decorated builder function
+############################################################################################################
+############################################################################################################
+def closeRunReports(
+    builder_func
+):
+
+    # Close the run reports that are still open when the builder is done.
+    @functools.wraps(builder_func)
+    def wrapper(*args, **kwargs):
+        open_reports = getOpenReports()
+        n_open = len(open_reports)
+        try:
+            return builder_func(*args, **kwargs)
+        finally:
+            while len(open_reports)>n_open:
+                report = open_reports.pop()
+                stopProfiling(report)
+                if len(report['profile'])>0:
+                    print(f"The run of {report['builder']} did not finish, so its profiling was stopped.")
+    return wrapper
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getOpenReports()
+#
+# DESCRIPTION: This function returns the list of the run reports of the
+# current thread that were started and not finished yet.
+###############################################################################
+###############################################################################
+def getOpenReports():
+
+    # Create the list on first use in the thread.
+    if not hasattr(OPEN_REPORTS, 'reports'):
+        OPEN_REPORTS.reports = []
+    return OPEN_REPORTS.reports
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getTracedPeakMB()
+#
+# DESCRIPTION: This function returns the peak traced memory in MB since the
+# last tracemalloc.reset_peak(), or None if tracemalloc is not tracing.
+###############################################################################
+###############################################################################
+def getTracedPeakMB():
+
+    # Import packages.
+    import tracemalloc
+
+    # Use the traced peak memory, if tracemalloc is tracing.
+    if not tracemalloc.is_tracing():
+        return None
+    return round(tracemalloc.get_traced_memory()[1]/2**20, 1)
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getProcessPeakMB()
+#
+# DESCRIPTION: This function returns the peak resident memory of the process
+# in MB, which is the high-water mark of the whole process since it started,
+# or None if it is not available on the platform.
+###############################################################################
+###############################################################################
+def getProcessPeakMB():
+
+    # Import packages.
+    import sys
+
+    # Use the peak resident memory of the process (in KB on Linux and in
+    # bytes on macOS), or the peak working set on Windows.
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak/2**20 if sys.platform=='darwin' else peak/2**10, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset/2**20, 1)
+    except (ImportError, AttributeError):
+        return None
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getProcessRSSMB()
+#
+# DESCRIPTION: This function returns the current resident memory of the
+# process in MB (the working set on Windows), or None if it is not available
+# on the platform.
+###############################################################################
+###############################################################################
+def getProcessRSSMB():
+
+    # Import packages.
+    import os
+
+    # Use psutil, if it is installed, or else the resident pages of the
+    # process on Linux.
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss/2**20, 1)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return round(int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')/2**20, 1)
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
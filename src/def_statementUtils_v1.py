@@ -0,0 +1,336 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_statementUtils_v1
+#
+# DESCRIPTION: Shared utilities for loading and combining the income statement, balance sheet, cashflow
+# statement and key metric data used by the quarterly ABT builders.
+############################################################################################################
+############################################################################################################
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getSymbolDateKey()
+#
+# DESCRIPTION: This function encodes the (symbol, date) pairs of several dataframes into int64 keys that
+# sort in the same order as the (symbol, date) pairs. The symbols of all the dataframes are encoded to
+# shared integer codes (in the upper 32 bits) and the dates to days (in the lower 32 bits). Rows with a
+# missing date get the key -1, which never matches a valid key.
+#
+# FUNCTION INPUT ARGS
+#   - df_list  = the list of dataframes to encode
+#   - by       = the name of the symbol column
+#   - date_col = the name of the date column
+#
+# OUTPUT
+#   - the list of int64 numpy key arrays, one per dataframe
+############################################################################################################
+############################################################################################################
+def getSymbolDateKey(
+    df_list,
+    by       = 'symbol',
+    date_col = 'date'
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+    from def_asofJoin_v1 import getDays
+
+    # Encode the symbols of all the dataframes to shared sorted codes.
+    codes, uniques = pd.factorize(pd.concat([df[by] for df in df_list], ignore_index=True), sort=True)
+    codes = codes.astype('int64')
+
+    # Combine the symbol codes and the dates into one key per row.
+    key_list = []
+    start = 0
+    for df in df_list:
+        day = getDays(df[date_col])
+        code = codes[start:start+len(df)]
+        key = np.where(day==np.iinfo('int64').min, -1, (code << 32) | (day + 2**31))
+        key_list.append(key)
+        start += len(df)
+    return key_list
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: loadStatement()
+#
+# DESCRIPTION: This function is the shared loader for the FMP statement and key metric data. It loads the
+# data (only the needed columns) if no input dataframe was specified, applies the stock filter list, and
+# deduplicates the rows by (symbol, date) with dedupStatement(), so the output is sorted by symbol and
+# date and has at most one row per (symbol, date). The optional columns (e.g. the filing date columns,
+# which older files do not have) are only loaded and kept if the parquet file or input dataframe has them.
+#
+# FUNCTION INPUT ARGS
+#   - in_df          = the input dataframe, which takes precedent over in_fp
+#   - in_fp          = the complete filepath to the input parquet file
+#   - symbol_filters = input list of stocks that are used to filter the data (optional)
+#   - cols           = the list of columns to keep (optional, defaults to all columns)
+#   - optional_cols  = the list of columns to keep if they exist (optional, only used with cols)
+#   - name           = the statement name used in the restatement log (e.g. 'is')
+#   - rundate_col    = the name of the run date column used to pick the latest row
+#
+# OUTPUT DATAFRAMES
+#   - out_df     = the deduplicated data sorted by symbol and date
+#   - restate_df = the restatement log, see dedupStatement()
+############################################################################################################
+############################################################################################################
+def loadStatement(
+    in_df          = '',
+    in_fp          = '',
+    symbol_filters = [],
+    cols           = [],
+    optional_cols  = [],
+    name           = '',
+    rundate_col    = 'admin_runDate'
+):
+
+    # Import packages.
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    # Specify the columns to load, which always include the run date column
+    # that is needed for the deduplication, and the optional columns that the
+    # input has.
+    load_cols = []
+    if len(cols)>0:
+        if len(in_df)==0:
+            in_cols = pq.read_schema(in_fp).names
+        else:
+            in_cols = list(in_df.columns)
+        cols = list(cols) + [col for col in optional_cols if col in in_cols and col not in cols]
+        load_cols = list(dict.fromkeys(cols + [rundate_col]))
+
+    # Load the data, if no input dataframe was specified.
+    if len(in_df)==0:
+        if len(load_cols)>0:
+            in_df = pd.read_parquet(in_fp, engine='pyarrow', columns=load_cols)
+        else:
+            in_df = pd.read_parquet(in_fp, engine='pyarrow')
+    elif len(load_cols)>0:
+        in_df = in_df[[col for col in load_cols if col in in_df.columns]]
+
+    # If a stock filter list was specified, filter the data.
+    if len(symbol_filters)>0:
+        symbol_filters = list(map(lambda x: x.upper(),symbol_filters))
+        in_df = in_df[in_df['symbol'].isin(symbol_filters)]
+
+    # Deduplicate by symbol and date, keeping the latest run date.
+    out_df, restate_df = dedupStatement(in_df, name=name, rundate_col=rundate_col)
+    if len(cols)>0:
+        out_df = out_df[list(cols)]
+    return out_df, restate_df
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: dedupStatement()
+#
+# DESCRIPTION: This function removes duplicate (symbol, date) rows, which the FMP files can contain after
+# restatements, with last-write-wins semantics: the row with the latest run date is kept. The rows are
+# sorted once by (symbol, date, run date) and a mask keeps the last row of each (symbol, date) key. Rows
+# without a run date are treated as the oldest. The duplicate keys are returned as a restatement log.
+#
+# FUNCTION INPUT ARGS
+#   - in_df       = the input dataframe
+#   - name        = the statement name used in the restatement log (e.g. 'is')
+#   - rundate_col = the name of the run date column used to pick the latest row (optional)
+#   - by          = the name of the symbol column
+#   - date_col    = the name of the date column
+#
+# OUTPUT DATAFRAMES
+#   - out_df     = the deduplicated data sorted by symbol and date, with a fresh index
+#   - restate_df = the restatement log with one row per duplicate key (statement, symbol, date, n_rows,
+#                  min_runDate, max_runDate)
+############################################################################################################
+############################################################################################################
+def dedupStatement(
+    in_df,
+    name        = '',
+    rundate_col = 'admin_runDate',
+    by          = 'symbol',
+    date_col    = 'date'
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+
+    # Sort the rows by (symbol, date, run date) in one pass.
+    key = getSymbolDateKey([in_df], by=by, date_col=date_col)[0]
+    if rundate_col in in_df.columns:
+        rundate_code = pd.factorize(in_df[rundate_col], sort=True)[0]
+    else:
+        rundate_code = np.zeros(len(in_df), dtype='int64')
+    order = np.lexsort((rundate_code, key))
+    key = key[order]
+
+    # Keep the last row of each (symbol, date) key. Rows without a date 
+    # (key -1) are all kept, since they cannot be duplicates of each other.
+    is_last = np.ones(len(key), dtype=bool)
+    is_last[:-1] = (key[:-1]!=key[1:])
+    is_last |= (key<0)
+    out_df = in_df.iloc[order[is_last]].reset_index(drop=True)
+
+    # Create the restatement log for the duplicate keys.
+    log_cols = ['statement', by, date_col, 'n_rows', 'min_runDate', 'max_runDate']
+    if is_last.all():
+        return out_df, pd.DataFrame(columns=log_cols)
+    dup_df = in_df.iloc[order].reset_index(drop=True)
+    dup_df = dup_df.loc[(pd.Series(key).duplicated(keep=False).to_numpy()) & (key>=0)]
+    if rundate_col not in dup_df.columns:
+        dup_df = dup_df.assign(**{rundate_col:pd.NaT})
+    restate_df = dup_df.groupby([by, date_col], sort=False).agg(
+        n_rows      = (rundate_col, 'size'),
+        min_runDate = (rundate_col, 'min'),
+        max_runDate = (rundate_col, 'max')
+    ).reset_index()
+    restate_df.insert(0, 'statement', name)
+    return out_df, restate_df[log_cols]
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: mergeStatements()
+#
+# DESCRIPTION: This function left joins one or more statement dataframes (e.g. balance sheets and
+# cashflows) onto a base statement dataframe (e.g. income statements) by symbol and date. The statements
+# are already sorted by (symbol, date), so instead of a hash merge followed by a re-sort, the keys are
+# encoded as sorted int64 values and every base row is matched with one searchsorted pass per statement.
+# The output keeps the row order of the base dataframe, so it stays sorted by symbol and date.
+#
+# Duplicate (symbol, date) keys in a joined statement are detected; the last row of each duplicate key
+# is used instead of fanning out the base rows. All the base rows without a match, joined statement rows
+# without a base row, and duplicate keys are returned as a report. The statements must not share any
+# columns other than the symbol and date columns (e.g. admin_runDate must be renamed per statement), since
+# a shared column could not be attached without overwriting another statement's values.
+#
+# FUNCTION INPUT ARGS
+#   - base_df    = the base statement dataframe, sorted by symbol and date
+#   - other_dfs  = the list of statement dataframes to join onto base_df
+#   - names      = the statement names used in the report, the base name first (e.g. ['is','bs','cf'])
+#   - by         = the name of the symbol column
+#   - date_col   = the name of the date column
+#
+# OUTPUT DATAFRAMES
+#   - out_df    = the merged dataframe
+#   - report_df = the rows that failed to match (statement, symbol, date, issue), where issue is one of
+#                 'missing' (base row without a statement row), 'unmatched' (statement row without a
+#                 base row) or 'duplicate' (repeated statement key)
+############################################################################################################
+############################################################################################################
+def mergeStatements(
+    base_df,
+    other_dfs,
+    names    = [],
+    by       = 'symbol',
+    date_col = 'date'
+):
+
+    ###################################################################
+    # Import packages.
+    ###################################################################
+    import pandas as pd
+    import numpy as np
+
+    ###################################################################
+    # Specify the statement names, if they were not given, and encode
+    # the keys of all the statements.
+    ###################################################################
+    if len(names)==0:
+        names = ['base'] + [f'stmt{i+1}' for i in range(len(other_dfs))]
+    seen_cols = {col:names[0] for col in base_df.columns if col not in [by, date_col]}
+    for name, other_df in zip(names[1:], other_dfs):
+        overlap_cols = [col for col in other_df.columns if col in seen_cols]
+        if len(overlap_cols)>0:
+            raise ValueError(f"The {name} statement has columns that are also in the {seen_cols[overlap_cols[0]]} statement: {overlap_cols}")
+        seen_cols.update({col:name for col in other_df.columns if col not in [by, date_col]})
+    key_list = getSymbolDateKey([base_df]+list(other_dfs), by=by, date_col=date_col)
+    base_key = key_list[0]
+
+    ###################################################################
+    # Join each statement onto the base statement.
+    ###################################################################
+    out_df = base_df.reset_index(drop=True).copy()
+    report_list = []
+    for name, other_df, other_key in zip(names[1:], other_dfs, key_list[1:]):
+
+        # Sort the statement keys, if they are not already sorted.
+        if len(other_key)>1 and np.any(other_key[1:]<other_key[:-1]):
+            order = np.argsort(other_key, kind='stable')
+        else:
+            order = np.arange(len(other_key))
+        other_key = other_key[order]
+
+        # Detect the duplicate keys, which are reported and resolved by only
+        # keeping the last row of each key.
+        is_dup = np.zeros(len(other_key), dtype=bool)
+        if len(other_key)>1:
+            is_dup[:-1] = (other_key[:-1]==other_key[1:]) & (other_key[:-1]>=0)
+        if is_dup.any():
+            report_list.append(getReportRows(other_df.iloc[order[is_dup]], name, 'duplicate', by, date_col))
+        other_key = other_key[~is_dup]
+        order = order[~is_dup]
+
+        # Match every base row with one searchsorted pass.
+        pos = np.searchsorted(other_key, base_key, side='left')
+        pos = np.clip(pos, 0, max(len(other_key)-1, 0))
+        if len(other_key)>0:
+            valid = (other_key[pos]==base_key) & (base_key>=0)
+        else:
+            valid = np.zeros(len(base_key), dtype=bool)
+
+        # Report the base rows without a match and the statement rows that
+        # were not matched by any base row.
+        if (~valid).any():
+            report_list.append(getReportRows(base_df.iloc[np.flatnonzero(~valid)], name, 'missing', by, date_col))
+        is_used = np.zeros(len(other_key), dtype=bool)
+        is_used[pos[valid]] = True
+        if (~is_used).any():
+            report_list.append(getReportRows(other_df.iloc[order[~is_used]], name, 'unmatched', by, date_col))
+
+        # Gather the matched statement columns and attach them.
+        cols = [col for col in other_df.columns if col not in [by, date_col]]
+        if len(other_key)>0:
+            match_df = other_df[cols].iloc[order[pos]].reset_index(drop=True)
+            if not valid.all():
+                match_df = match_df.where(np.broadcast_to(valid[:,None], match_df.shape))
+        else:
+            match_df = pd.DataFrame(np.nan, index=range(len(base_key)), columns=cols)
+        for col in cols:
+            out_df[col] = match_df[col].to_numpy()
+
+    ###################################################################
+    # Combine the report rows.
+    ###################################################################
+    if len(report_list)>0:
+        report_df = pd.concat(report_list, ignore_index=True)
+    else:
+        report_df = pd.DataFrame(columns=['statement', by, date_col, 'issue'])
+
+    ###################################################################
+    # RETURN the merged dataframe and the report.
+    ###################################################################
+    return out_df, report_df
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getReportRows()
+#
+# DESCRIPTION: This function creates the statement merge report rows for the
+# given statement rows and issue.
+###############################################################################
+###############################################################################
+def getReportRows(in_df, name, issue, by='symbol', date_col='date'):
+
+    # Import packages.
+    import pandas as pd
+
+    # Create the report rows.
+    report_df = pd.DataFrame({by:in_df[by].to_numpy(), date_col:in_df[date_col].to_numpy()})
+    report_df.insert(0, 'statement', name)
+    report_df['issue'] = issue
+    return report_df
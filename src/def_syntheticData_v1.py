@@ -0,0 +1,677 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_syntheticData_v1
+#
+# DESCRIPTION: A deterministic generator of synthetic versions of all the ABT input files (monthly prices
+# of stocks and ETFs, quarterly key metrics, income statements, balance sheets and cashflows, company
+# overviews, ETF info, and FX rates), with the same columns and dtypes as the real files. The data is
+# generated from a seed with vectorized numpy draws in chunks of SYNTHETIC_CHUNK_SIZE symbols, which are
+# streamed to the parquet files, so the same seed and sizes always give the same files and sizes from 10
+# to 50k symbols take seconds to minutes with a flat memory use. The data has the irregularities of the
+# real files: staggered IPO and delisting dates, missing months and quarters, semi-annual reporters,
+# non-calendar fiscal years, non-USD reporters, stock splits, dividend payers, missing values, a partial
+# last month, and restatements (older duplicate rows of the same (symbol, date) with an earlier run date).
+#
+# The files are saved in the same folder layout and with the same file names as the real DATA folder
+# (see SYNTHETIC_FILES), so the ABT jobs config can be run against the synthetic data offline with e.g.
+#   python run/create_abt.py synthetic --outpath C:/TEMP/SYNTH --n-symbols 1000 --n-years 20
+#   python run/create_abt.py jobs batch/abt_jobs.json --var DATA=C:/TEMP/SYNTH
+############################################################################################################
+############################################################################################################
+
+# The synthetic input files, as paths relative to the output folder that mirror the real DATA folder.
+SYNTHETIC_FILES = {
+    'price_stock':   'PRICE/MONTHLY/monthlyPrices_av_stock.parquet',
+    'price_etf':     'PRICE/MONTHLY/monthlyPrices_av_etf.parquet',
+    'keymetric':     'FINANCIAL/QUARTERLY/keyMetrics_qtr_fmp_stock.parquet',
+    'is':            'FINANCIAL/QUARTERLY/incomeStatements_qtr_fmp_stock.parquet',
+    'bs':            'FINANCIAL/QUARTERLY/balanceSheets_qtr_fmp_stock.parquet',
+    'cf':            'FINANCIAL/QUARTERLY/cashflows_qtr_fmp_stock.parquet',
+    'company_stock': 'COMPANY/companyOverviews_fmp_stock.parquet',
+    'company_etf':   'COMPANY/companyOverviews_fmp_etf.parquet',
+    'etfinfo':       'ETF_INFO/etfInfo_fmp.parquet',
+    'fx':            'FX/fxRates_daily.parquet',
+}
+
+# The output folders of the ABT jobs, which are created so the jobs config can be run as is.
+SYNTHETIC_OUTPUT_FOLDERS = ['ABT/FIN_ABT', 'ABT/PRICE_ABT', 'ABT/ETF_ABT']
+
+# The number of symbols generated and written at a time.
+SYNTHETIC_CHUNK_SIZE = 1000
+
+# The reported currencies of the non-USD reporters, with the USD value of 1 unit around which the
+# synthetic FX rates move.
+SYNTHETIC_CURRENCIES = {'EUR': 1.10, 'GBP': 1.30, 'JPY': 0.008, 'CAD': 0.75, 'CNY': 0.14, 'CHF': 1.05}
+
+# The sectors and industries of the synthetic company overviews.
+SYNTHETIC_SECTORS = {
+    'Technology':             ['Software', 'Semiconductors', 'Consumer Electronics'],
+    'Healthcare':             ['Biotechnology', 'Medical Devices', 'Drug Manufacturers'],
+    'Financial Services':     ['Banks', 'Insurance', 'Asset Management'],
+    'Consumer Cyclical':      ['Retail', 'Auto Manufacturers', 'Restaurants'],
+    'Industrials':            ['Aerospace & Defense', 'Machinery', 'Airlines'],
+    'Energy':                 ['Oil & Gas', 'Renewable Energy'],
+    'Utilities':              ['Utilities - Regulated'],
+    'Real Estate':            ['REIT - Diversified'],
+}
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getSyntheticRng()
+#
+# DESCRIPTION: This function returns the numpy random generator of one input
+# file and symbol chunk, seeded with the seed, the file key and the chunk, so
+# every file is deterministic on its own and does not depend on which other
+# files were generated.
+###############################################################################
+###############################################################################
+def getSyntheticRng(
+    seed,
+    key,
+    chunk = 0
+):
+
+    # Import packages.
+    import zlib
+    import numpy as np
+
+    return np.random.default_rng([seed, zlib.crc32(key.encode()), chunk])
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getSyntheticSymbols()
+#
+# DESCRIPTION: This function returns the synthetic symbols (e.g. S00000 for
+# stocks and E00000 for ETFs) as a numpy object array.
+###############################################################################
+###############################################################################
+def getSyntheticSymbols(
+    n_symbols,
+    asset_type = 'stock'
+):
+
+    # Import packages.
+    import numpy as np
+
+    prefix = 'E' if asset_type=='etf' else 'S'
+    return np.array([f'{prefix}{i:05d}' for i in range(n_symbols)], dtype=object)
+
+
+###############################################################################
+###############################################################################
+# FUNCTION DEFINITION: getMonthEnd()
+#
+# DESCRIPTION: This function converts numpy datetime64[M] months to the last
+# calendar day of each month.
+###############################################################################
+###############################################################################
+def getMonthEnd(
+    months
+):
+
+    # Import packages.
+    import numpy as np
+
+    return (months + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getSyntheticCompany()
+#
+# DESCRIPTION: This function generates a synthetic company overview file, with one row per symbol.
+#
+# FUNCTION INPUT ARGS
+#   - symbols    = the numpy array of symbols, see getSyntheticSymbols()
+#   - asset_type = 'stock' or 'etf'
+#   - seed       = the random seed
+#   - run_date   = the admin run date of the file
+#
+# OUTPUT DATAFRAMES
+#   - out_df = the company overview data
+############################################################################################################
+############################################################################################################
+def getSyntheticCompany(
+    symbols,
+    asset_type = 'stock',
+    seed       = 0,
+    run_date   = '2024-06-14'
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+
+    # Draw the sector, industry and company attributes.
+    rng = getSyntheticRng(seed, f'company_{asset_type}')
+    n = len(symbols)
+    if asset_type=='etf':
+        sector = np.full(n, 'Financial Services', dtype=object)
+        industry = np.full(n, 'Asset Management', dtype=object)
+    else:
+        sectors = np.array(list(SYNTHETIC_SECTORS.keys()), dtype=object)
+        sector = sectors[rng.integers(0, len(sectors), n)]
+        industry = np.array([SYNTHETIC_SECTORS[s][i % len(SYNTHETIC_SECTORS[s])] for s, i in zip(sector, rng.integers(0, 3, n))], dtype=object)
+    ipo_days = rng.integers(0, 40*365, n)
+    out_df = pd.DataFrame({
+        'symbol':            symbols,
+        'sector':            sector,
+        'industry':          industry,
+        'ipo_date':          (np.datetime64('1980-01-01') + ipo_days.astype('timedelta64[D]')).astype(str),
+        'isActivelyTrading': rng.random(n)>0.05,
+        'companyName':       np.char.add('Synthetic ', symbols.astype(str)).astype(object),
+        'description':       np.char.add('Synthetic company overview of ', symbols.astype(str)).astype(object),
+        'beta':              np.round(rng.normal(1.0, 0.4, n), 3),
+        'volAvg':            rng.lognormal(13, 1.5, n).astype('int64'),
+        'mktCap':            rng.lognormal(21, 2, n).astype('int64'),
+        'exchange':          np.array(['NASDAQ','NYSE','AMEX'], dtype=object)[rng.integers(0, 3, n)],
+        'admin_runDate':     pd.Timestamp(run_date)
+    })
+    return out_df
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getSyntheticEtfInfo()
+#
+# DESCRIPTION: This function generates a synthetic ETF info file, with one row per ETF symbol.
+#
+# FUNCTION INPUT ARGS
+#   - symbols  = the numpy array of ETF symbols, see getSyntheticSymbols()
+#   - seed     = the random seed
+#   - run_date = the admin run date of the file
+#
+# OUTPUT DATAFRAMES
+#   - out_df = the ETF info data
+############################################################################################################
+############################################################################################################
+def getSyntheticEtfInfo(
+    symbols,
+    seed     = 0,
+    run_date = '2024-06-14'
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+
+    # Draw the ETF attributes.
+    rng = getSyntheticRng(seed, 'etfinfo')
+    n = len(symbols)
+    out_df = pd.DataFrame({
+        'symbol':        symbols,
+        'assetClass':    np.array(['Equity','Fixed Income','Commodity','Real Estate'], dtype=object)[rng.choice(4, n, p=[0.6,0.25,0.1,0.05])],
+        'expenseRatio':  np.round(rng.uniform(0.0003, 0.0095, n), 4),
+        'holdingsCount': rng.integers(10, 4000, n),
+        'aum':           rng.lognormal(20, 2, n),
+        'nav':           np.round(rng.lognormal(3.5, 0.8, n), 2),
+        'navCurrency':   'USD',
+        'domicile':      np.array(['US','IE','LU'], dtype=object)[rng.choice(3, n, p=[0.8,0.15,0.05])],
+        'website':       np.char.add('https://www.example.com/etf/', symbols.astype(str)).astype(object),
+        'admin_runDate': pd.Timestamp(run_date)
+    })
+    return out_df
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getSyntheticPrices()
+#
+# DESCRIPTION: This function generates a synthetic monthly price file, with the adjusted close of each
+# symbol following a geometric random walk. Each row is dated on the last business day of the month and
+# the last month is a partial month (dated end_date), as in the real files. Symbols start (IPO) and end
+# (delisting) at random months, a few months are missing, some symbols pay quarterly dividends, and some
+# have a 2:1 stock split, before which the unadjusted prices are doubled.
+#
+# FUNCTION INPUT ARGS
+#   - symbols     = the numpy array of symbols, see getSyntheticSymbols()
+#   - asset_type  = 'stock' or 'etf'
+#   - n_months    = the length of the price history in months
+#   - end_date    = the last date of the price history
+#   - seed        = the random seed
+#   - run_date    = the admin run date of the file
+#   - missing_pct = the share of randomly missing months
+#   - chunk       = the symbol chunk number, which is part of the random seed
+#
+# OUTPUT DATAFRAMES
+#   - out_df = the monthly price data sorted by symbol and date
+############################################################################################################
+############################################################################################################
+def getSyntheticPrices(
+    symbols,
+    asset_type  = 'stock',
+    n_months    = 240,
+    end_date    = '2024-06-14',
+    seed        = 0,
+    run_date    = '2024-06-14',
+    missing_pct = 0.005,
+    chunk       = 0
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+
+    # Build the (symbol, month) grid and the business day dates, where the
+    # last month is dated end_date.
+    rng = getSyntheticRng(seed, f'price_{asset_type}', chunk)
+    n = len(symbols)
+    end = np.datetime64(end_date, 'D')
+    months = end.astype('datetime64[M]') - np.arange(n_months-1, -1, -1)
+    dates = np.busday_offset(getMonthEnd(months), 0, roll='backward')
+    dates[-1] = min(dates[-1], end)
+
+    # Draw the symbol level attributes: the first and last month, the drift
+    # and volatility of the returns, the dividend yield, and the split month.
+    first = np.where(rng.random(n)<0.3, rng.integers(0, n_months, n), 0)
+    last = np.where(rng.random(n)<0.05, rng.integers(first, n_months), n_months-1)
+    mu = rng.normal(0.007, 0.005, n)[:,None]
+    sigma = rng.uniform(0.03, 0.15, n)[:,None]
+    div_yield = np.where(rng.random(n)<0.4, rng.uniform(0.005, 0.06, n), 0.0)[:,None]
+    div_phase = rng.integers(0, 3, n)[:,None]
+    split = np.where(rng.random(n)<0.03, rng.integers(0, n_months, n), -1)[:,None]
+
+    # Generate the adjusted close, dividends, and unadjusted prices.
+    col = np.arange(n_months)[None,:]
+    log_price = np.log(rng.lognormal(3.5, 1, n))[:,None] + np.cumsum(rng.normal(mu, sigma, (n, n_months)), axis=1)
+    adj_close = np.round(np.exp(log_price), 4)
+    div_amount = np.where((col+div_phase)%3==0, np.round(adj_close*div_yield/4, 4), 0.0)
+    close = np.where(col<split, adj_close*2, adj_close)
+    open_ = np.round(close*(1+rng.normal(0, 0.03, (n, n_months))), 4)
+    high = np.round(np.maximum(open_, close)*(1+np.abs(rng.normal(0, 0.03, (n, n_months)))), 4)
+    low = np.round(np.minimum(open_, close)*(1-np.abs(rng.normal(0, 0.03, (n, n_months)))), 4)
+    volume = rng.lognormal(14, 1.5, (n, n_months)).astype('int64')
+
+    # Keep the months between the first and last month of each symbol,
+    # except the randomly missing ones.
+    mask = (col>=first[:,None]) & (col<=last[:,None]) & (rng.random((n, n_months))>=missing_pct)
+    sym_idx = np.broadcast_to(np.arange(n)[:,None], (n, n_months))[mask]
+    out_df = pd.DataFrame({
+        'symbol':        symbols[sym_idx],
+        'asset_type':    asset_type,
+        'date':          np.broadcast_to(dates[None,:], (n, n_months))[mask].astype('datetime64[us]'),
+        'open':          open_[mask],
+        'high':          high[mask],
+        'low':           low[mask],
+        'close':         close[mask],
+        'adj_close':     adj_close[mask],
+        'volume':        volume[mask],
+        'div_amount':    div_amount[mask],
+        'series_type':   'monthly_adjusted',
+        'api_service':   'av',
+        'admin_runDate': pd.Timestamp(run_date)
+    })
+    return out_df
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getSyntheticStatements()
+#
+# DESCRIPTION: This function generates the synthetic quarterly income statement, balance sheet, cashflow
+# and key metric files of a set of stocks. The revenue and share count of each stock follow log random
+# walks (with seasonality), and the other line items are derived from them with stock level margins and
+# ratios, so the statements are consistent with each other (e.g. freeCashFlow = operatingCashFlow +
+# capitalExpenditure). Stocks start and stop reporting at random quarters, some have non-calendar fiscal
+# years or report semi-annually, some quarters are missing, and quarters that are not filed by end_date
+# are left out. The restated rows are duplicated with an earlier run date and the original values, and a
+# share of the values are missing.
+#
+# FUNCTION INPUT ARGS
+#   - symbols     = the numpy array of symbols, see getSyntheticSymbols()
+#   - n_quarters  = the length of the statement history in quarters
+#   - end_date    = the last date of the statement history
+#   - seed        = the random seed
+#   - run_date    = the admin run date of the files
+#   - missing_pct = the share of randomly missing quarters
+#   - restate_pct = the share of restated quarters
+#   - null_pct    = the share of missing values of each line item
+#   - chunk       = the symbol chunk number, which is part of the random seed
+#
+# OUTPUT DATAFRAMES
+#   - is_df = the income statement data
+#   - bs_df = the balance sheet data
+#   - cf_df = the cashflow statement data
+#   - km_df = the key metric data
+############################################################################################################
+############################################################################################################
+def getSyntheticStatements(
+    symbols,
+    n_quarters  = 80,
+    end_date    = '2024-06-14',
+    seed        = 0,
+    run_date    = '2024-06-14',
+    missing_pct = 0.03,
+    restate_pct = 0.02,
+    null_pct    = 0.005,
+    chunk       = 0
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+
+    ###################################################################
+    # Build the (symbol, quarter) grid. The fiscal quarters end on the
+    # calendar quarter ends, shifted back by 1 or 2 months for stocks
+    # with a non-calendar fiscal year.
+    ###################################################################
+    rng = getSyntheticRng(seed, 'statements', chunk)
+    n = len(symbols)
+    end = np.datetime64(end_date, 'D')
+    end_month = end.astype('datetime64[M]').astype('int64')
+    qtr_month = end_month - ((end_month % 12) + 1) % 3
+    grid_month = (qtr_month - 3*np.arange(n_quarters-1, -1, -1))[None,:]
+    offset = rng.choice(3, n, p=[0.8,0.1,0.1])[:,None]
+    dates = getMonthEnd((grid_month - offset).astype('datetime64[M]'))
+    fiscal_year = grid_month//12 + 1970
+    fiscal_qtr = (grid_month % 12)//3 + 1
+    filling_lag = rng.integers(25, 90, (n, n_quarters)).astype('timedelta64[D]')
+    filling_date = dates + filling_lag
+
+    ###################################################################
+    # Keep the quarters between the first and last quarter of each
+    # stock that are filed by end_date, every other quarter for the
+    # semi-annual reporters, except the randomly missing ones.
+    ###################################################################
+    col = np.arange(n_quarters)[None,:]
+    first = np.where(rng.random(n)<0.3, rng.integers(0, n_quarters, n), 0)[:,None]
+    last = np.where(rng.random(n)<0.05, rng.integers(first[:,0], n_quarters), n_quarters-1)[:,None]
+    semi = (rng.random(n)<0.05)[:,None]
+    mask = (col>=first) & (col<=last) & (filling_date<=end) & (~semi | (col%2==1))
+    mask &= rng.random((n, n_quarters))>=missing_pct
+
+    ###################################################################
+    # Generate the line items from the revenue and share count random
+    # walks and the stock level ratios. Non-USD reporters report in
+    # their own currency.
+    ###################################################################
+    currencies = np.array(['USD'] + list(SYNTHETIC_CURRENCIES.keys()), dtype=object)
+    usd_rate = np.array([1.0] + list(SYNTHETIC_CURRENCIES.values()))
+    curr_idx = np.where(rng.random(n)<0.85, 0, rng.integers(1, len(currencies), n))
+    fx = (1/usd_rate[curr_idx])[:,None]
+    season = 0.05*np.sin(np.pi/2*col + rng.uniform(0, 2*np.pi, n)[:,None])
+    revenue = fx*np.exp(rng.normal(18, 1.5, n)[:,None] + season + np.cumsum(rng.normal(rng.normal(0.01, 0.01, n)[:,None], 0.06, (n, n_quarters)), axis=1))
+    num_shares = np.exp(rng.normal(18, 1, n)[:,None] + np.cumsum(rng.normal(-0.002, 0.01, (n, n_quarters)), axis=1))
+    unit = lambda low, high: rng.uniform(low, high, n)[:,None]
+    noise = lambda sd: 1 + rng.normal(0, sd, (n, n_quarters))
+
+    gross_ratio = np.clip(unit(0.15, 0.7)*noise(0.05), 0.01, 0.95)
+    gross_profit = revenue*gross_ratio
+    cost_of_revenue = revenue - gross_profit
+    d_and_a = revenue*unit(0.02, 0.08)
+    operating_income = gross_profit - revenue*unit(0.05, 0.5)*noise(0.1)
+    ebitda = operating_income + d_and_a
+    total_assets = 4*revenue*unit(0.5, 3)*noise(0.02)
+    total_liabilities = total_assets*unit(0.2, 0.9)*noise(0.02)
+    total_equity = total_assets - total_liabilities
+    total_debt = total_liabilities*unit(0.2, 0.6)
+    long_term_debt = total_debt*unit(0.5, 0.95)
+    cash = total_assets*unit(0.02, 0.15)*noise(0.1)
+    short_term_inv = cash*unit(0, 0.5)
+    receivables = revenue*unit(0.2, 0.8)
+    inventory = cost_of_revenue*unit(0, 0.8)
+    interest_expense = total_debt*unit(0.005, 0.02)
+    net_income = (operating_income - interest_expense)*0.79
+    operating_cf = (net_income + d_and_a)*noise(0.2)
+    capex = -revenue*unit(0.01, 0.15)*noise(0.2)
+    free_cf = operating_cf + capex
+    payout = np.where(rng.random(n)<0.4, rng.uniform(0.1, 0.6, n), 0.0)[:,None]
+    price = np.exp(np.log(np.maximum(revenue*4/num_shares, 1e-3)) + unit(0, 1.5) + np.cumsum(rng.normal(0, 0.1, (n, n_quarters)), axis=1))
+    market_cap = price*num_shares
+    eps = net_income/num_shares
+
+    ###################################################################
+    # Flatten the grid into the statement dataframes.
+    ###################################################################
+    sym_idx = np.broadcast_to(np.arange(n)[:,None], (n, n_quarters))[mask]
+    flat = lambda values: np.broadcast_to(values, (n, n_quarters))[mask]
+    base_df = pd.DataFrame({
+        'symbol':      symbols[sym_idx],
+        'date':        flat(dates).astype('datetime64[us]'),
+        'fiscal_year': flat(fiscal_year).astype('int32'),
+        'fiscal_qtr':  flat(fiscal_qtr).astype('int32')
+    })
+    filed_df = pd.DataFrame({
+        'reportedCurrency': currencies[curr_idx][sym_idx],
+        'fillingDate':      flat(filling_date).astype('datetime64[us]')
+    })
+    filed_df['acceptedDate'] = filed_df['fillingDate'] + pd.to_timedelta(rng.integers(6*60, 22*60, len(filed_df)), unit='min')
+
+    is_df = base_df.copy()
+    is_df['reportedCurrency'] = filed_df['reportedCurrency']
+    is_df['revenue'] = flat(revenue)
+    is_df['costOfRevenue'] = flat(cost_of_revenue)
+    is_df['grossProfit'] = flat(gross_profit)
+    is_df['grossProfitRatio'] = flat(gross_ratio)
+    is_df['operatingIncome'] = flat(operating_income)
+    is_df['ebitda'] = flat(ebitda)
+    is_df['interestExpense'] = flat(interest_expense)
+    is_df['netIncome'] = flat(net_income)
+    is_df['netIncomeRatio'] = flat(net_income/revenue)
+    is_df['numShares'] = flat(num_shares)
+    is_df['eps_qtr'] = flat(eps)
+    is_df['epsdiluted'] = flat(eps*0.98)
+    is_df['url_SEC'] = 'https://www.sec.gov/cgi-bin/browse-edgar?action=getcompany&CIK=' + is_df['symbol']
+    is_df['url_10K'] = 'https://www.sec.gov/Archives/edgar/data/' + is_df['symbol'] + '/' + is_df['date'].dt.strftime('%Y%m%d') + '.htm'
+
+    bs_df = base_df[['symbol','date']].copy()
+    bs_df['reportedCurrency'] = filed_df['reportedCurrency']
+    bs_df['cashAndCashEquivalents'] = flat(cash)
+    bs_df['shortTermInvestments'] = flat(short_term_inv)
+    bs_df['netReceivables'] = flat(receivables)
+    bs_df['inventory'] = flat(inventory)
+    bs_df['totalCurrentAssets'] = flat(cash + short_term_inv + receivables + inventory)
+    bs_df['totalAssets'] = flat(total_assets)
+    bs_df['totalCurrentLiabilities'] = flat(total_liabilities*0.35)
+    bs_df['longTermDebt'] = flat(long_term_debt)
+    bs_df['totalDebt'] = flat(total_debt)
+    bs_df['netDebt'] = flat(total_debt - cash)
+    bs_df['totalLiabilities'] = flat(total_liabilities)
+    bs_df['minorityInterest'] = flat(np.where(payout>0.3, total_assets*0.01, 0.0))
+    bs_df['totalStockholdersEquity'] = flat(total_equity)
+
+    cf_df = base_df[['symbol','date']].copy()
+    cf_df['reportedCurrency'] = filed_df['reportedCurrency']
+    cf_df['depreciationAndAmortization'] = flat(d_and_a)
+    cf_df['inventory'] = flat(-inventory*rng.normal(0, 0.05, (n, n_quarters)))
+    cf_df['operatingCashFlow'] = flat(operating_cf)
+    cf_df['capitalExpenditure'] = flat(capex)
+    cf_df['freeCashFlow'] = flat(free_cf)
+    cf_df['debtRepayment'] = flat(-total_debt*unit(0, 0.05))
+    cf_df['commonStockIssued'] = flat(np.where(rng.random((n, n_quarters))<0.1, market_cap*0.01, 0.0))
+    cf_df['commonStockRepurchased'] = flat(np.where(rng.random((n, n_quarters))<0.2, -market_cap*0.005, 0.0))
+    cf_df['dividendsPaid'] = flat(-np.maximum(net_income, 0)*payout)
+
+    km_df = base_df.copy()
+    km_df.insert(2, 'date_qtr', km_df['fiscal_year'].astype(str) + 'Q' + km_df['fiscal_qtr'].astype(str))
+    km_df['revenuePerShare'] = flat(revenue/num_shares)
+    km_df['netIncomePerShare'] = flat(eps)
+    km_df['cashPerShare'] = flat(cash/num_shares)
+    km_df['freeCashFlowPerShare'] = flat(free_cf/num_shares)
+    km_df['bookValuePerShare'] = flat(total_equity/num_shares)
+    km_df['shareholdersEquityPerShare'] = flat(total_equity/num_shares)
+    km_df['interestDebtPerShare'] = flat(total_debt/num_shares)
+    km_df['peRatio'] = flat(price/(4*eps))
+    km_df['earningsYield'] = flat(4*eps/price)
+    km_df['freeCashFlowYield'] = flat(4*free_cf/market_cap)
+    km_df['debtToEquity'] = flat(total_debt/total_equity)
+    km_df['debtToAssets'] = flat(total_debt/total_assets)
+
+    ###################################################################
+    # Add the missing values, the filing dates, the run dates, and the
+    # restatements. A restated quarter keeps its current values with
+    # the run date and a later (amended) filing date, and gets an older
+    # duplicate row with the original values and an earlier run date.
+    ###################################################################
+    restated = rng.random(len(base_df))<restate_pct
+    restate_factor = 1 + rng.normal(0, 0.05, int(restated.sum()))
+    out_list = []
+    for df, filed in [[is_df, True], [bs_df, True], [cf_df, True], [km_df, False]]:
+        value_cols = [c for c in df.columns if df[c].dtype=='float64']
+        for c in value_cols:
+            df.loc[rng.random(len(df))<null_pct, c] = np.nan
+        df['admin_runDate'] = pd.Timestamp(run_date)
+        if filed:
+            df['fillingDate'] = filed_df['fillingDate'].where(~restated, filed_df['fillingDate'] + pd.Timedelta(days=180))
+            df['acceptedDate'] = filed_df['acceptedDate'].where(~restated, filed_df['acceptedDate'] + pd.Timedelta(days=180))
+        prev_df = df.loc[restated].copy()
+        prev_df[value_cols] = prev_df[value_cols].mul(restate_factor, axis=0)
+        prev_df['admin_runDate'] = pd.Timestamp(run_date) - pd.Timedelta(days=365)
+        if filed:
+            prev_df['fillingDate'] = filed_df.loc[restated, 'fillingDate']
+            prev_df['acceptedDate'] = filed_df.loc[restated, 'acceptedDate']
+        out_list.append(pd.concat([df, prev_df], ignore_index=True))
+    is_df, bs_df, cf_df, km_df = out_list
+    return is_df, bs_df, cf_df, km_df
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getSyntheticFXRates()
+#
+# DESCRIPTION: This function generates a synthetic daily FX rate file (currency, date, rate) for the
+# non-USD reporting currencies of SYNTHETIC_CURRENCIES, on business days with a few missing days, where the
+# rate is the USD value of 1 unit of the currency (see def_fxUtils_v1.py).
+#
+# FUNCTION INPUT ARGS
+#   - start_date  = the first date of the FX rates
+#   - end_date    = the last date of the FX rates
+#   - seed        = the random seed
+#   - missing_pct = the share of randomly missing days
+#
+# OUTPUT DATAFRAMES
+#   - out_df = the FX rate data sorted by currency and date
+############################################################################################################
+############################################################################################################
+def getSyntheticFXRates(
+    start_date  = '2004-01-01',
+    end_date    = '2024-06-14',
+    seed        = 0,
+    missing_pct = 0.02
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+
+    # Generate a log random walk around the base rate of each currency.
+    rng = getSyntheticRng(seed, 'fx')
+    dates = pd.bdate_range(start_date, end_date).to_numpy()
+    n = len(SYNTHETIC_CURRENCIES)
+    base = np.log(np.array(list(SYNTHETIC_CURRENCIES.values())))[:,None]
+    rate = np.exp(base + np.cumsum(rng.normal(0, 0.005, (n, len(dates))), axis=1))
+    mask = rng.random((n, len(dates)))>=missing_pct
+    cur_idx = np.broadcast_to(np.arange(n)[:,None], rate.shape)[mask]
+    out_df = pd.DataFrame({
+        'currency': np.array(list(SYNTHETIC_CURRENCIES.keys()), dtype=object)[cur_idx],
+        'date':     np.broadcast_to(dates[None,:], rate.shape)[mask].astype('datetime64[us]'),
+        'rate':     np.round(rate[mask], 6)
+    })
+    return out_df
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: createSyntheticData()
+#
+# DESCRIPTION: This function generates all the synthetic ABT input files and saves them in the output
+# folder with the folder layout and file names of SYNTHETIC_FILES, and creates the ABT output folders. The
+# price and statement files are generated in chunks of SYNTHETIC_CHUNK_SIZE symbols, each with its own
+# seeded random generator, and every chunk is appended to the parquet file as a row group. The same seed
+# and sizes always give the same files.
+#
+# FUNCTION INPUT ARGS
+#   - outpath     = the folder where the synthetic DATA folder is created
+#   - n_symbols   = the number of stocks
+#   - n_etfs      = the number of ETFs (optional, defaults to 10% of the stocks and at least 1)
+#   - n_years     = the length of the price and statement history in years
+#   - end_date    = the last date of the data, which is also the admin run date
+#   - seed        = the random seed
+#   - missing_pct = the share of randomly missing months and quarters (optional)
+#   - restate_pct = the share of restated quarters (optional)
+#   - null_pct    = the share of missing statement values (optional)
+#
+# OUTPUT
+#   - the dictionary of the complete filepaths of the files, with the keys of SYNTHETIC_FILES
+############################################################################################################
+############################################################################################################
+def createSyntheticData(
+    outpath,
+    n_symbols   = 10,
+    n_etfs      = None,
+    n_years     = 20,
+    end_date    = '2024-06-14',
+    seed        = 0,
+    missing_pct = 0.01,
+    restate_pct = 0.02,
+    null_pct    = 0.005
+):
+
+    # Import packages.
+    import os
+    import time
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Check the sizes.
+    if n_etfs is None:
+        n_etfs = max(1, n_symbols//10)
+    if n_symbols<1 or n_etfs<0 or n_years<1:
+        raise ValueError(f"n_symbols ({n_symbols}) and n_years ({n_years}) must be at least 1 and n_etfs ({n_etfs}) at least 0")
+    start_time = time.perf_counter()
+    stocks = getSyntheticSymbols(n_symbols, 'stock')
+    etfs = getSyntheticSymbols(n_etfs, 'etf')
+    start_date = str((pd.Timestamp(end_date) - pd.DateOffset(years=n_years+1)).date())
+
+    # Generate the symbol level files.
+    df_dict = {
+        'company_stock': getSyntheticCompany(stocks, 'stock', seed=seed, run_date=end_date),
+        'company_etf':   getSyntheticCompany(etfs, 'etf', seed=seed, run_date=end_date),
+        'etfinfo':       getSyntheticEtfInfo(etfs, seed=seed, run_date=end_date),
+        'fx':            getSyntheticFXRates(start_date, end_date, seed=seed)
+    }
+    fp_dict = {key: os.path.join(outpath, fp) for key, fp in SYNTHETIC_FILES.items()}
+    for key, df in df_dict.items():
+        os.makedirs(os.path.dirname(fp_dict[key]), exist_ok=True)
+        df.to_parquet(fp_dict[key], index=False)
+        print(f"Saved {len(df):>12,} rows to {fp_dict[key]}")
+
+    # Generate the price and statement files by symbol chunk and append the
+    # chunks to the parquet files.
+    writers = {}
+    n_rows = {}
+    n_chunks = max(1, -(-n_symbols//SYNTHETIC_CHUNK_SIZE), -(-n_etfs//SYNTHETIC_CHUNK_SIZE))
+    for chunk in range(n_chunks):
+        chunk_stocks = stocks[chunk*SYNTHETIC_CHUNK_SIZE:(chunk+1)*SYNTHETIC_CHUNK_SIZE]
+        chunk_etfs = etfs[chunk*SYNTHETIC_CHUNK_SIZE:(chunk+1)*SYNTHETIC_CHUNK_SIZE]
+        df_dict = {}
+        if len(chunk_stocks)>0:
+            df_dict['price_stock'] = getSyntheticPrices(chunk_stocks, 'stock', n_months=12*n_years, end_date=end_date, seed=seed,
+                                                        run_date=end_date, missing_pct=missing_pct/2, chunk=chunk)
+            df_dict['is'], df_dict['bs'], df_dict['cf'], df_dict['keymetric'] = getSyntheticStatements(
+                chunk_stocks, n_quarters=4*n_years, end_date=end_date, seed=seed, run_date=end_date,
+                missing_pct=missing_pct, restate_pct=restate_pct, null_pct=null_pct, chunk=chunk)
+        if len(chunk_etfs)>0 or chunk==0:
+            df_dict['price_etf'] = getSyntheticPrices(chunk_etfs, 'etf', n_months=12*n_years, end_date=end_date, seed=seed,
+                                                      run_date=end_date, missing_pct=missing_pct/2, chunk=chunk)
+        for key, df in df_dict.items():
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if key not in writers:
+                os.makedirs(os.path.dirname(fp_dict[key]), exist_ok=True)
+                writers[key] = pq.ParquetWriter(fp_dict[key], table.schema)
+                n_rows[key] = 0
+            writers[key].write_table(table.cast(writers[key].schema))
+            n_rows[key] += len(df)
+    for key, writer in writers.items():
+        writer.close()
+        print(f"Saved {n_rows[key]:>12,} rows to {fp_dict[key]}")
+
+    # Create the ABT output folders.
+    for folder in SYNTHETIC_OUTPUT_FOLDERS:
+        os.makedirs(os.path.join(outpath, folder), exist_ok=True)
+    print(f"Created the synthetic data of {n_symbols} stocks and {n_etfs} ETFs over {n_years} years in {time.perf_counter()-start_time:.1f} seconds.")
+    return fp_dict
@@ -0,0 +1,147 @@
+############################################################################################################
+############################################################################################################
+# MODULE: def_ttmKernel_v1
+#
+# DESCRIPTION: Shared per-symbol lag and trailing-twelve-month (TTM) kernels for the quarterly ABT
+# builders. The kernels work on numpy arrays of a dataframe that is sorted by symbol and date, so every
+# stock is a contiguous block of rows. A lag of n periods is a shift of the whole array by n rows, where
+# the rows that are less than n rows from the start of their stock's block are set to missing. This lets
+# all the requested columns be lagged and aggregated together in one pass, instead of one groupby per
+# column.
+############################################################################################################
+############################################################################################################
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: getGroupPosition()
+#
+# DESCRIPTION: This function returns the position of each row within its stock's block of rows (0 for the
+# first row of each stock), for a dataframe that is sorted by symbol.
+#
+# FUNCTION INPUT ARGS
+#   - in_df = input dataframe sorted by symbol and date
+#
+# OUTPUT
+#   - an int64 numpy array with the position of each row within its stock
+############################################################################################################
+############################################################################################################
+def getGroupPosition(
+    in_df
+):
+
+    # Import packages.
+    import numpy as np
+
+    # Flag the first row of each stock and count the rows since that row.
+    symbol = in_df['symbol'].to_numpy()
+    is_first = np.ones(len(symbol), dtype=bool)
+    is_first[1:] = (symbol[1:]!=symbol[:-1])
+    start_idx = np.maximum.accumulate(np.where(is_first, np.arange(len(symbol)), 0))
+    return np.arange(len(symbol)) - start_idx
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: groupShift()
+#
+# DESCRIPTION: This function lags a 1-d or 2-d float array by nlag rows within each stock, which gives the
+# same result as df.groupby(['symbol'])[cols].shift(nlag) on a dataframe sorted by symbol and date.
+#
+# FUNCTION INPUT ARGS
+#   - values = the float numpy array (rows x columns) to lag
+#   - pos    = the position of each row within its stock, from getGroupPosition()
+#   - nlag   = the number of rows to lag (must be >= 0)
+#
+# OUTPUT
+#   - a float numpy array with the lagged values
+############################################################################################################
+############################################################################################################
+def groupShift(
+    values,
+    pos,
+    nlag
+):
+
+    # Import packages.
+    import numpy as np
+
+    # Shift the whole array and blank out the rows that crossed a stock boundary.
+    if nlag==0:
+        return values.copy()
+    out = np.full(values.shape, np.nan, dtype='float64')
+    out[nlag:] = values[:-nlag]
+    out[pos<nlag] = np.nan
+    return out
+
+
+############################################################################################################
+############################################################################################################
+# FUNCTION DEFINITION: addTTMColumns()
+#
+# DESCRIPTION: This function adds the trailing-twelve-month columns for a list of flow items (e.g. income
+# statement and cashflow statement items) and the average-of-period columns for a list of stock items
+# (e.g. balance sheet items) to a dataframe sorted by symbol and date. For each flow item it adds:
+#
+#   - <item>_ttm      = the sum of the last nper values, missing unless all nper values exist
+#   - <item>_ttm_lag4 = the TTM value 1 year (nper periods) ago
+#   - <item>_ttm_pc   = the TTM growth over 1 year, missing unless the TTM value 1 year ago is > 0
+#
+# and for each stock item it adds:
+#
+#   - <item>_lag4     = the value 1 year (nper periods) ago
+#   - <item>_avg      = the average of the current value and the value 1 year ago
+#
+# FUNCTION INPUT ARGS
+#   - out_df     = input dataframe sorted by symbol and date
+#   - flow_cols  = the list of flow item columns
+#   - stock_cols = the list of stock item columns
+#   - nper       = the number of periods per year (4 for quarterly data)
+#
+# OUTPUT
+#   - out_df
+############################################################################################################
+############################################################################################################
+def addTTMColumns(
+    out_df,
+    flow_cols  = [],
+    stock_cols = [],
+    nper       = 4
+):
+
+    # Import packages.
+    import pandas as pd
+    import numpy as np
+
+    # Get the position of each row within its stock.
+    pos = getGroupPosition(out_df)
+    new_cols = {}
+
+    # FLOW ITEMS: Sum the last nper lagged values of all the flow items at
+    # once. Any missing value in the window makes the TTM value missing.
+    if len(flow_cols)>0:
+        values = out_df[flow_cols].to_numpy(dtype='float64', na_value=np.nan)
+        ttm = values.copy()
+        for nlag in range(1, nper):
+            ttm = ttm + groupShift(values, pos, nlag)
+        ttm_lag = groupShift(ttm, pos, nper)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ttm_pc = np.where(ttm_lag>0, ttm/ttm_lag-1.0, np.nan)
+        for i, col in enumerate(flow_cols):
+            new_cols[col+'_ttm'] = ttm[:,i]
+            new_cols[col+'_ttm_lag4'] = ttm_lag[:,i]
+            new_cols[col+'_ttm_pc'] = ttm_pc[:,i]
+
+    # STOCK ITEMS: Average the current value and the value 1 year ago.
+    if len(stock_cols)>0:
+        values = out_df[stock_cols].to_numpy(dtype='float64', na_value=np.nan)
+        values_lag = groupShift(values, pos, nper)
+        values_avg = (values + values_lag)/2
+        for i, col in enumerate(stock_cols):
+            new_cols[col+'_lag4'] = values_lag[:,i]
+            new_cols[col+'_avg'] = values_avg[:,i]
+
+    # Add all the new columns to the dataframe at once.
+    out_df = out_df.drop(columns=[col for col in new_cols if col in out_df.columns])
+    out_df = pd.concat([out_df, pd.DataFrame(new_cols, index=out_df.index)], axis=1)
+    return out_df